@@ -0,0 +1,169 @@
+"""
+Benchmark of the memory shared by forked worker processes
+
+This script measures the shared and private memory of the worker processes
+scoring pairs of records, with and without :func:`dedupmarcxml.preload.preload_for_fork`:
+
+1. records are loaded in the main process
+2. in "preload" mode, resources are loaded, functions are warmed up and objects
+   are frozen
+3. workers are forked and score pairs of records with the chosen method, a full
+   garbage collection is done after each chunk like in a long run
+4. each worker reports its memory usage, see :func:`dedupmarcxml.preload.get_memory_usage`
+
+Each mode runs in a separate process. Without preload, the garbage collector of
+the workers writes in the objects inherited from the main process and their pages
+become private.
+
+Linux only, `/proc/<pid>/smaps_rollup` is required.
+
+Usage:
+    python benchmarks/fork_memory.py --corpus corpus.xml --workers 4
+    python benchmarks/fork_memory.py --corpus corpus.xml --output fork_memory.json
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+from typing import List, Dict, Optional, Tuple
+
+# The benchmarks should run from a checkout of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedupmarcxml.briefrecord import BriefRec
+from dedupmarcxml.blocking import BlockIndex
+from dedupmarcxml.evaluate import evaluate_records_similarity, get_similarity_scores
+from dedupmarcxml import readers
+from dedupmarcxml import preload
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ['baseline', 'preload']
+
+# Records and method of the workers, inherited from the main process
+_records: Dict[str, BriefRec] = dict()
+_method = 'mean'
+
+
+def _score_chunk(chunk: List[Tuple[str, str]]) -> Tuple[int, Optional[Dict[str, int]]]:
+    """Score a chunk of pairs and return the memory usage of the worker
+
+    :param chunk: list of tuples with the ids of the records to compare
+
+    :return: tuple with the id of the process and its memory usage
+    """
+    sim_analyses = [evaluate_records_similarity(_records[rec_id1], _records[rec_id2]) for rec_id1, rec_id2 in chunk]
+    get_similarity_scores(sim_analyses, _method)
+    gc.collect()
+
+    return os.getpid(), preload.get_memory_usage()
+
+
+def run_mode(mode: str, paths: List[str], workers: int, method: str, max_pairs: int) -> Dict:
+    """Run the benchmark in the current process
+
+    :param mode: "baseline" or "preload"
+    :param paths: MARCXML or JSON files or folders
+    :param workers: number of worker processes
+    :param method: method of the similarity score
+    :param max_pairs: maximum number of scored pairs
+
+    :return: dictionary with the memory usage of the main process before forking and
+        the memory usage of each worker, values in kB
+    """
+    global _records, _method
+    _method = method
+    _records = {rec.data['rec_id']: rec for rec in readers.iter_brief_records(paths)}
+
+    index = BlockIndex(max_block_size=1000)
+    for rec in _records.values():
+        index.add(rec)
+    pairs = []
+    for rec1, rec2 in index.get_candidate_pairs():
+        pairs.append((rec1.data['rec_id'], rec2.data['rec_id']))
+        if len(pairs) >= max_pairs:
+            break
+    del index
+
+    nb_frozen = preload.preload_for_fork() if mode == 'preload' else 0
+    parent_usage = preload.get_memory_usage()
+
+    # Each worker receives several chunks
+    chunk_size = max(1, len(pairs) // (workers * 4))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    workers_usage = dict()
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+        for pid, usage in pool.imap_unordered(_score_chunk, chunks):
+            workers_usage[pid] = usage
+
+    return {'mode': mode,
+            'nb_records': len(_records),
+            'nb_pairs': len(pairs),
+            'nb_frozen_objects': nb_frozen,
+            'parent': parent_usage,
+            'workers': list(workers_usage.values())}
+
+
+def get_summary(result: Dict) -> Dict[str, float]:
+    """Return the mean memory usage of the workers
+
+    :param result: result of :func:`run_mode`
+
+    :return: dictionary with mean rss, pss, shared and private memory per worker in MB
+    """
+    workers = result['workers']
+    return {key: sum(usage[key] for usage in workers) / len(workers) / 1024
+            for key in ['rss', 'pss', 'shared', 'private']}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Memory shared by forked worker processes')
+    parser.add_argument('--corpus', nargs='*', default=[],
+                        help='MARCXML or JSON files or folders used in addition to the test records')
+    parser.add_argument('--workers', type=int, default=4, help='number of worker processes')
+    parser.add_argument('--method', default='random_forest_general', help='method of the similarity score')
+    parser.add_argument('--max-pairs', type=int, default=20000, help='maximum number of scored pairs')
+    parser.add_argument('--modes', nargs='*', default=MODES, choices=MODES, help='modes to compare')
+    parser.add_argument('--output', default=None, help='path of the JSON file with the results')
+    parser.add_argument('--run', default=None, choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if preload.get_memory_usage() is None or 'fork' not in multiprocessing.get_all_start_methods():
+        print('The "fork" start method and /proc/self/smaps_rollup are required', file=sys.stderr)
+        return 1
+
+    paths = [os.path.join(ROOT_DIR, 'tests', 'requests')] + args.corpus
+
+    # Child process running a single mode
+    if args.run is not None:
+        print(json.dumps(run_mode(args.run, paths, args.workers, args.method, args.max_pairs)))
+        return 0
+
+    results = []
+    for mode in args.modes:
+        cmd = [sys.executable, os.path.abspath(__file__), '--run', mode, '--workers', str(args.workers),
+               '--method', args.method, '--max-pairs', str(args.max_pairs), '--corpus'] + args.corpus
+        result = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+        result['summary'] = get_summary(result)
+        results.append(result)
+
+    print(f'{"mode":<10} {"records":>8} {"pairs":>8} {"parent rss":>11} '
+          f'{"rss":>8} {"pss":>8} {"shared":>8} {"private":>8}  (MB per worker)')
+    for result in results:
+        summary = result['summary']
+        print(f'{result["mode"]:<10} {result["nb_records"]:>8} {result["nb_pairs"]:>8} '
+              f'{result["parent"]["rss"] / 1024:>11.1f} {summary["rss"]:>8.1f} {summary["pss"]:>8.1f} '
+              f'{summary["shared"]:>8.1f} {summary["private"]:>8.1f}')
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
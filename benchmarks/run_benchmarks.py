@@ -0,0 +1,381 @@
+"""
+Benchmarks of dedupmarcxml
+
+This script measures the throughput of the main hot paths of the library:
+
+- extraction of brief records with :class:`dedupmarcxml.briefrecord.XmlBriefRecFactory`
+  and :class:`dedupmarcxml.briefrecord.JsonBriefRecFactory`
+- each `evaluate_*` function of :mod:`dedupmarcxml.evaluate`
+- :func:`dedupmarcxml.evaluate.evaluate_records_similarity`, with and without
+  :class:`dedupmarcxml.evaluate.EvaluationPlan`
+- each method of :func:`dedupmarcxml.evaluate.get_similarity_score`
+
+Records of `tests/requests` and `tests/data_for_testing` are always used. Additional
+corpora can be provided with `--corpus`: MARCXML files (collection or SRU response)
+and JSON files (one record, a list of records or one record per line).
+
+Results are written as JSON with ops/s, p50 / p99 latency and peak memory of
+each benchmark. With `--compare`, results are compared with a stored baseline
+and the script exits with code 1 if a benchmark is slower than the tolerance.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output baseline.json
+    python benchmarks/run_benchmarks.py --corpus corpus.xml --compare baseline.json
+"""
+
+import argparse
+import gc
+import inspect
+import json
+import os
+import pickle
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List, Dict, Callable, Tuple, Optional, NamedTuple, Iterator, Union
+
+from lxml import etree
+
+# The benchmarks should run from a checkout of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedupmarcxml import __version__
+from dedupmarcxml.briefrecord import XmlBriefRec, JsonBriefRec, BriefRec
+from dedupmarcxml import evaluate
+from dedupmarcxml.score import methods
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARC_NS = '{http://www.loc.gov/MARC21/slim}'
+
+
+class BenchmarkCase(NamedTuple):
+    """Function to benchmark with the list of its arguments"""
+    name: str
+    func: Callable
+    args: List[Tuple]
+
+
+def load_xml_records(path: str) -> List[etree.Element]:
+    """Load MARCXML records of a file
+
+    The file can be a MARC collection, a single record or a SRU response.
+
+    :param path: path of the XML file
+
+    :return: list of :class:`etree.Element` records
+    """
+    root = etree.parse(path).getroot()
+    records = list(root.iter(f'{MARC_NS}record'))
+    if len(records) == 0:
+        records = list(root.iter('record'))
+        records = [rec for rec in records if rec.find('leader') is not None]
+
+    return records
+
+
+def load_json_records(path: str, max_records: Optional[int] = None) -> List[Dict]:
+    """Load JSON records of a file
+
+    The file can contain one record, a list of records or one record per line
+    (extensions ".jsonl" and ".ndjson").
+
+    :param path: path of the JSON file
+    :param max_records: maximum number of records read from files with one record per line
+
+    :return: list of JSON records
+    """
+    if path.endswith(('.jsonl', '.ndjson')):
+        records = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if max_records is not None and len(records) >= max_records:
+                    break
+                if len(line.strip()) > 0:
+                    records.append(json.loads(line))
+        return records
+
+    with open(path, encoding='utf-8') as f:
+        txt = f.read()
+
+    try:
+        data = json.loads(txt)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in txt.splitlines() if len(line.strip()) > 0]
+
+    return data if isinstance(data, list) else [data]
+
+
+def iter_corpus_files(paths: List[str]) -> Iterator[str]:
+    """Iterate over the files of the corpus
+
+    :param paths: list of files or folders
+
+    :return: iterator of file paths
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                if file_name.endswith(('.xml', '.json', '.jsonl', '.ndjson')):
+                    yield os.path.join(path, file_name)
+        else:
+            yield path
+
+
+def load_corpus(paths: List[str], max_records: Optional[int] = None) -> Tuple[List[etree.Element], List[Dict]]:
+    """Load the records of the corpus
+
+    :param paths: list of files or folders
+    :param max_records: maximum number of records of each format
+
+    :return: tuple with the list of XML records and the list of JSON records
+    """
+    xml_records = []
+    json_records = []
+
+    for path in iter_corpus_files(paths):
+        if path.endswith('.xml'):
+            xml_records += load_xml_records(path)
+        else:
+            json_records += load_json_records(path, max_records)
+
+    if max_records is not None:
+        xml_records = xml_records[:max_records]
+        json_records = json_records[:max_records]
+
+    return xml_records, json_records
+
+
+def load_fixtures() -> Tuple[List[etree.Element], List[Dict]]:
+    """Load the records used by the unit tests
+
+    :return: tuple with the list of XML records and the list of JSON records
+    """
+    folder = os.path.join(ROOT_DIR, 'tests', 'requests')
+    xml_records = []
+    for file_name in sorted(os.listdir(folder)):
+        xml_records += load_xml_records(os.path.join(folder, file_name))
+
+    folder = os.path.join(ROOT_DIR, 'tests', 'data_for_testing')
+    json_records = []
+    for file_name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, file_name), 'rb') as f:
+            json_records.append(pickle.load(f))
+
+    return xml_records, json_records
+
+
+def get_pairs(recs: List[BriefRec], max_pairs: int, seed: int = 0) -> List[Tuple[BriefRec, BriefRec]]:
+    """Return the pairs of records to compare
+
+    If the number of possible pairs is too large, a random sample is used.
+
+    :param recs: list of brief records
+    :param max_pairs: maximum number of pairs
+    :param seed: seed of the random sample
+
+    :return: list of tuples with two brief records
+    """
+    nb_pairs = len(recs) * (len(recs) - 1) // 2
+    if nb_pairs <= max_pairs:
+        return [(recs[i], recs[j]) for i in range(len(recs)) for j in range(i + 1, len(recs))]
+
+    rnd = random.Random(seed)
+    pairs = set()
+    while len(pairs) < max_pairs:
+        i, j = rnd.sample(range(len(recs)), 2)
+        pairs.add((min(i, j), max(i, j)))
+
+    return [(recs[i], recs[j]) for i, j in sorted(pairs)]
+
+
+def get_cases(xml_records: List[etree.Element],
+              json_records: List[Dict],
+              max_pairs: int) -> List[BenchmarkCase]:
+    """Build the list of benchmarks
+
+    :param xml_records: list of XML records
+    :param json_records: list of JSON records
+    :param max_pairs: maximum number of pairs of records for the evaluations
+
+    :return: list of :class:`BenchmarkCase`
+    """
+    cases = [BenchmarkCase('parse.xml', XmlBriefRec, [(rec,) for rec in xml_records]),
+             BenchmarkCase('parse.json', JsonBriefRec, [(rec,) for rec in json_records])]
+
+    recs = [XmlBriefRec(rec) for rec in xml_records] + [JsonBriefRec(rec) for rec in json_records]
+    recs = [rec for rec in recs if rec.error is False]
+    pairs = get_pairs(recs, max_pairs)
+
+    for name, key, func in evaluate.FIELD_EVALUATORS:
+        if 'rec_type' in inspect.signature(func).parameters:
+            args = [(rec1.data[key], rec2.data[key],
+                     rec1.data['format']['type'] if rec1.data['format']['type'] == rec2.data['format']['type'] else None)
+                    for rec1, rec2 in pairs]
+        else:
+            args = [(rec1.data[key], rec2.data[key]) for rec1, rec2 in pairs]
+        cases.append(BenchmarkCase(f'evaluate.{name}', func, args))
+
+    cases.append(BenchmarkCase('evaluate_records_similarity',
+                               evaluate.evaluate_records_similarity,
+                               pairs))
+
+    plan = evaluate.EvaluationPlan()
+    cases.append(BenchmarkCase('evaluate_records_similarity.plan',
+                               lambda rec1, rec2: evaluate.evaluate_records_similarity(rec1, rec2, plan=plan),
+                               pairs))
+
+    sim_scores = [evaluate.evaluate_records_similarity(rec1, rec2) for rec1, rec2 in pairs]
+    for method in methods.method_list + ['random_forest_general']:
+        cases.append(BenchmarkCase(f'get_similarity_score.{method}',
+                                   evaluate.get_similarity_score,
+                                   [(sim_score, method) for sim_score in sim_scores]))
+
+    return cases
+
+
+def get_percentile(sorted_values: List[int], q: float) -> int:
+    """Return the percentile of sorted values
+
+    :param sorted_values: list of sorted values
+    :param q: percentile between 0 and 1
+
+    :return: value of the percentile
+    """
+    return sorted_values[int(round(q * (len(sorted_values) - 1)))]
+
+
+def run_case(case: BenchmarkCase, min_time: float, max_ops: int) -> Optional[Dict[str, Union[int, float]]]:
+    """Run one benchmark
+
+    Arguments are evaluated in loop until `min_time` is reached. Peak memory is
+    measured in a separate pass, tracemalloc slows down the execution.
+
+    :param case: :class:`BenchmarkCase` to run
+    :param min_time: minimum time of the measurement in seconds
+    :param max_ops: maximum number of operations
+
+    :return: dictionary with the results or None if no arguments are available
+    """
+    if len(case.args) == 0:
+        return None
+
+    # Warmup
+    for args in case.args[:10]:
+        case.func(*args)
+
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time and len(latencies) < max_ops:
+        for args in case.args:
+            t0 = time.perf_counter_ns()
+            case.func(*args)
+            latencies.append(time.perf_counter_ns() - t0)
+
+    gc.collect()
+    tracemalloc.start()
+    for args in case.args:
+        case.func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    total = sum(latencies)
+
+    return {'ops': len(latencies),
+            'ops_per_sec': len(latencies) / total * 1e9 if total > 0 else 0.0,
+            'p50_us': get_percentile(latencies, 0.5) / 1000,
+            'p99_us': get_percentile(latencies, 0.99) / 1000,
+            'peak_memory_kb': peak / 1024}
+
+
+def compare_results(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Compare the results with a baseline
+
+    :param results: dictionary with the results of the benchmarks
+    :param baseline: dictionary with the results of the baseline
+    :param tolerance: accepted relative loss of ops/s, 0.1 means 10%
+
+    :return: list of names of the benchmarks slower than the tolerance
+    """
+    regressions = []
+    print(f'{"benchmark":<45} {"baseline ops/s":>15} {"ops/s":>15} {"change":>8}')
+    for name, result in results.items():
+        if name not in baseline:
+            print(f'{name:<45} {"-":>15} {result["ops_per_sec"]:>15.1f} {"new":>8}')
+            continue
+
+        change = result['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1
+        flag = ''
+        if change < -tolerance:
+            regressions.append(name)
+            flag = ' REGRESSION'
+        print(f'{name:<45} {baseline[name]["ops_per_sec"]:>15.1f} {result["ops_per_sec"]:>15.1f} {change:>+8.1%}{flag}')
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks of dedupmarcxml')
+    parser.add_argument('--corpus', nargs='*', default=[],
+                        help='MARCXML or JSON files or folders used in addition to the test records')
+    parser.add_argument('--max-records', type=int, default=None,
+                        help='maximum number of records of each format loaded from the corpus')
+    parser.add_argument('--max-pairs', type=int, default=2000,
+                        help='maximum number of pairs of records for the evaluations')
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help='minimum time of each benchmark in seconds')
+    parser.add_argument('--max-ops', type=int, default=1000000,
+                        help='maximum number of operations of each benchmark')
+    parser.add_argument('--filter', default=None,
+                        help='regular expression, only matching benchmarks are run')
+    parser.add_argument('--output', default=None, help='path of the JSON file with the results')
+    parser.add_argument('--compare', default=None, help='path of a JSON file with baseline results')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='accepted relative loss of ops/s when comparing with the baseline')
+    args = parser.parse_args(argv)
+
+    xml_records, json_records = load_fixtures()
+    corpus_xml_records, corpus_json_records = load_corpus(args.corpus, args.max_records)
+    xml_records += corpus_xml_records
+    json_records += corpus_json_records
+
+    results = dict()
+    for case in get_cases(xml_records, json_records, args.max_pairs):
+        if args.filter is not None and re.search(args.filter, case.name) is None:
+            continue
+        result = run_case(case, args.min_time, args.max_ops)
+        if result is None:
+            continue
+        results[case.name] = result
+        print(f'{case.name:<45} {result["ops_per_sec"]:>12.1f} ops/s  p50 {result["p50_us"]:>10.1f} us  '
+              f'p99 {result["p99_us"]:>10.1f} us  peak {result["peak_memory_kb"]:>10.1f} kB', file=sys.stderr)
+
+    report = {'meta': {'version': __version__,
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'date': datetime.now().isoformat(timespec='seconds'),
+                       'nb_xml_records': len(xml_records),
+                       'nb_json_records': len(json_records)},
+              'results': results}
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_results(results, baseline, args.tolerance)
+        if len(regressions) > 0:
+            print(f'{len(regressions)} regression(s): {", ".join(regressions)}', file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
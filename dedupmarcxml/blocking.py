@@ -0,0 +1,363 @@
+"""
+Module to restrict the candidates of the comparisons
+
+Comparing each record with all other records is quadratic. This module
+provides indexes grouping the records in blocks. Only records of the same
+block are compared.
+
+Analytical records (articles, chapters) are grouped by parent record using
+the information of field 773: normalized title and ISSN / ISBN of the parent.
+Other records are grouped by standard numbers and first words of the title.
+
+Before blocking, records with exactly the same normalized content can be grouped
+in linear time with :func:`group_exact_duplicates`, they don't need to be evaluated.
+"""
+from dedupmarcxml.briefrecord import BriefRec
+from dedupmarcxml import tools
+from collections import defaultdict
+from typing import List, Dict, Set, Tuple, Iterator, Iterable, Optional, Callable
+import re
+
+# ISBD punctuation separating the main title from the other title information
+parent_title_sep_regex = re.compile(r'\s[:/=;]\s|\.\s-\s')
+
+# Keys of the data not used to detect exact duplicates, they differ between copies of a record
+EXACT_KEY_EXCLUDED_KEYS = ('rec_id', 'sys_nums')
+
+
+def is_analytical(rec: BriefRec) -> bool:
+    """Check if the record is an analytical record
+
+    :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+    :return: boolean indicating whether the record is analytical
+    """
+    rec_format = rec.data.get('format')
+    return rec_format is not None and rec_format.get('analytical') is True
+
+
+def normalize_parent_title(title: str) -> Optional[str]:
+    """Normalize the title of the parent record
+
+    Only the main title is kept, "ZAK : Zeitschrift für die
+    Ausgleichskassen" and "ZAK" have the same normalized title.
+
+    :param title: title of the parent, content of 773$t
+
+    :return: string with normalized title or None if title is empty
+    """
+    title = parent_title_sep_regex.split(title, maxsplit=1)[0]
+    title = tools.remove_special_chars(tools.to_ascii(title))
+    if len(title) > 0:
+        return title
+
+    return None
+
+
+def get_parent_keys(rec: BriefRec) -> List[str]:
+    """Return the keys of the parent blocks of a record
+
+    Keys are built with the parent information:
+    - 'parent_title:<normalized title>'
+    - 'parent_std_num:<issn or isbn>'
+
+    Only analytical records with parent information have keys.
+
+    :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+    :return: list of block keys, empty list if the record cannot be grouped
+    """
+    if is_analytical(rec) is False:
+        return []
+
+    parent = rec.data.get('parent')
+    if parent is None:
+        return []
+
+    keys = []
+    if parent.get('title') is not None:
+        title = normalize_parent_title(parent['title'])
+        if title is not None:
+            keys.append(f'parent_title:{title}')
+
+    for k in ['std_num', 'issn', 'isbn']:
+        if parent.get(k) is not None:
+            keys.append(f'parent_std_num:{parent[k]}')
+
+    return keys
+
+
+def get_title_key(title: str, nb_words: int = 3) -> Optional[str]:
+    """Return the block key of a title
+
+    The key is built with the first words of the normalized title.
+
+    :param title: title to use
+    :param nb_words: number of words of the key
+
+    :return: block key or None if the title is empty
+    """
+    words = tools.remove_special_chars(tools.to_ascii(title)).split()
+    if len(words) == 0:
+        return None
+
+    return f'title:{" ".join(words[:nb_words])}'
+
+
+def get_record_keys(rec: BriefRec) -> List[str]:
+    """Return the keys of the blocks of a record
+
+    Analytical records with parent information are grouped only with the
+    records of the same parent, see :func:`get_parent_keys`. The year of the parent
+    is not part of the keys: it is missing or differs in some copies of the same
+    record. Other records are grouped by standard numbers and by the
+    first words of the short titles.
+
+    :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+    :return: list of block keys
+    """
+    keys = get_parent_keys(rec)
+    if len(keys) > 0:
+        return keys
+
+    for std_num in rec.data.get('std_nums') or []:
+        keys.append(f'std_num:{std_num}')
+
+    for title in rec.data.get('short_titles') or []:
+        key = get_title_key(title)
+        if key is not None and key not in keys:
+            keys.append(key)
+
+    return keys
+
+
+def get_exact_key(rec: BriefRec) -> str:
+    """Return the key used to detect exact duplicates
+
+    The key is the fingerprint of the data of the record without the fields
+    of :data:`EXACT_KEY_EXCLUDED_KEYS`, see :meth:`dedupmarcxml.briefrecord.BriefRec.get_fingerprint`.
+
+    :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+    :return: hexadecimal string
+    """
+    return rec.get_fingerprint(exclude=EXACT_KEY_EXCLUDED_KEYS)
+
+
+def group_by_exact_key(rec_keys: Iterable[Tuple[str, str]]) -> List[List[str]]:
+    """Group record ids with the same exact key
+
+    A record id present several times is used only once, with its last key: a
+    record is never grouped with itself.
+
+    :param rec_keys: iterable of tuples with the record id and its exact key,
+        see :func:`get_exact_key`
+
+    :return: list of groups with at least two record ids, in order of first appearance
+    """
+    keys = dict(rec_keys)
+    groups: Dict[str, List[str]] = dict()
+    for rec_id, key in keys.items():
+        groups.setdefault(key, []).append(rec_id)
+
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def group_exact_duplicates(records: Iterable[BriefRec]) -> List[List[str]]:
+    """Group the records with exactly the same normalized content
+
+    Records of a group are duplicates without evaluation of their similarity.
+    Only one record of each group needs to be compared with the other records.
+
+    :param records: iterable of :class:`dedupmarcxml.briefrecord.BriefRec` objects
+
+    :return: list of groups with at least two record ids, in order of first appearance
+    """
+    return group_by_exact_key((rec.data['rec_id'], get_exact_key(rec)) for rec in records)
+
+
+class BlockIndex:
+    """Index of records grouped in blocks
+
+    A record is compared only with the records sharing at least one of its
+    block keys. Records with several keys are candidates of all records of
+    the corresponding blocks. Records without keys are not added to the index.
+
+    Blocks larger than `max_block_size` are ignored when looking for candidates,
+    they would generate too many comparisons.
+
+    :ivar blocks: dictionary with block keys and set of record ids
+    :ivar records: dictionary with record ids and :class:`dedupmarcxml.briefrecord.BriefRec` objects
+    :ivar max_block_size: maximum number of records of a block or None for no limit
+    """
+
+    def __init__(self,
+                 key_func: Callable[[BriefRec], List[str]] = get_record_keys,
+                 max_block_size: Optional[int] = None) -> None:
+        """Block index object
+
+        :param key_func: function returning the block keys of a record
+        :param max_block_size: maximum number of records of a block or None for no limit
+        """
+        self.key_func = key_func
+        self.max_block_size = max_block_size
+        self.blocks: Dict[str, Set[str]] = defaultdict(set)
+        self.records: Dict[str, BriefRec] = dict()
+        self._keys: Dict[str, List[str]] = dict()
+        self._order: Dict[str, int] = dict()
+        self._next_order = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, rec_id: str) -> bool:
+        return rec_id in self.records
+
+    def get(self, rec_id: str) -> Optional[BriefRec]:
+        """Return a record of the index
+
+        :param rec_id: record id
+
+        :return: :class:`dedupmarcxml.briefrecord.BriefRec` object or None if not indexed
+        """
+        return self.records.get(rec_id)
+
+    def get_block(self, key: str) -> Set[str]:
+        """Return the ids of the records of a block, whatever its size
+
+        :param key: block key
+
+        :return: set of record ids
+        """
+        return set(self.blocks.get(key, ()))
+
+    def add(self, rec: BriefRec) -> bool:
+        """Add a record to the index
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: boolean indicating whether the record has been indexed
+        """
+        keys = self.key_func(rec)
+        if len(keys) == 0:
+            return False
+
+        rec_id = rec.data['rec_id']
+        if rec_id in self.records:
+            self.remove(rec_id)
+
+        self.records[rec_id] = rec
+        self._keys[rec_id] = keys
+        self._order[rec_id] = self._next_order
+        self._next_order += 1
+        for key in keys:
+            self.blocks[key].add(rec_id)
+
+        return True
+
+    def remove(self, rec_id: str) -> None:
+        """Remove a record from the index
+
+        :param rec_id: record id of the record to remove
+        """
+        if rec_id not in self.records:
+            return
+
+        for key in self._keys.pop(rec_id):
+            self.blocks[key].discard(rec_id)
+            if len(self.blocks[key]) == 0:
+                del self.blocks[key]
+
+        del self.records[rec_id]
+        del self._order[rec_id]
+
+    def get_candidate_ids(self, rec: BriefRec) -> Set[str]:
+        """Return the ids of the records of the same blocks
+
+        The record does not need to be in the index.
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: set of record ids, the record itself is excluded
+        """
+        rec_id = rec.data['rec_id']
+        keys = self._keys[rec_id] if rec_id in self._keys else self.key_func(rec)
+
+        return self._get_ids_of_blocks(keys) - {rec_id}
+
+    def _get_ids_of_blocks(self, keys: List[str]) -> Set[str]:
+        """Return the union of the record ids of the blocks
+
+        Blocks larger than `max_block_size` are skipped.
+
+        :param keys: list of block keys
+
+        :return: set of record ids
+        """
+        rec_ids = set()
+        for key in keys:
+            block = self.blocks.get(key)
+            if block is None or (self.max_block_size is not None and len(block) > self.max_block_size):
+                continue
+            rec_ids.update(block)
+
+        return rec_ids
+
+    def get_candidates(self, rec: BriefRec) -> List[BriefRec]:
+        """Return the records of the same blocks
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: list of :class:`dedupmarcxml.briefrecord.BriefRec` objects
+        """
+        return [self.records[rec_id] for rec_id in self.get_candidate_ids(rec)]
+
+    def get_candidate_pairs(self) -> Iterator[Tuple[BriefRec, BriefRec]]:
+        """Iterate over the pairs of records to compare
+
+        Each pair is yielded only once, even if the records share several
+        blocks.
+
+        :return: iterator of tuples with two :class:`dedupmarcxml.briefrecord.BriefRec` objects
+        """
+        for rec_id, rec in self.records.items():
+            order = self._order[rec_id]
+            for candidate_id in self._get_ids_of_blocks(self._keys[rec_id]):
+                if self._order[candidate_id] > order:
+                    yield rec, self.records[candidate_id]
+
+    def get_block_sizes(self) -> Dict[str, int]:
+        """Return the number of records in each block
+
+        :return: dictionary with block keys and number of records
+        """
+        return {key: len(rec_ids) for key, rec_ids in self.blocks.items()}
+
+    def get_oversized_blocks(self) -> Dict[str, int]:
+        """Return the blocks ignored because of their size
+
+        :return: dictionary with block keys and number of records
+        """
+        if self.max_block_size is None:
+            return dict()
+
+        return {key: len(rec_ids) for key, rec_ids in self.blocks.items() if len(rec_ids) > self.max_block_size}
+
+
+class ParentIndex(BlockIndex):
+    """Index of analytical records grouped by parent record
+
+    An analytical record is compared only with the records sharing the
+    same parent title or the same parent ISSN / ISBN, see :func:`get_parent_keys`.
+
+    Records that cannot be grouped (not analytical or without 773 field) are
+    not added to the index.
+    """
+
+    def __init__(self, max_block_size: Optional[int] = None) -> None:
+        """Parent index object
+
+        :param max_block_size: maximum number of records of a block or None for no limit
+        """
+        super().__init__(get_parent_keys, max_block_size)
@@ -1,8 +1,11 @@
 from lxml import etree
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Dict, Union, Iterable, Iterator, Tuple, Any
+from functools import lru_cache
+from collections.abc import Mapping, MutableMapping
 import re
 import logging
 import json
+import hashlib
 from dedupmarcxml import tools
 from abc import ABC, abstractmethod
 
@@ -29,7 +32,7 @@ class BriefRec(ABC):
 
     def __str__(self) -> str:
         if self.data is not None:
-            return json.dumps(self.data, indent=4)
+            return json.dumps(dict(self.data), indent=4)
         else:
             return ''
 
@@ -45,6 +48,25 @@ class BriefRec(ABC):
     def __eq__(self, other) -> bool:
         return self.data['rec_id'] == other.data['rec_id']
 
+    def get_fingerprint(self, exclude: tuple = ('rec_id',)) -> str:
+        """Return a stable hash of the data of the record
+
+        Order of the standard and system numbers is not relevant, they are
+        sorted before hashing. The fingerprint is computed from the current data:
+        it changes when the record is modified.
+
+        :param exclude: keys of the data not used in the fingerprint, by default
+            two records with different ids and the same content have the same fingerprint
+
+        :return: hexadecimal string
+        """
+        data = {k: v for k, v in self.data.items() if k not in exclude}
+        for k in ['std_nums', 'sys_nums']:
+            if isinstance(data.get(k), list):
+                data[k] = sorted(data[k])
+        serialized = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+        return hashlib.blake2b(serialized.encode('utf-8'), digest_size=16).hexdigest()
+
     @abstractmethod
     def _get_bib_info(self) -> Dict:
         pass
@@ -68,7 +90,7 @@ class RawBriefRec(BriefRec):
 
         super().__init__()
 
-        if rec.__class__.__name__ == 'dict':
+        if isinstance(rec, Mapping):
             try:
                 self.data = {k: rec[k] for k in ['rec_id', 'format', 'titles', 'short_titles', 'creators', 'corp_creators', 'languages', 'extent', 'editions', 'years', 'publishers', 'series', 'parent', 'std_nums', 'sys_nums']}
             except KeyError as e:
@@ -85,17 +107,111 @@ class RawBriefRec(BriefRec):
     def _get_bib_info(self):
         return self.data
 
+class LazyBriefData(MutableMapping):
+    """Data of a brief record extracted on first access
+
+    Each field is extracted from the source record by the factory the first time it
+    is read, see :meth:`BriefRecFactory.get_field`, and then stored. Reading all the
+    fields, for example with :meth:`items`, extracts the missing fields: the result is
+    the same as :meth:`BriefRecFactory.get_bib_info`, keys are in the same order.
+
+    It is a mapping, not a dictionary: consumers working on the internal storage of
+    dictionaries would only see the extracted fields. Use :meth:`copy` or `dict()` to
+    get a plain dictionary, for example for :func:`json.dumps`. Copies and pickled
+    data are plain dictionaries.
+
+    Errors of the extraction are raised when the field is read.
+    """
+
+    def __init__(self, factory: type, bib: Union[etree.Element, Dict], fields: Optional[Iterable[str]] = None) -> None:
+        """Lazy data of a brief record
+
+        :param factory: :class:`BriefRecFactory` subclass used to extract the fields
+        :param bib: source record
+        :param fields: fields extracted immediately
+        """
+        self._factory = factory
+        self._bib = bib
+        self._values = dict()
+        self._deleted = set()
+        for key in fields if fields is not None else []:
+            self[key]
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._values:
+            return self._values[key]
+        if key not in self._factory.fields or key in self._deleted:
+            raise KeyError(key)
+        value = self._factory.get_field(self._bib, key)
+        self._values[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._deleted.discard(key)
+        self._values[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._values.pop(key, None)
+        if key in self._factory.fields:
+            self._deleted.add(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._values or (key in self._factory.fields and key not in self._deleted)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.materialize()._values)
+
+    def __len__(self) -> int:
+        return len(self.materialize()._values)
+
+    def get_extracted_fields(self) -> List[str]:
+        """Return the fields already extracted
+
+        :return: list of keys
+        """
+        return list(self._values)
+
+    def materialize(self) -> 'LazyBriefData':
+        """Extract all the missing fields
+
+        :return: the data itself
+        """
+        keys = [key for key in self._factory.fields if key not in self._deleted]
+        if all(key in self._values for key in keys):
+            return self
+
+        values = {key: self[key] for key in keys}
+        values.update(self._values)
+        self._values = values
+        return self
+
+    def __repr__(self) -> str:
+        return repr(self.copy())
+
+    def __reduce__(self) -> tuple:
+        return dict, (self.copy(),)
+
+    def copy(self) -> Dict:
+        return dict(self.materialize()._values)
+
+
 class XmlBriefRec(BriefRec):
-    def __init__(self, rec: etree.Element) -> None:
+    def __init__(self, rec: etree.Element, lazy: bool = False, fields: Optional[Iterable[str]] = None) -> None:
         """Brief record object
 
         :param rec: XML data of the record or :class:`SruRecord` object
+        :param lazy: if True, fields of the data are extracted on first access, see :class:`LazyBriefData`
+        :param fields: with `lazy`, fields extracted immediately
         """
         super().__init__()
 
         if rec.__class__.__name__ == '_Element':
             self.src_data = tools.remove_ns(rec)
-            self.data = self._get_bib_info()
+            self.data = self._get_bib_info() if lazy is False else LazyBriefData(XmlBriefRecFactory,
+                                                                                 self.src_data,
+                                                                                 fields)
         else:
             self.error = True
             self.error_messages.append(f'Wrong type of data provided: {type(rec)}')
@@ -106,16 +222,20 @@ class XmlBriefRec(BriefRec):
 
 
 class JsonBriefRec(BriefRec):
-    def __init__(self, rec: Dict) -> None:
+    def __init__(self, rec: Dict, lazy: bool = False, fields: Optional[Iterable[str]] = None) -> None:
         """Brief record object
 
         :param rec: XML data of the record or :class:`SruRecord` object
+        :param lazy: if True, fields of the data are extracted on first access, see :class:`LazyBriefData`
+        :param fields: with `lazy`, fields extracted immediately
         """
         super().__init__()
 
-        if rec.__class__.__name__ == 'dict':
-            self.src_data = rec
-            self.data = self._get_bib_info()
+        if isinstance(rec, dict):
+            self.src_data = JsonBriefRecFactory.get_indexed_record(rec)
+            self.data = self._get_bib_info() if lazy is False else LazyBriefData(JsonBriefRecFactory,
+                                                                                 self.src_data,
+                                                                                 fields)
         else:
             self.error = True
             self.error_messages.append(f'Wrong type of data provided: {type(rec)}')
@@ -131,9 +251,25 @@ class BriefRecFactory(ABC):
     The class can parse several fields of the Marc21 record.
 
     :cvar bib_type: :class:`etree.Element` or :class:`Dict`
+    :cvar fields: keys of the brief record information and names of the methods extracting them
     """
 
     bib_type = Union[etree.Element, Dict]
+    fields = {'rec_id': 'get_rec_id',
+              'format': 'get_format',
+              'titles': 'get_titles',
+              'short_titles': 'get_short_titles',
+              'creators': 'get_creators',
+              'corp_creators': 'get_corp_creators',
+              'languages': 'get_languages',
+              'extent': 'get_extent',
+              'editions': 'get_editions',
+              'years': 'get_years',
+              'publishers': 'get_publishers',
+              'series': 'get_series',
+              'parent': 'get_parent',
+              'std_nums': 'get_std_num',
+              'sys_nums': 'get_sys_nums'}
 
     @classmethod
     @abstractmethod
@@ -815,6 +951,29 @@ class BriefRecFactory(ABC):
 
         return leader7 == 'a'
 
+    @classmethod
+    def get_short_titles(cls, bib: bib_type) -> List[str]:
+        """
+        Get the main titles of the record, without subtitles.
+
+        :param bib: :class:`etree.Element`
+
+        :return: List of main titles of the record.
+        """
+        return [title['m'] for title in cls.get_titles(bib)]
+
+    @classmethod
+    def get_field(cls, bib: bib_type, key: str):
+        """
+        Get one field of the brief record information.
+
+        :param bib: :class:`etree.Element`
+        :param key: key of the field, see :attr:`fields`
+
+        :return: value of the field
+        """
+        return getattr(cls, cls.fields[key])(bib)
+
     @classmethod
     def get_bib_info(cls, bib: bib_type):
         """get_bib_info(bib: etree.Element)
@@ -823,21 +982,7 @@ class BriefRecFactory(ABC):
         :param bib: :class:`etree.Element`
         :return: json object with brief record information
         """
-        bib_info = {'rec_id': cls.get_rec_id(bib),
-                    'format': cls.get_format(bib),
-                    'titles': cls.get_titles(bib),
-                    'short_titles': [title['m'] for title in cls.get_titles(bib)],
-                    'creators': cls.get_creators(bib),
-                    'corp_creators': cls.get_corp_creators(bib),
-                    'languages': cls.get_languages(bib),
-                    'extent': cls.get_extent(bib),
-                    'editions': cls.get_editions(bib),
-                    'years': cls.get_years(bib),
-                    'publishers': cls.get_publishers(bib),
-                    'series': cls.get_series(bib),
-                    'parent': cls.get_parent(bib),
-                    'std_nums': cls.get_std_num(bib),
-                    'sys_nums': cls.get_sys_nums(bib)}
+        bib_info = {key: cls.get_field(bib, key) for key in cls.fields}
         return bib_info
 
 class XmlBriefRecFactory(BriefRecFactory):
@@ -917,16 +1062,89 @@ class XmlBriefRecFactory(BriefRecFactory):
         return []
 
 
+@lru_cache(maxsize=1024)
+def parse_json_path(path: str) -> Tuple[str, Optional[str]]:
+    """Parse a path of :class:`JsonBriefRecFactory`
+
+    Digit subfield codes are prefixed with "n" like in the JSON records. Result is
+    cached, a path is parsed only once.
+
+    :param path: path like "245$$a", "245" or "leader"
+
+    :return: tuple with the tag and the code of the subfield or None
+    """
+    path = path.split('$$')
+    if len(path) == 2:
+        return path[0], 'n' + path[1] if path[1].isdigit() else path[1]
+
+    return path[0], None
+
+
+class IndexedJsonRecord(dict):
+    """JSON record with an index of the values of its subfields
+
+    The index maps the tuples (tag, code) to the values of the subfields. It is
+    built on demand and shared by all the accessors of :class:`JsonBriefRecFactory`:
+    the datafields of a subfield are scanned only the first time it is read. The
+    record is a shallow copy of the source record and should not be modified.
+
+    :ivar subfields: dictionary with tuples (tag, code) and lists of values in
+        the order of the record
+    """
+
+    def __init__(self, rec: Dict) -> None:
+        """Indexed JSON record
+
+        :param rec: JSON record
+        """
+        super().__init__(rec)
+        self.subfields: Dict[Tuple[str, str], List[str]] = dict()
+
+    def get_values(self, tag: str, code: str) -> List[str]:
+        """Return the values of a subfield
+
+        :param tag: tag of the datafields
+        :param code: code of the subfield, see :func:`parse_json_path`
+
+        :return: list of the values in the order of the record, should not be modified
+        """
+        values = self.subfields.get((tag, code))
+        if values is None:
+            values = [subfield[code]
+                      for datafield in self['marc'].get(tag, [])
+                      for subfield in datafield['sub'] if code in subfield]
+            self.subfields[(tag, code)] = values
+
+        return values
+
+
 class JsonBriefRecFactory(BriefRecFactory):
     """Class to create a brief record from a json record
 
     The class can parse several fields of the json record. It can also
     summarize the result in a json object.
 
+    Records are indexed by :meth:`get_indexed_record`. Subfields of the tags
+    with many datafields are read in the index of :class:`IndexedJsonRecord`,
+    other tags are scanned directly: indexing costs more than the scan of a few
+    datafields. Values already indexed are always used.
+
     :cvar bib_type: :class:`Dict`
+    :cvar index_min_datafields: minimum number of datafields of a tag to use the index
     """
 
     bib_type = Dict
+    index_min_datafields = 4
+
+    @classmethod
+    def get_indexed_record(cls, bib: bib_type) -> IndexedJsonRecord:
+        """Return the record with the index of its subfields
+
+        :param bib: Marc21 record
+
+        :return: :class:`IndexedJsonRecord`, the record itself if already indexed
+        """
+        return bib if isinstance(bib, IndexedJsonRecord) else IndexedJsonRecord(bib)
 
     @classmethod
     def find(cls, bib: bib_type, path: str) -> Optional[Union[str, List[Dict]]]:
@@ -937,30 +1155,28 @@ class JsonBriefRecFactory(BriefRecFactory):
 
         :return: value found or None if not found
         """
-        path = path.split('$$')
+        tag, code = parse_json_path(path)
 
-        if path[0] == 'leader':
+        if tag == 'leader':
             return bib['marc']['leader']
 
-        elif path[0].startswith('00'):
-            return bib['marc'].get(path[0])
-
-        elif len(path) == 2:
-            datafields = bib['marc'].get(path[0], [])
+        datafields = bib['marc'].get(tag)
+        if datafields is None or tag.startswith('00'):
+            return datafields
 
-            code = 'n' + path[1] if path[1].isdigit() else path[1]
+        elif code is not None:
+            # Values already indexed are used, otherwise the scan stops at the first value
+            values = bib.subfields.get((tag, code)) if isinstance(bib, IndexedJsonRecord) else None
+            if values is not None:
+                return values[0] if len(values) > 0 else None
 
             for datafield in datafields:
                 for subfield in datafield['sub']:
                     if code in subfield:
                         return subfield[code]
+            return None
 
-        elif len(path) == 1:
-            datafields = bib['marc'].get(path[0])
-            if datafields is not None:
-                return datafields[0]['sub']
-
-        return None
+        return datafields[0]['sub']
 
     @classmethod
     def findall(cls, bib: bib_type, path: str) -> List[Union[str, List[Dict]]]:
@@ -971,20 +1187,28 @@ class JsonBriefRecFactory(BriefRecFactory):
 
         :return: value found or None if not found
         """
-        path = path.split('$$')
+        tag, code = parse_json_path(path)
 
-        if len(path) == 2:
-            values = []
-            datafields = bib['marc'].get(path[0], [])
-            code = 'n' + path[1] if path[1].isdigit() else path[1]
-            for datafield in datafields:
-                for subfield in datafield['sub']:
-                    if code in subfield:
-                        values.append(subfield[code])
-            return values
+        datafields = bib['marc'].get(tag)
+        if datafields is None:
+            return []
 
-        elif len(path) == 1:
-            fields = bib['marc'].get(path[0], [])
-            return [field['sub'] for field in fields]
+        elif code is not None:
+            if len(datafields) >= cls.index_min_datafields and isinstance(bib, IndexedJsonRecord):
+                return list(bib.get_values(tag, code))
+
+            return [subfield[code] for datafield in datafields for subfield in datafield['sub'] if code in subfield]
 
-        return []
\ No newline at end of file
+        return [field['sub'] for field in datafields]
+
+    @classmethod
+    def get_bib_info(cls, bib: bib_type):
+        """get_bib_info(bib: Dict)
+        Return a json object with the brief record information
+
+        The record is indexed once for all the fields.
+
+        :param bib: :class:`Dict`
+        :return: json object with brief record information
+        """
+        return super().get_bib_info(cls.get_indexed_record(bib))
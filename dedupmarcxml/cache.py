@@ -0,0 +1,219 @@
+"""
+Module to cache the similarity scores of pairs of records
+
+Scores are stored by content: the key of a pair is made of the fingerprints of the
+records, see :meth:`dedupmarcxml.briefrecord.BriefRec.get_fingerprint`, and the name
+of the method. The fingerprints are sorted: `(rec1, rec2)` and `(rec2, rec1)` share
+the same entry. When a record is modified, its fingerprint changes and the old
+entries are no longer used.
+
+Two tiers are available:
+- in memory: the least recently used entries are removed when the cache is full
+- SQLite: optional, entries are kept between runs
+
+Example:
+
+>>> with ScoreCache(path='scores.db') as cache:
+...     score = cache.get_score(rec1, rec2, method='mean')
+...     print(cache.get_stats()['hit_rate'])
+"""
+from dedupmarcxml.briefrecord import BriefRec
+from dedupmarcxml.evaluate import evaluate_records_similarity, get_similarity_score, EvaluationPlan
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Union
+import threading
+import sqlite3
+
+CacheKey = Tuple[str, str, str]
+
+
+def get_cache_key(fingerprint1: str, fingerprint2: str, method: str) -> CacheKey:
+    """Return the key of a pair of records in the cache
+
+    :param fingerprint1: fingerprint of the first record
+    :param fingerprint2: fingerprint of the second record
+    :param method: name of the method used to compute the score
+
+    :return: tuple with the sorted fingerprints and the method
+    """
+    if fingerprint1 > fingerprint2:
+        fingerprint1, fingerprint2 = fingerprint2, fingerprint1
+    return fingerprint1, fingerprint2, method
+
+
+class ScoreCache:
+    """Cache of the similarity scores of pairs of records
+
+    The cache is thread safe. Writes to SQLite are committed every `commit_every`
+    new entries and when the cache is closed.
+
+    :ivar max_size: maximum number of entries in memory
+    :ivar path: path of the SQLite database or None
+    :ivar stats: dictionary with the number of memory hits, SQLite hits and misses
+    """
+
+    def __init__(self, max_size: int = 100000, path: Optional[str] = None, commit_every: int = 1000) -> None:
+        """Score cache
+
+        :param max_size: maximum number of entries in memory
+        :param path: path of the SQLite database, no persistent tier if None
+        :param commit_every: number of new entries between two commits of the database
+        """
+        self.max_size = max_size
+        self.path = path
+        self.commit_every = commit_every
+        self.stats = {'memory_hits': 0, 'sqlite_hits': 0, 'misses': 0}
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._nb_uncommitted = 0
+        self._connection = None
+
+        if path is not None:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS scores ('
+                                     'fingerprint1 TEXT NOT NULL, '
+                                     'fingerprint2 TEXT NOT NULL, '
+                                     'method TEXT NOT NULL, '
+                                     'score REAL NOT NULL, '
+                                     'PRIMARY KEY (fingerprint1, fingerprint2, method))')
+            self._connection.commit()
+
+    def __enter__(self) -> 'ScoreCache':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _add_to_memory(self, key: CacheKey, score: float) -> None:
+        """Add an entry in memory, remove the least recently used entry if the cache is full
+
+        :param key: key of the entry
+        :param score: similarity score
+        """
+        self._entries[key] = score
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, rec1: Union[BriefRec, str], rec2: Union[BriefRec, str], method: str) -> Optional[float]:
+        """Return the cached score of a pair of records
+
+        :param rec1: :class:`dedupmarcxml.briefrecord.BriefRec` object or its fingerprint
+        :param rec2: :class:`dedupmarcxml.briefrecord.BriefRec` object or its fingerprint
+        :param method: name of the method used to compute the score
+
+        :return: score or None if the pair is not in the cache
+        """
+        key = get_cache_key(self._get_fingerprint(rec1), self._get_fingerprint(rec2), method)
+
+        with self._lock:
+            score = self._entries.get(key)
+            if score is not None:
+                self._entries.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return score
+
+            if self._connection is not None:
+                row = self._connection.execute('SELECT score FROM scores '
+                                               'WHERE fingerprint1 = ? AND fingerprint2 = ? AND method = ?',
+                                               key).fetchone()
+                if row is not None:
+                    self._add_to_memory(key, row[0])
+                    self.stats['sqlite_hits'] += 1
+                    return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def set(self, rec1: Union[BriefRec, str], rec2: Union[BriefRec, str], method: str, score: float) -> None:
+        """Store the score of a pair of records
+
+        :param rec1: :class:`dedupmarcxml.briefrecord.BriefRec` object or its fingerprint
+        :param rec2: :class:`dedupmarcxml.briefrecord.BriefRec` object or its fingerprint
+        :param method: name of the method used to compute the score
+        :param score: similarity score
+        """
+        key = get_cache_key(self._get_fingerprint(rec1), self._get_fingerprint(rec2), method)
+        score = float(score)
+
+        with self._lock:
+            self._add_to_memory(key, score)
+            if self._connection is not None:
+                self._connection.execute('INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)', key + (score,))
+                self._nb_uncommitted += 1
+                if self._nb_uncommitted >= self.commit_every:
+                    self._connection.commit()
+                    self._nb_uncommitted = 0
+
+    def get_score(self,
+                  rec1: BriefRec,
+                  rec2: BriefRec,
+                  method: str = 'mean',
+                  plan: Optional[EvaluationPlan] = None) -> float:
+        """Return the similarity score of a pair of records, compute it if not cached
+
+        :param rec1: :class:`dedupmarcxml.briefrecord.BriefRec` object
+        :param rec2: :class:`dedupmarcxml.briefrecord.BriefRec` object
+        :param method: method of :func:`dedupmarcxml.evaluate.get_similarity_score`
+        :param plan: optional :class:`dedupmarcxml.evaluate.EvaluationPlan` used to evaluate the records
+
+        :return: similarity score
+        """
+        fingerprint1, fingerprint2 = rec1.get_fingerprint(), rec2.get_fingerprint()
+        score = self.get(fingerprint1, fingerprint2, method)
+        if score is None:
+            if plan is not None:
+                # Prepared data of a record modified in place is computed again
+                rec1, rec2 = plan.prepare(rec1, fingerprint1), plan.prepare(rec2, fingerprint2)
+            sim_analysis = evaluate_records_similarity(rec1, rec2, plan=plan)
+            score = float(get_similarity_score(sim_analysis, method=method))
+            self.set(fingerprint1, fingerprint2, method, score)
+
+        return score
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        """Return the statistics of the cache
+
+        :return: dictionary with the number of memory hits, SQLite hits, misses,
+            the hit rate and the number of entries in memory
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            nb_requests = stats['memory_hits'] + stats['sqlite_hits'] + stats['misses']
+            stats['hit_rate'] = (stats['memory_hits'] + stats['sqlite_hits']) / nb_requests if nb_requests > 0 else 0.0
+            stats['memory_size'] = len(self._entries)
+        return stats
+
+    def clear(self) -> None:
+        """Remove the entries in memory and reset the statistics, the SQLite tier is kept"""
+        with self._lock:
+            self._entries.clear()
+            self.stats = {'memory_hits': 0, 'sqlite_hits': 0, 'misses': 0}
+
+    def commit(self) -> None:
+        """Commit the new entries in the SQLite database"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.commit()
+                self._nb_uncommitted = 0
+
+    def close(self) -> None:
+        """Commit the new entries and close the SQLite database"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.commit()
+                self._connection.close()
+                self._connection = None
+
+    @staticmethod
+    def _get_fingerprint(rec: Union[BriefRec, str]) -> str:
+        """Return the fingerprint of a record
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object or its fingerprint
+
+        :return: fingerprint
+        """
+        return rec if isinstance(rec, str) else rec.get_fingerprint()
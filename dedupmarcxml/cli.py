@@ -0,0 +1,399 @@
+"""
+Command line interface of dedupmarcxml
+
+The `dedupmarcxml` command runs the whole deduplication of a set of files:
+
+1. records are read from MARCXML / JSON files and brief records are extracted in parallel,
+   see :mod:`dedupmarcxml.readers`
+2. records with exactly the same content are grouped, see :func:`dedupmarcxml.blocking.group_exact_duplicates`,
+   only the first record of each group is kept for the next steps
+3. records are grouped in blocks, see :class:`dedupmarcxml.blocking.BlockIndex`
+4. pairs of records of the same blocks are scored in parallel with the chosen method
+5. matching pairs and clusters of duplicates are written in the output folder
+
+Output files:
+- pairs.csv: columns rec_id1, rec_id2 and score of the pairs above the threshold, exact
+  duplicates have a score of 1.0
+- clusters.csv: columns cluster_id and rec_id of the clusters with at least two records
+- flagged_clusters.csv: same columns, clusters with a mean score lower than `--min-cluster-score`
+- profile.prom: metrics in Prometheus text format, only with `--profile`
+
+With `--preload`, the resources are loaded and the objects of the main process are
+frozen before forking the workers, see :func:`dedupmarcxml.preload.preload_for_fork`.
+The workers share the pages of the models and of the records instead of copying them.
+It has no effect with a single worker or without the "fork" start method.
+
+Usage:
+    dedupmarcxml records.xml other_records/ --output results --method mean --threshold 0.8
+"""
+from dedupmarcxml.briefrecord import BriefRec, RawBriefRec
+from dedupmarcxml.blocking import BlockIndex, get_exact_key, group_by_exact_key
+from dedupmarcxml.clustering import EdgeStore
+from dedupmarcxml.evaluate import evaluate_records_similarity, get_similarity_scores, get_two_stage_scores, \
+    EvaluationPlan
+from dedupmarcxml.score import methods
+from dedupmarcxml import readers
+from dedupmarcxml import instrumentation
+from dedupmarcxml import preload
+from typing import List, Dict, Iterator, Iterable, Tuple, Optional, Union, Any, Callable
+from collections import deque
+import multiprocessing
+import multiprocessing.pool
+import argparse
+import logging
+import time
+import csv
+import sys
+import os
+
+# State of the worker processes, see :func:`_init_score_worker`
+_worker_records: Dict[str, BriefRec] = dict()
+_worker_plan: Optional[EvaluationPlan] = None
+_worker_options: Dict[str, Any] = dict()
+_worker_in_child = False
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Return the parser of the command line arguments
+
+    :return: :class:`argparse.ArgumentParser` object
+    """
+    parser = argparse.ArgumentParser(prog='dedupmarcxml',
+                                     description='Find duplicated records in MARCXML and JSON files')
+    parser.add_argument('paths', nargs='+', help='MARCXML or JSON files or folders')
+    parser.add_argument('-o', '--output', default='.', help='folder of the output files')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes, default is the number of CPUs')
+    parser.add_argument('-m', '--method', default='mean',
+                        choices=methods.method_list + ['random_forest_general'],
+                        help='method used to compute the similarity score')
+    parser.add_argument('-t', '--threshold', type=float, default=0.8,
+                        help='minimum similarity score of the duplicates')
+    parser.add_argument('--two-stage', nargs=2, type=float, metavar=('LOWER', 'UPPER'), default=None,
+                        help='with a classifier method, pairs with a mean score lower than LOWER or higher '
+                             'than UPPER are decided without the classifier')
+    parser.add_argument('--prediction-cache', type=float, metavar='PRECISION', default=None,
+                        help='cache the predictions of the classifiers, results are quantized with PRECISION')
+    parser.add_argument('-c', '--chunk-size', type=int, default=1000,
+                        help='number of records or pairs sent at once to a worker')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='maximum number of chunks sent to the workers and not yet returned, default '
+                             'is twice the number of workers')
+    parser.add_argument('--max-block-size', type=int, default=1000,
+                        help='blocks with more records are ignored, 0 for no limit')
+    parser.add_argument('--max-cluster-size', type=int, default=0,
+                        help='pairs creating larger clusters are ignored, 0 for no limit')
+    parser.add_argument('--min-cluster-score', type=float, default=None,
+                        help='clusters with a lower mean score are written in flagged_clusters.csv')
+    parser.add_argument('--no-exact', action='store_true',
+                        help='evaluate exact duplicates like the other records')
+    parser.add_argument('--preload', action='store_true',
+                        help='load the resources and freeze the objects before forking the workers to share '
+                             'their memory')
+    parser.add_argument('--profile', action='store_true',
+                        help='collect metrics of the evaluations and write them in profile.prom')
+    parser.add_argument('--profile-sample', type=int, default=16,
+                        help='with --profile, one evaluation out of N is timed')
+    return parser
+
+
+def iter_chunks(items: Iterable, chunk_size: int) -> Iterator[List]:
+    """Split an iterable in lists of `chunk_size` items
+
+    :param items: iterable to split
+    :param chunk_size: maximum number of items of each list
+
+    :return: iterator of lists
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def map_chunks(func: Callable, chunks: Iterable[List], pool: Optional[multiprocessing.pool.Pool] = None,
+               max_pending: int = 2) -> Iterator:
+    """Apply a function to chunks with a pool of worker processes
+
+    Chunks are read from the iterable only when a result is returned: at most
+    `max_pending` chunks are sent to the workers and not yet returned, memory
+    doesn't depend on the size of the input. Order of the results is kept.
+
+    :param func: function applied to each chunk
+    :param chunks: iterable of chunks, see :func:`iter_chunks`
+    :param pool: pool of worker processes, if None the chunks are handled in the current process
+    :param max_pending: maximum number of chunks in progress
+
+    :return: iterator of the results
+    """
+    if pool is None:
+        yield from map(func, chunks)
+        return
+
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.apply_async(func, (chunk,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while len(pending) > 0:
+        yield pending.popleft().get()
+
+
+def _parse_chunk(chunk: List[Tuple[str, Union[bytes, Dict]]]) -> List[Tuple[Dict, str]]:
+    """Extract the brief records of a chunk of raw records
+
+    :param chunk: list of raw records, see :func:`dedupmarcxml.readers.iter_raw_records`
+
+    :return: list of tuples with the data of the brief records and their exact key,
+        see :func:`dedupmarcxml.blocking.get_exact_key`, records with errors are skipped
+    """
+    results = []
+    for rec_format, raw in chunk:
+        rec = readers.parse_raw_record(rec_format, raw)
+        if rec.error is True:
+            logging.error(f'Record skipped: {rec.error_messages}')
+            continue
+        results.append((rec.data, get_exact_key(rec)))
+    return results
+
+
+def _init_score_worker(records: Dict[str, BriefRec], options: Dict[str, Any]) -> None:
+    """Initialize a worker process scoring pairs
+
+    With the "fork" start method, the records are shared with the main process
+    and are not copied.
+
+    :param records: dictionary with record ids and brief records
+    :param options: dictionary with the method, the threshold, the bounds of the two-stage
+        scoring, the precision of the prediction cache and the profiling options
+    """
+    global _worker_records, _worker_plan, _worker_options, _worker_in_child
+    _worker_records = records
+    _worker_plan = EvaluationPlan()
+    _worker_options = options
+    _worker_in_child = multiprocessing.parent_process() is not None
+    if options['prediction_cache'] is not None:
+        methods.enable_prediction_cache(precision=options['prediction_cache'])
+    if _worker_in_child is True and options['profile'] is True:
+        # Metrics inherited from the main process are removed, they would be counted twice
+        instrumentation.reset()
+        instrumentation.enable(options['profile_sample'])
+
+
+def _score_chunk(chunk: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str, float]], Dict[str, int], Optional[Dict]]:
+    """Score a chunk of pairs of records
+
+    Scores of the chunk are computed at once, see :func:`dedupmarcxml.evaluate.get_similarity_scores`.
+
+    :param chunk: list of tuples with the ids of the records to compare
+
+    :return: tuple with the list of matching pairs with their score, the report of
+        the scoring (number of pairs and with two-stage scoring number of pairs
+        handled by each stage) and the snapshot of the metrics of the worker process
+        if profiling is enabled
+    """
+    sim_analyses = [evaluate_records_similarity(_worker_records[rec_id1], _worker_records[rec_id2], plan=_worker_plan)
+                    for rec_id1, rec_id2 in chunk]
+    if _worker_options['two_stage'] is not None and _worker_options['method'] != 'mean':
+        result = get_two_stage_scores(sim_analyses, _worker_options['method'], *_worker_options['two_stage'])
+        scores = result.scores
+        report = result.get_report()
+    else:
+        scores = get_similarity_scores(sim_analyses, _worker_options['method'])
+        report = {'nb_pairs': len(chunk)}
+
+    matches = [(rec_id1, rec_id2, float(score))
+               for (rec_id1, rec_id2), score in zip(chunk, scores) if score >= _worker_options['threshold']]
+
+    snapshot = None
+    if _worker_in_child is True and _worker_options['profile'] is True:
+        snapshot = instrumentation.snapshot()
+        instrumentation.reset()
+
+    return matches, report, snapshot
+
+
+def _get_pool(workers: int,
+              initializer=None,
+              initargs=(),
+              preload_fork: bool = False) -> Optional[multiprocessing.pool.Pool]:
+    """Return a pool of worker processes or None if only one worker is required
+
+    The "fork" start method is used when available, records don't need to be
+    copied to the workers.
+
+    :param workers: number of worker processes
+    :param initializer: function called by each worker at start
+    :param initargs: arguments of the initializer
+    :param preload_fork: if True, :func:`dedupmarcxml.preload.preload_for_fork` is called
+        before forking the workers
+
+    :return: :class:`multiprocessing.pool.Pool` object or None
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return None
+
+    methods_available = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods_available else None)
+    if preload_fork is True and context.get_start_method() == 'fork':
+        preload.preload_for_fork()
+    return context.Pool(workers, initializer=initializer, initargs=initargs)
+
+
+def _observe_stage(name: str, start: float) -> None:
+    """Record the duration of a stage of the command if profiling is enabled
+
+    :param name: name of the stage
+    :param start: start time of the stage, :func:`time.perf_counter` value
+    """
+    if instrumentation.enabled is True:
+        instrumentation.count('stage', name)
+        instrumentation.observe('stage', name, time.perf_counter() - start)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of the `dedupmarcxml` command
+
+    :param argv: list of arguments, default is `sys.argv[1:]`
+
+    :return: exit code
+    """
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    os.makedirs(args.output, exist_ok=True)
+
+    if args.profile is True:
+        instrumentation.reset()
+        instrumentation.enable(args.profile_sample)
+
+    try:
+        _run(args)
+    finally:
+        instrumentation.disable()
+        methods.disable_prediction_cache()
+        if args.preload is True:
+            preload.unfreeze()
+
+    return 0
+
+
+def _run(args: argparse.Namespace) -> None:
+    """Run the deduplication, see :func:`main`
+
+    :param args: parsed command line arguments
+    """
+
+    # Extract brief records
+    start = time.perf_counter()
+    max_pending = args.max_pending if args.max_pending is not None else 2 * args.workers
+    pool = _get_pool(args.workers, preload_fork=args.preload)
+    chunks = iter_chunks(readers.iter_raw_records(args.paths), args.chunk_size)
+    results = map_chunks(_parse_chunk, chunks, pool, max_pending)
+    # Last version of a record id present several times is kept
+    records = dict()
+    exact_keys = dict()
+    for chunk in results:
+        for data, exact_key in chunk:
+            records[data['rec_id']] = RawBriefRec(data)
+            exact_keys[data['rec_id']] = exact_key
+    if pool is not None:
+        pool.close()
+        pool.join()
+    _observe_stage('parse', start)
+    logging.info(f'{len(records)} records extracted')
+
+    # Group exact duplicates, only the first record of each group is compared with the other records
+    matches = []
+    exact_duplicates = set()
+    if args.no_exact is False:
+        start = time.perf_counter()
+        for group in group_by_exact_key(exact_keys.items()):
+            matches += [(group[0], rec_id, 1.0) for rec_id in group[1:]]
+            exact_duplicates.update(group[1:])
+        _observe_stage('exact', start)
+        logging.info(f'{len(exact_duplicates)} exact duplicates found')
+    del exact_keys
+
+    # Group records in blocks
+    start = time.perf_counter()
+    index = BlockIndex(max_block_size=args.max_block_size if args.max_block_size > 0 else None)
+    for rec_id, rec in records.items():
+        if rec_id not in exact_duplicates:
+            index.add(rec)
+    _observe_stage('blocking', start)
+    oversized_blocks = index.get_oversized_blocks()
+    logging.info(f'{len(index.blocks)} blocks, {len(oversized_blocks)} blocks ignored because of their size')
+    for key, size in sorted(oversized_blocks.items(), key=lambda item: -item[1])[:10]:
+        logging.warning(f'Block ignored: {key} ({size} records)')
+
+    # Score the pairs of records of the same blocks
+    start = time.perf_counter()
+    options = {'method': args.method,
+               'threshold': args.threshold,
+               'two_stage': args.two_stage,
+               'prediction_cache': args.prediction_cache,
+               'profile': args.profile,
+               'profile_sample': args.profile_sample}
+    report: Dict[str, int] = dict()
+    pool = _get_pool(args.workers, _init_score_worker, (records, options), preload_fork=args.preload)
+    pairs = ((rec1.data['rec_id'], rec2.data['rec_id']) for rec1, rec2 in index.get_candidate_pairs())
+    chunks = iter_chunks(pairs, args.chunk_size)
+    results = map_chunks(_score_chunk, chunks, pool, max_pending)
+    for chunk_matches, chunk_report, snapshot in results:
+        matches += chunk_matches
+        for key, nb in chunk_report.items():
+            report[key] = report.get(key, 0) + nb
+        if snapshot is not None:
+            instrumentation.merge(snapshot)
+    if pool is not None:
+        pool.close()
+        pool.join()
+    _observe_stage('scoring', start)
+    logging.info(f'{len(matches)} matching pairs, {report.get("nb_pairs", 0)} evaluated pairs')
+    if 'nb_classified' in report:
+        logging.info(f'Two-stage scoring: {report["nb_rejected"]} pairs rejected and {report["nb_accepted"]} '
+                     f'pairs accepted by the mean, {report["nb_classified"]} pairs scored by the classifier')
+
+    # Write matching pairs and clusters
+    start = time.perf_counter()
+    matches.sort()
+    with open(os.path.join(args.output, 'pairs.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['rec_id1', 'rec_id2', 'score'])
+        writer.writerows(matches)
+
+    edges = EdgeStore()
+    edges.add_pairs(matches)
+    result = edges.get_clusters(0.0,
+                                max_cluster_size=args.max_cluster_size if args.max_cluster_size > 0 else None,
+                                min_mean_score=args.min_cluster_score)
+    outputs = [('clusters.csv', result.clusters)]
+    if args.min_cluster_score is not None:
+        outputs.append(('flagged_clusters.csv', result.flagged_clusters))
+    for file_name, clusters in outputs:
+        with open(os.path.join(args.output, file_name), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['cluster_id', 'rec_id'])
+            for cluster_id, cluster in enumerate(clusters, start=1):
+                writer.writerows([cluster_id, rec_id] for rec_id in cluster)
+    _observe_stage('output', start)
+    logging.info(f'{len(result.clusters)} clusters written in {args.output}, '
+                 f'{len(result.flagged_clusters)} clusters flagged, '
+                 f'{result.nb_rejected_edges} pairs ignored because of the size of the clusters')
+
+    if args.profile is True:
+        instrumentation.dump_prometheus(os.path.join(args.output, 'profile.prom'))
+        stats = instrumentation.get_stats()
+        for group in ['stage', 'evaluator', 'method']:
+            for name, metric in sorted(stats.get(group, {}).items(), key=lambda item: -item[1]['estimated_time']):
+                logging.info(f'{group} {name}: {metric["calls"]} calls, {metric["estimated_time"]:.3f} s')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Module to group scored pairs of records in clusters of duplicates
+
+Scored pairs are stored once in an :class:`EdgeStore`, records are numbered and
+edges are kept in compact arrays. Clusters are the connected components of the
+edges above a threshold, they are computed with an array-backed :class:`UnionFind`.
+The same edges can be clustered with several thresholds without scoring the
+records again, see :meth:`EdgeStore.sweep`.
+
+Transitive matches can chain unrelated records in giant clusters. Two guards are
+available:
+- `max_cluster_size`: edges are processed from the highest to the lowest score,
+  an edge merging two clusters in a cluster larger than the limit is rejected
+- `min_mean_score`: clusters whose mean score of internal edges is lower than
+  the limit are flagged and returned separately
+
+Example:
+
+>>> edges = EdgeStore()
+>>> edges.add_pairs([('1', '2', 0.95), ('2', '3', 0.82), ('4', '5', 0.9)])
+>>> edges.get_clusters(0.8).clusters
+[['1', '2', '3'], ['4', '5']]
+>>> {threshold: result.clusters for threshold, result in edges.sweep([0.8, 0.9]).items()}
+{0.8: [['1', '2', '3'], ['4', '5']], 0.9: [['1', '2'], ['4', '5']]}
+"""
+from array import array
+from typing import List, Dict, Iterable, Tuple, Optional, NamedTuple
+import numpy as np
+
+
+class UnionFind:
+    """Disjoint sets of integers stored in arrays
+
+    Sets are merged by size and paths are halved during the search of the roots.
+
+    :ivar parents: array with the parent of each element
+    :ivar sizes: array with the size of the set of each root
+    """
+
+    def __init__(self, size: int = 0) -> None:
+        """Union-find object
+
+        :param size: number of elements, each element is in its own set
+        """
+        self.parents = array('l', range(size))
+        self.sizes = array('l', [1]) * size
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def add(self) -> int:
+        """Add a new element in its own set
+
+        :return: new element
+        """
+        element = len(self.parents)
+        self.parents.append(element)
+        self.sizes.append(1)
+        return element
+
+    def find(self, element: int) -> int:
+        """Return the root of the set of an element
+
+        :param element: element
+
+        :return: root element
+        """
+        parents = self.parents
+        while parents[element] != element:
+            parents[element] = parents[parents[element]]
+            element = parents[element]
+        return element
+
+    def union(self, element1: int, element2: int, max_size: Optional[int] = None) -> bool:
+        """Merge the sets of two elements
+
+        :param element1: element
+        :param element2: element
+        :param max_size: the sets are not merged if the new set would be larger
+
+        :return: False if the merge has been rejected because of `max_size`
+        """
+        root1, root2 = self.find(element1), self.find(element2)
+        if root1 == root2:
+            return True
+
+        size = self.sizes[root1] + self.sizes[root2]
+        if max_size is not None and size > max_size:
+            return False
+
+        if self.sizes[root1] < self.sizes[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        self.sizes[root1] = size
+        return True
+
+    def get_roots(self) -> np.ndarray:
+        """Return the root of each element
+
+        :return: numpy array of roots
+        """
+        return np.array([self.find(element) for element in range(len(self.parents))], dtype=np.int64)
+
+
+class ClusteringResult(NamedTuple):
+    """Result of the clustering of the edges of a :class:`EdgeStore`
+
+    Clusters are sorted lists of record ids with at least two records.
+    """
+    threshold: float
+    clusters: List[List[str]]
+    flagged_clusters: List[List[str]]
+    nb_rejected_edges: int
+
+
+class EdgeStore:
+    """Scored pairs of records
+
+    Record ids are numbered in order of appearance. Edges are stored in arrays
+    of 32 bits integers and floats. Each pair should be added only once.
+
+    :ivar rec_ids: list of record ids, the position is the number of the record
+    """
+
+    def __init__(self) -> None:
+        """Edge store object"""
+        self.rec_ids: List[str] = []
+        self._numbers: Dict[str, int] = dict()
+        self._nodes1 = array('i')
+        self._nodes2 = array('i')
+        self._scores = array('f')
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def get_number(self, rec_id: str) -> int:
+        """Return the number of a record, the record is added if required
+
+        :param rec_id: record id
+
+        :return: number of the record
+        """
+        number = self._numbers.get(rec_id)
+        if number is None:
+            number = self._numbers[rec_id] = len(self.rec_ids)
+            self.rec_ids.append(rec_id)
+        return number
+
+    def add(self, rec_id1: str, rec_id2: str, score: float) -> None:
+        """Add a scored pair of records
+
+        :param rec_id1: id of the first record
+        :param rec_id2: id of the second record
+        :param score: similarity score
+        """
+        self._nodes1.append(self.get_number(rec_id1))
+        self._nodes2.append(self.get_number(rec_id2))
+        self._scores.append(score)
+
+    def add_pairs(self, pairs: Iterable[Tuple[str, str, float]]) -> None:
+        """Add scored pairs of records
+
+        :param pairs: iterable of tuples with the ids of the records and the score
+        """
+        for rec_id1, rec_id2, score in pairs:
+            self.add(rec_id1, rec_id2, score)
+
+    def get_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the edges as numpy arrays, without copy
+
+        :return: tuple with the numbers of the first records, the numbers of
+            the second records and the scores
+        """
+        return (np.frombuffer(self._nodes1, dtype=np.int32),
+                np.frombuffer(self._nodes2, dtype=np.int32),
+                np.frombuffer(self._scores, dtype=np.float32))
+
+    def get_clusters(self,
+                     threshold: float,
+                     max_cluster_size: Optional[int] = None,
+                     min_mean_score: Optional[float] = None) -> ClusteringResult:
+        """Group the records connected by edges above a threshold
+
+        :param threshold: minimum score of the edges
+        :param max_cluster_size: maximum number of records of a cluster, None for no limit
+        :param min_mean_score: clusters with a lower mean score of their edges are flagged,
+            None to keep all clusters
+
+        :return: :class:`ClusteringResult` object
+        """
+        return self.sweep([threshold], max_cluster_size, min_mean_score)[threshold]
+
+    def sweep(self,
+              thresholds: Iterable[float],
+              max_cluster_size: Optional[int] = None,
+              min_mean_score: Optional[float] = None) -> Dict[float, ClusteringResult]:
+        """Cluster the edges with several thresholds
+
+        Edges are processed once from the highest to the lowest score, the clusters
+        of each threshold are extracted when the score of the edges reaches it.
+        Results are the same as :meth:`get_clusters` called for each threshold.
+
+        :param thresholds: iterable of thresholds
+        :param max_cluster_size: maximum number of records of a cluster, None for no limit
+        :param min_mean_score: clusters with a lower mean score of their edges are flagged,
+            None to keep all clusters
+
+        :return: dictionary with thresholds in increasing order and :class:`ClusteringResult` objects
+        """
+        nodes1, nodes2, scores = self.get_arrays()
+        thresholds = sorted(set(thresholds), reverse=True)
+        if len(thresholds) == 0:
+            return dict()
+
+        # Edges are sorted by decreasing score, edges below the lowest threshold are ignored
+        order = np.nonzero(scores >= np.float32(thresholds[-1]))[0]
+        order = order[np.argsort(-scores[order], kind='stable')]
+        sorted_nodes1 = nodes1[order].tolist()
+        sorted_nodes2 = nodes2[order].tolist()
+        sorted_scores = scores[order]
+
+        union_find = UnionFind(len(self.rec_ids))
+        accepted = np.ones(len(order), dtype=bool)
+        results = dict()
+        position = 0
+        for threshold in thresholds:
+            end = int(np.searchsorted(-sorted_scores, -np.float32(threshold), side='right'))
+            for i in range(position, end):
+                if union_find.union(sorted_nodes1[i], sorted_nodes2[i], max_cluster_size) is False:
+                    accepted[i] = False
+            position = end
+            results[threshold] = self._get_result(threshold,
+                                                  union_find,
+                                                  order[:end][accepted[:end]],
+                                                  int(end - np.count_nonzero(accepted[:end])),
+                                                  min_mean_score)
+
+        return {threshold: results[threshold] for threshold in sorted(results)}
+
+    def _get_result(self,
+                    threshold: float,
+                    union_find: UnionFind,
+                    edges: np.ndarray,
+                    nb_rejected_edges: int,
+                    min_mean_score: Optional[float]) -> ClusteringResult:
+        """Extract the clusters of the union-find
+
+        :param threshold: minimum score of the edges
+        :param union_find: :class:`UnionFind` with the accepted edges
+        :param edges: positions of the accepted edges
+        :param nb_rejected_edges: number of edges rejected because of the cluster size
+        :param min_mean_score: clusters with a lower mean score of their edges are flagged
+
+        :return: :class:`ClusteringResult` object
+        """
+        nodes1, _, scores = self.get_arrays()
+        roots = union_find.get_roots()
+
+        mean_scores = None
+        if min_mean_score is not None and len(roots) > 0:
+            edge_roots = roots[nodes1[edges]]
+            score_sums = np.bincount(edge_roots, weights=scores[edges], minlength=len(roots))
+            nb_edges = np.bincount(edge_roots, minlength=len(roots))
+            mean_scores = np.divide(score_sums, nb_edges, out=np.ones(len(roots)), where=nb_edges > 0)
+
+        members: Dict[int, List[str]] = dict()
+        for number, root in enumerate(roots.tolist()):
+            members.setdefault(root, []).append(self.rec_ids[number])
+
+        clusters = []
+        flagged_clusters = []
+        for root, rec_ids in members.items():
+            if len(rec_ids) < 2:
+                continue
+            if mean_scores is not None and mean_scores[root] < min_mean_score:
+                flagged_clusters.append(sorted(rec_ids))
+            else:
+                clusters.append(sorted(rec_ids))
+
+        return ClusteringResult(threshold=threshold,
+                                clusters=sorted(clusters),
+                                flagged_clusters=sorted(flagged_clusters),
+                                nb_rejected_edges=nb_rejected_edges)
+
+
+def get_clusters(pairs: Iterable[Tuple[str, str, float]],
+                 threshold: float = 0.0,
+                 max_cluster_size: Optional[int] = None,
+                 min_mean_score: Optional[float] = None) -> List[List[str]]:
+    """Group the matching pairs in clusters
+
+    Two records are in the same cluster if they are connected by matching pairs.
+    Flagged clusters, see :meth:`EdgeStore.get_clusters`, are not returned.
+
+    :param pairs: iterable of tuples with the ids of the records and the score
+    :param threshold: minimum score of the pairs
+    :param max_cluster_size: maximum number of records of a cluster, None for no limit
+    :param min_mean_score: minimum mean score of the pairs of a cluster, None for no limit
+
+    :return: list of clusters, each cluster is a sorted list of record ids
+    """
+    edges = EdgeStore()
+    edges.add_pairs(pairs)
+    return edges.get_clusters(threshold, max_cluster_size, min_mean_score).clusters
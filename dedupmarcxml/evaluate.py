@@ -7,12 +7,19 @@ different submodules to evaluate different fields.
 # from dedupmarcxml.score. import score_publishers, score_editions, score_extent, score_names
 from dedupmarcxml import score as scorelib
 from dedupmarcxml import tools
-from typing import List, Dict, Optional, Literal
+from dedupmarcxml import instrumentation
+from typing import List, Dict, Optional, Literal, Callable, Tuple, Union, NamedTuple, FrozenSet
 from dedupmarcxml.briefrecord import BriefRec, BriefRecFactory
 import numpy as np
-from copy import deepcopy
+from functools import lru_cache
+import inspect
+import weakref
+import sys
+import time
 import re
 
+digits_regex = re.compile(r'\D')
+
 
 @tools.handle_missing_values(key='type')
 def evaluate_format(format1: Dict, format2: Dict) -> float:
@@ -264,6 +271,98 @@ def evaluate_years_start_and_end(year1: Dict, year2: Dict) -> float:
         return (score_start * 3 + score_end) / 4
 
 
+def _get_parent_number(parent: Dict) -> Optional[List[int]]:
+    """Return the normalized numbers of the number of the parent
+
+    Precomputed value of :func:`prepare_parent` is used when available.
+
+    :param parent: dictionary with parent information
+
+    :return: list of numbers or None if no number is available
+    """
+    if 'number_nb' in parent:
+        return parent['number_nb']
+    if 'number' in parent:
+        return BriefRecFactory.normalize_extent(parent['number'])['nb']
+
+    return None
+
+
+def _get_parent_parts(parent: Dict) -> Optional[List[int]]:
+    """Return the list of numbers of the parts of the parent
+
+    If no parts are available, parts are built with number and year. It
+    is used to compare two records with parts fields. Precomputed value of
+    :func:`prepare_parent` is used when available. The parent dictionary is
+    not modified.
+
+    :param parent: dictionary with parent information
+
+    :return: list of numbers sorted in descending order or None if no parts are available
+    """
+    if 'parts_nb' in parent:
+        return parent['parts_nb']
+
+    if 'parts' in parent:
+        parts = parent['parts'].get('nb')
+        return sorted(parts, reverse=True) if parts is not None else None
+
+    txts = []
+    if 'number' in parent:
+        txts.append(parent['number'])
+    if 'year' in parent:
+        txts.append(str(parent['year']))
+    if len(txts) > 0:
+        return BriefRecFactory.normalize_extent(' '.join(txts))['nb']
+
+    return None
+
+
+def prepare_parent(parent: Dict) -> Dict:
+    """Precompute the numbers of the parent of a record
+
+    Normalized numbers are required for each comparison with :func:`evaluate_parent`,
+    they are computed once. The data of the record is not modified.
+
+    :param parent: dictionary with parent information
+
+    :return: copy of the parent dictionary with keys 'number_nb' and 'parts_nb'
+        when available
+    """
+    prepared = dict(parent)
+    number = _get_parent_number(parent)
+    if number is not None:
+        prepared['number_nb'] = number
+    parts = _get_parent_parts(parent)
+    if parts is not None:
+        prepared['parts_nb'] = parts
+    return prepared
+
+
+def _count_common_parts(parts1: List[int], parts2: List[int]) -> int:
+    """Return the number of common numbers of two lists of parts
+
+    Numbers are compared as multisets: each number can match only once. Both
+    lists must be sorted in descending order, see :func:`_get_parent_parts`.
+
+    :param parts1: list of numbers
+    :param parts2: list of numbers
+
+    :return: number of common numbers
+    """
+    i = j = nb_common = 0
+    while i < len(parts1) and j < len(parts2):
+        if parts1[i] == parts2[j]:
+            nb_common += 1
+            i += 1
+            j += 1
+        elif parts1[i] > parts2[j]:
+            i += 1
+        else:
+            j += 1
+    return nb_common
+
+
 @tools.handle_missing_values()
 def evaluate_parent(parent1: Dict, parent2: Dict) -> float:
     """evaluate_parents(parent1: Dict, parent2: Dict) -> float
@@ -276,6 +375,11 @@ def evaluate_parent(parent1: Dict, parent2: Dict) -> float:
     - year: content of $g yr:<content> or first 4 digits numbers in a $g
     - parts: longest list of numbers in a $g
 
+    Normalized numbers 'number_nb' and 'parts_nb' are computed if not available,
+    see :func:`prepare_parent`.
+
+    The parent dictionaries are not modified.
+
     :param parent1: dictionary with parent information
     :param parent2: dictionary with parent information
 
@@ -296,42 +400,33 @@ def evaluate_parent(parent1: Dict, parent2: Dict) -> float:
     elif 'isbn' in parent1 and 'isbn' in parent2:
         score_identifiers = evaluate_identifiers([parent1['isbn']], [parent2['isbn']])
 
-    if 'number' in parent1 and 'number' in parent2:
-        score_no = int(BriefRecFactory.normalize_extent(parent1['number'])['nb'] ==
-                       BriefRecFactory.normalize_extent(parent2['number'])['nb'])
+    number1 = _get_parent_number(parent1)
+    number2 = _get_parent_number(parent2)
+
+    if number1 is not None and number2 is not None:
+        score_no = int(number1 == number2)
 
     if 'year' in parent1 and 'year' in parent2:
         score_year = int(parent1['year'] == parent2['year'])
 
-    for p in [parent1, parent2]:
-
-        # Create parts field if not present => used to compare two records with parts fields
-        if 'parts' not in p:
-            txts = []
-            if 'number' in p:
-                txts.append(p['number'])
-            if 'year' in p:
-                txts.append(str(p['year']))
-            if len(txts) > 0:
-                txt = ' '.join(txts)
-                p['parts'] = BriefRecFactory.normalize_extent(txt)
+    # Parts field is built with number and year if not present => used to compare two records with parts fields
+    parts1 = _get_parent_parts(parent1)
+    parts2 = _get_parent_parts(parent2)
 
     # Idea is to check if number is part of one of the $$g even without the "no:" part.
     # If it is the case, we consider that the number is the same and we give a score of 1.
     # If there are parts in one of the two records and not in the other, we give a score of 0.
-    if score_no is None and 'number' in parent1:
-        nos = BriefRecFactory.normalize_extent(parent1['number'])['nb']
-        for no in nos:
-            if 'parts' in parent2 and 'nb' in parent2['parts'] and no in parent2['parts']['nb']:
+    if score_no is None and number1 is not None:
+        for no in number1:
+            if parts2 is not None and no in parts2:
                 score_no = 1
                 break
-        if score_no is None and 'parts' in parent2 and len(parent2['parts']['nb']) > 1:
+        if score_no is None and parts2 is not None and len(parts2) > 1:
             score_no = 0
 
-    if score_no is None and 'number' in parent2:
-        nos = BriefRecFactory.normalize_extent(parent2['number'])['nb']
-        for no in nos:
-            if 'parts' in parent1 and 'nb' in parent1['parts'] and no in parent1['parts']['nb']:
+    if score_no is None and number2 is not None:
+        for no in number2:
+            if parts1 is not None and no in parts1:
                 score_no = 1
                 break
 
@@ -341,31 +436,14 @@ def evaluate_parent(parent1: Dict, parent2: Dict) -> float:
         # If there are more than one number in the parts field, we consider that it is enough
         # to penalize the record if the number is not present in the other record because it means that
         # the record has more than one part and the number is not present in the other record.
-        if score_no is None and 'parts' in parent1 and len(parent1['parts']['nb']) > 1:
+        if score_no is None and parts1 is not None and len(parts1) > 1:
             score_no = 0
 
-    parent1 = deepcopy(parent1)
-    parent2 = deepcopy(parent2)
-    if 'parts' in parent1 and 'parts' in parent2 and 'nb' in parent1['parts'] and 'nb' in parent2['parts']:
-        initial_nb = min([len(parent1['parts']['nb']), len(parent2['parts']['nb'])])
+    if parts1 is not None and parts2 is not None:
+        initial_nb = min([len(parts1), len(parts2)])
         if initial_nb > 0:
-            to_delete = []
-            for e in parent1['parts']['nb']:
-                if e in parent2['parts']['nb']:
-                    to_delete.append(e)
-                    parent2['parts']['nb'].remove(e)
-            for e in to_delete:
-                parent1['parts']['nb'].remove(e)
-
-            to_delete = []
-            for e in parent2['parts']['nb']:
-                if e in parent1['parts']['nb']:
-                    to_delete.append(e)
-                    parent1['parts']['nb'].remove(e)
-            for e in to_delete:
-                parent2['parts']['nb'].remove(e)
-
-            final_nb = min([len(parent1['parts']['nb']), len(parent2['parts']['nb'])])
+            nb_common = _count_common_parts(parts1, parts2)
+            final_nb = initial_nb - nb_common
             score_parts = 1 - final_nb / initial_nb
             if initial_nb > 1 and initial_nb - final_nb < 2:
                 score_parts /= 3
@@ -373,80 +451,413 @@ def evaluate_parent(parent1: Dict, parent2: Dict) -> float:
         else:
             score_parts = 0
 
-    elif 'parts' in parent1 or 'parts' in parent2:
+    elif parts1 is not None or parts2 is not None:
         # Case if part information is only in one record available
         score_parts = 0
 
     return np.prod([s for s in [score_title, score_no, score_year, score_identifiers, score_parts] if s is not None])
 
 
+class IdentifierSets(NamedTuple):
+    """Precomputed identifiers of a record, see :func:`prepare_identifiers`
+
+    :ivar raw: set of the identifiers
+    :ivar extended: set of the identifiers and of their digits only versions
+    """
+    raw: FrozenSet[str]
+    extended: FrozenSet[str]
+
+
+def prepare_identifiers(ids: Union[List[str], IdentifierSets]) -> IdentifierSets:
+    """Precompute the sets of identifiers of a record
+
+    Identifiers never change for a record, the sets can be computed once and
+    reused for all comparisons with :func:`evaluate_std_nums` and
+    :func:`evaluate_identifiers`.
+
+    :param ids: list of identifiers
+
+    :return: :class:`IdentifierSets` object
+    """
+    if isinstance(ids, IdentifierSets):
+        return ids
+
+    raw = frozenset(sys.intern(num) for num in ids)
+    digits = [sys.intern(digits_regex.sub('', num)) for num in raw]
+
+    return IdentifierSets(raw, raw.union(num_digit for num_digit in digits if len(num_digit) > 0))
+
+
+def _calc_identifiers_score(ids1: FrozenSet[str], ids2: FrozenSet[str]) -> float:
+    """Return the similarity of two sets of identifiers"""
+    nb_union = len(ids1) + len(ids2) - len(ids1 & ids2)
+    if nb_union > 0:
+        score = len(ids1 & ids2) / nb_union
+        return score ** .05 if score > 0 else 0
+    else:
+        return 0
+
+
 @tools.handle_missing_values()
-def evaluate_std_nums(ids1: List[str], ids2: List[str]) -> float:
+def evaluate_std_nums(ids1: Union[List[str], IdentifierSets], ids2: Union[List[str], IdentifierSets]) -> float:
     """Return the result of the evaluation of similarity of two lists of identifiers.
 
+    The identifiers can be precomputed with :func:`prepare_identifiers`.
+
     :param ids1: list of identifiers to compare
     :param ids2: list of identifiers to compare
 
     :return: similarity score between two lists of identifiers as float
     """
-    ids1 = set(ids1)
-    ids2 = set(ids2)
-
-    if len(set.union(ids1, ids2)) > 0:
-        score1 = len(set.intersection(ids1, ids2)) / len(set.union(ids1, ids2))
-        score1 = score1 ** .05 if score1 > 0 else 0
-    else:
-        score1 = 0
+    ids1 = prepare_identifiers(ids1)
+    ids2 = prepare_identifiers(ids2)
 
-    for num in deepcopy(ids1):
-        num_digit = re.sub(r'\D', '', num)
-        if len(num_digit) > 0:
-            ids1.add(num_digit)
+    score1 = _calc_identifiers_score(ids1.raw, ids2.raw)
 
-    for num in deepcopy(ids2):
-        num_digit = re.sub(r'\D', '', num)
-        if len(num_digit) > 0:
-            ids2.add(num_digit)
+    # Same comparison including digits only versions of the identifiers
+    score2 = _calc_identifiers_score(ids1.extended, ids2.extended)
 
-    if len(set.union(ids1, ids2)) > 0:
-        score2 = len(set.intersection(ids1, ids2)) / len(set.union(ids1, ids2))
-        score2 = score2 ** .05 if score2 > 0 else 0
-    else:
-        score2 = 0
     if score1 >= score2:
         return score1
     else:
         return score2 * 0.9
 
+
 @tools.handle_missing_values()
-def evaluate_identifiers(ids1: List[str], ids2: List[str]) -> float:
+def evaluate_identifiers(ids1: Union[List[str], IdentifierSets], ids2: Union[List[str], IdentifierSets]) -> float:
     """Return the result of the evaluation of similarity of two lists of identifiers.
 
+    The identifiers can be precomputed with :func:`prepare_identifiers`.
+
     :param ids1: list of identifiers to compare
     :param ids2: list of identifiers to compare
 
     :return: similarity score between two lists of identifiers as float
     """
-    ids1 = set(ids1)
-    ids2 = set(ids2)
-    if len(set.union(ids1, ids2)) > 0:
-        score = len(set.intersection(ids1, ids2)) / len(set.union(ids1, ids2))
-        return score ** .05 if score > 0 else 0
-    else:
-        return 0
+    return _calc_identifiers_score(prepare_identifiers(ids1).raw, prepare_identifiers(ids2).raw)
+
+
+# Fields compared to evaluate similarity between records: name of the result,
+# key of the brief record data and evaluation function
+FIELD_EVALUATORS = [('format', 'format', evaluate_format),
+                    ('titles', 'titles', evaluate_titles),
+                    ('short_titles', 'short_titles', evaluate_short_titles),
+                    ('creators', 'creators', evaluate_creators),
+                    ('corp_creators', 'corp_creators', evaluate_creators),
+                    ('languages', 'languages', evaluate_languages),
+                    ('publishers', 'publishers', evaluate_publishers),
+                    ('editions', 'editions', evaluate_editions),
+                    ('extent', 'extent', evaluate_extent),
+                    ('years', 'years', evaluate_years_start_and_end),
+                    ('series', 'series', evaluate_short_titles),
+                    ('parent', 'parent', evaluate_parent),
+                    ('std_nums', 'std_nums', evaluate_std_nums),
+                    ('sys_nums', 'sys_nums', evaluate_identifiers)]
+
+# Functions used by :class:`EvaluationPlan` to precompute the values of a record
+# before the comparisons
+VALUE_PREPARERS = {evaluate_std_nums: prepare_identifiers,
+                   evaluate_identifiers: prepare_identifiers,
+                   evaluate_parent: prepare_parent}
+
+
+class FieldStep(NamedTuple):
+    """Compiled evaluation of one field, see :class:`EvaluationPlan`"""
+    name: str
+    key: str
+    core: Callable
+    default_score: float
+    missing_key: Optional[str]
+    values_lists: bool
+    with_rec_type: bool
+    prepare: Optional[Callable]
+
+
+class PreparedRecord:
+    """Brief record with precomputed data for :class:`EvaluationPlan`
+
+    :ivar rec_id: record ID
+    :ivar rec_type: type of the record, used to evaluate extent
+    :ivar values: list with the prepared value of each step of the plan
+    """
+    __slots__ = ('rec_id', 'rec_type', 'values')
 
+    def __init__(self, rec_id: Optional[str], rec_type: Optional[str], values: List) -> None:
+        self.rec_id = rec_id
+        self.rec_type = rec_type
+        self.values = values
 
 
-def evaluate_records_similarity(rec1: BriefRec, rec2: BriefRec, prevent_auto_match=False) -> Dict[str, float]:
+class EvaluationPlan:
+    """Compiled plan to evaluate similarity between records
+
+    The evaluation functions are decorated by :func:`dedupmarcxml.tools.handle_missing_values`
+    and :func:`dedupmarcxml.tools.handle_values_lists`. The plan resolves the decorators once:
+    missing values are detected once per record when preparing it, then each field is
+    directly evaluated by its core function. Values of some fields, like identifiers, are
+    also precomputed with the functions of :data:`VALUE_PREPARERS`. Results are the same as
+    :func:`evaluate_records_similarity` without plan.
+
+    Prepared data is cached by the plan, not in the records: records can still be pickled
+    and the pages of records shared by forked workers are not written. An entry is removed
+    when its record is garbage collected.
+
+    :ivar steps: list of :class:`FieldStep`, one for each evaluated field
+    """
+
+    def __init__(self, field_evaluators: Optional[List[Tuple[str, str, Callable]]] = None) -> None:
+        """Compile the evaluation plan
+
+        :param field_evaluators: list of tuples with name of the result, key of the brief
+            record data and evaluation function, default is :data:`FIELD_EVALUATORS`
+        """
+        if field_evaluators is None:
+            field_evaluators = FIELD_EVALUATORS
+
+        self.steps = [self._compile_step(name, key, evaluator) for name, key, evaluator in field_evaluators]
+
+        # Prepared records by id of the record: weak reference, fingerprint and prepared data
+        self._prepared: Dict[int, Tuple[weakref.ref, Optional[str], PreparedRecord]] = dict()
+
+    @staticmethod
+    def _compile_step(name: str, key: str, evaluator: Callable) -> FieldStep:
+        """Resolve the decorators of an evaluation function
+
+        :param name: name of the result
+        :param key: key of the brief record data
+        :param evaluator: evaluation function decorated by :func:`dedupmarcxml.tools.handle_missing_values`
+
+        :return: :class:`FieldStep` object
+        """
+        core = inspect.unwrap(evaluator)
+        return FieldStep(name=name,
+                         key=key,
+                         core=core,
+                         default_score=evaluator.default_score,
+                         missing_key=evaluator.missing_key,
+                         values_lists=getattr(evaluator, 'values_lists', False),
+                         with_rec_type='rec_type' in inspect.signature(core).parameters,
+                         prepare=VALUE_PREPARERS.get(evaluator))
+
+    def prepare(self, rec: Union[BriefRec, PreparedRecord], fingerprint: Optional[str] = None) -> PreparedRecord:
+        """Precompute the data of a record required by the plan
+
+        Result is cached by the plan, a record is prepared only once. Without
+        fingerprint, changes of the data of the record in place are not detected:
+        the record must not be modified after its first evaluation. With the
+        fingerprint, see :meth:`dedupmarcxml.briefrecord.BriefRec.get_fingerprint`,
+        the record is prepared again when its content changes.
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+        :param fingerprint: optional fingerprint of the current data of the record
+
+        :return: :class:`PreparedRecord` object
+        """
+        if isinstance(rec, PreparedRecord):
+            return rec
+
+        key = id(rec)
+        cached = self._prepared.get(key)
+        if cached is not None and cached[0]() is rec and (fingerprint is None or cached[1] == fingerprint):
+            return cached[2]
+
+        values = []
+        for step in self.steps:
+            value = rec.data[step.key]
+            if step.values_lists is True:
+                value_list = value if isinstance(value, list) else [value]
+                values.append(([(v, tools.is_empty(v, key=step.missing_key)) for v in value_list],
+                               tools.get_order_infos(value_list)))
+            else:
+                empty = tools.is_empty(value, key=step.missing_key)
+                if step.prepare is not None and empty is False:
+                    value = step.prepare(value)
+                values.append((value, empty))
+
+        prepared = PreparedRecord(rec.data['rec_id'], rec.data['format']['type'], values)
+        self._prepared[key] = (weakref.ref(rec, self._get_remover(key)), fingerprint, prepared)
+
+        return prepared
+
+    def _get_remover(self, key: int) -> Callable[[weakref.ref], None]:
+        """Return the callback removing the prepared data of a collected record
+
+        The callback doesn't reference the plan, records don't keep it alive.
+
+        :param key: id of the record
+
+        :return: callback of the weak reference
+        """
+        entries = self._prepared
+
+        def remove(ref: weakref.ref) -> None:
+            cached = entries.get(key)
+            if cached is not None and cached[0] is ref:
+                entries.pop(key, None)
+
+        return remove
+
+    @staticmethod
+    def _evaluate_values(step: FieldStep, value1: Tuple, value2: Tuple, rec_type: Optional[str]) -> float:
+        """Evaluate two prepared values, same logic as :func:`dedupmarcxml.tools.handle_missing_values`"""
+        (v1, empty1), (v2, empty2) = value1, value2
+        if empty1 and empty2:
+            return 0.0
+        elif empty1 or empty2:
+            return step.default_score / 2
+
+        if step.with_rec_type is True and rec_type is not None:
+            result = step.core(v1, v2, rec_type)
+        else:
+            result = step.core(v1, v2)
+
+        if result < 0:
+            return abs(result)
+        return result * (1 - step.default_score) + step.default_score
+
+    def evaluate(self,
+                 rec1: Union[BriefRec, PreparedRecord],
+                 rec2: Union[BriefRec, PreparedRecord],
+                 prevent_auto_match: bool = False) -> Dict[str, float]:
+        """Evaluate similarity between two records
+
+        :param rec1: BriefRecord object or prepared record
+        :param rec2: BriefRecord object or prepared record
+        :param prevent_auto_match: if True, we check record id of both records,
+            if they are the same, we return 0 to all parameters to avoid auto match
+
+        :return: dictionary with the score of each field
+        """
+        prepared1 = self.prepare(rec1)
+        prepared2 = self.prepare(rec2)
+
+        if prevent_auto_match is True and prepared1.rec_id == prepared2.rec_id:
+            return {step.name: 0 for step in self.steps}
+
+        # We need to know the record type to calculate the similarity of extent
+        rec_type = prepared1.rec_type if prepared1.rec_type == prepared2.rec_type else None
+
+        if instrumentation.enabled is True:
+            return self._evaluate_instrumented(prepared1, prepared2, rec_type)
+
+        results = {}
+        for step, value1, value2 in zip(self.steps, prepared1.values, prepared2.values):
+            results[step.name] = self._evaluate_step(step, value1, value2, rec_type)
+
+        return results
+
+    def _evaluate_step(self, step: FieldStep, value1: Tuple, value2: Tuple, rec_type: Optional[str]) -> float:
+        """Evaluate one field of two prepared records
+
+        :param step: :class:`FieldStep` of the field
+        :param value1: prepared value of the first record
+        :param value2: prepared value of the second record
+        :param rec_type: type of the records or None if types are different
+
+        :return: similarity score of the field
+        """
+        if step.values_lists is True:
+            (values1, infos1), (values2, infos2) = value1, value2
+            return tools.get_best_pair_score(values1,
+                                             values2,
+                                             lambda v1, v2: self._evaluate_values(step, v1, v2, rec_type),
+                                             infos1=infos1,
+                                             infos2=infos2)
+
+        return self._evaluate_values(step, value1, value2, rec_type)
+
+    def _evaluate_instrumented(self,
+                               prepared1: PreparedRecord,
+                               prepared2: PreparedRecord,
+                               rec_type: Optional[str]) -> Dict[str, float]:
+        """Evaluate two prepared records and collect the metrics of :mod:`dedupmarcxml.instrumentation`
+
+        :param prepared1: first prepared record
+        :param prepared2: second prepared record
+        :param rec_type: type of the records or None if types are different
+
+        :return: dictionary with the score of each field
+        """
+        sampled = instrumentation.should_sample('evaluation', 'records_similarity')
+        start = time.perf_counter() if sampled is True else None
+        results = {}
+        for step, value1, value2 in zip(self.steps, prepared1.values, prepared2.values):
+            instrumentation.count('evaluator', step.name)
+            if sampled is True:
+                field_start = time.perf_counter()
+                results[step.name] = self._evaluate_step(step, value1, value2, rec_type)
+                instrumentation.observe('evaluator', step.name, time.perf_counter() - field_start)
+            else:
+                results[step.name] = self._evaluate_step(step, value1, value2, rec_type)
+
+        if sampled is True:
+            instrumentation.observe('evaluation', 'records_similarity', time.perf_counter() - start)
+
+        return results
+
+
+def _evaluate_fields_instrumented(rec1: BriefRec, rec2: BriefRec, rec_type: Optional[str]) -> Dict[str, float]:
+    """Evaluate the fields of :data:`FIELD_EVALUATORS` and collect the metrics
+    of :mod:`dedupmarcxml.instrumentation`
+
+    Used by :func:`evaluate_records_similarity` when the instrumentation is enabled,
+    results are the same.
+
+    :param rec1: BriefRecord object
+    :param rec2: BriefRecord object
+    :param rec_type: type of the records or None if types are different
+
+    :return: dictionary with the score of each field
+    """
+    # Clocks are read only for the sampled evaluations
+    sampled = instrumentation.should_sample('evaluation', 'records_similarity')
+    start = time.perf_counter() if sampled is True else None
+    results = {}
+    for name, key, evaluator in FIELD_EVALUATORS:
+        instrumentation.count('evaluator', name)
+        if sampled is True:
+            field_start = time.perf_counter()
+        if _accepts_rec_type(evaluator) is True:
+            results[name] = evaluator(rec1.data[key], rec2.data[key], rec_type=rec_type)
+        else:
+            results[name] = evaluator(rec1.data[key], rec2.data[key])
+        if sampled is True:
+            instrumentation.observe('evaluator', name, time.perf_counter() - field_start)
+
+    if sampled is True:
+        instrumentation.observe('evaluation', 'records_similarity', time.perf_counter() - start)
+
+    return results
+
+
+@lru_cache(maxsize=None)
+def _accepts_rec_type(evaluator: Callable) -> bool:
+    """Check if the evaluation function requires the type of the records
+
+    :param evaluator: evaluation function
+
+    :return: True if the function has a `rec_type` parameter
+    """
+    return 'rec_type' in inspect.signature(inspect.unwrap(evaluator)).parameters
+
+
+def evaluate_records_similarity(rec1: BriefRec,
+                                rec2: BriefRec,
+                                prevent_auto_match=False,
+                                plan: Optional[EvaluationPlan] = None) -> Dict[str, float]:
     """Evaluate similarity between two records
 
     :param rec1: BriefRecord object
     :param rec2: BriefRecord object
     :param prevent_auto_match: if True, we check record id of both records,
         if they are the same, we return 0 to all parameters to avoid auto match
+    :param plan: optional :class:`EvaluationPlan`, avoids the overhead of the decorators
+        when the same records are compared several times
 
     :return: float with matching score
     """
+    if plan is not None:
+        return plan.evaluate(rec1, rec2, prevent_auto_match=prevent_auto_match)
 
     if prevent_auto_match is True and rec1.data['rec_id'] == rec2.data['rec_id']:
         return {'format': 0,
@@ -470,6 +881,9 @@ def evaluate_records_similarity(rec1: BriefRec, rec2: BriefRec, prevent_auto_mat
     else:
         rec_type = None
 
+    if instrumentation.enabled is True:
+        return _evaluate_fields_instrumented(rec1, rec2, rec_type)
+
     # We evaluate the similarity of the formats
     score_format = evaluate_format(rec1.data['format'], rec2.data['format'])
 
@@ -540,6 +954,15 @@ def get_similarity_score(sim_analysis: Dict[str, float],
 
     :return: similarity score between two records as float
     """
+    if instrumentation.enabled is True:
+        with instrumentation.Timer('method', str(method)):
+            return _get_similarity_score(sim_analysis, method)
+
+    return _get_similarity_score(sim_analysis, method)
+
+
+def _get_similarity_score(sim_analysis: Dict[str, float], method: Optional[str]) -> float:
+    """Compute the similarity score with the method, see :func:`get_similarity_score`"""
     if method == 'random_forest_music':
         return scorelib.methods.random_forest_music(sim_analysis)
     elif method == 'random_forest_book':
@@ -551,5 +974,104 @@ def get_similarity_score(sim_analysis: Dict[str, float],
     return scorelib.methods.mean(sim_analysis)
 
 
+def get_similarity_scores(sim_analyses: List[Dict[str, float]], method: Optional[str] = 'mean') -> np.ndarray:
+    """Return the similarity scores of many pairs of records
+
+    Batch version of :func:`get_similarity_score`, classifiers predict all the
+    pairs at once.
+
+    :param sim_analyses: list of results of :func:`evaluate_records_similarity`
+    :param method: method to use to calculate the similarity score, default method is the mean
+
+    :return: array of similarity scores
+    """
+    if instrumentation.enabled is True:
+        instrumentation.count('method', f'{method}_batch', len(sim_analyses))
+    return scorelib.methods.get_scores_batch(sim_analyses, method)
+
+
+class TwoStageResult(NamedTuple):
+    """Result of :func:`get_two_stage_scores`
+
+    :ivar scores: similarity scores, 0.0 for pairs rejected by the mean and 1.0
+        for pairs accepted by the mean
+    :ivar stages: 0 for pairs rejected by the mean, 1 for pairs accepted by the
+        mean and 2 for pairs scored by the classifier
+    :ivar mean_scores: scores of the first stage
+    """
+    scores: np.ndarray
+    stages: np.ndarray
+    mean_scores: np.ndarray
+
+    def get_report(self) -> Dict[str, int]:
+        """Return the number of pairs handled by each stage
+
+        :return: dictionary with the number of pairs, of pairs rejected and accepted
+            by the mean and of pairs scored by the classifier
+        """
+        return {'nb_pairs': len(self.stages),
+                'nb_rejected': int(np.count_nonzero(self.stages == 0)),
+                'nb_accepted': int(np.count_nonzero(self.stages == 1)),
+                'nb_classified': int(np.count_nonzero(self.stages == 2))}
+
+
+def get_two_stage_scores(sim_analyses: List[Dict[str, float]],
+                         method: str = 'random_forest_general',
+                         lower: float = 0.5,
+                         upper: float = 0.9) -> TwoStageResult:
+    """Return the similarity scores of many pairs, the classifier is used only for ambiguous pairs
+
+    The mean is computed for all pairs. Pairs with a mean lower than `lower`
+    or higher than `upper` are decided by the mean, see
+    :func:`dedupmarcxml.score.methods.two_stage_batch`. Use :func:`validate_two_stage`
+    to choose the bounds.
+
+    :param sim_analyses: list of results of :func:`evaluate_records_similarity`
+    :param method: classifier used for the ambiguous pairs
+    :param lower: pairs with a lower mean are rejected
+    :param upper: pairs with a higher mean are accepted
+
+    :return: :class:`TwoStageResult` object
+    """
+    scores, stages, mean_scores = scorelib.methods.two_stage_batch(sim_analyses, method, lower, upper)
+    if instrumentation.enabled is True:
+        instrumentation.count('method', 'mean_batch', len(sim_analyses))
+        instrumentation.count('method', f'{method}_batch', int(np.count_nonzero(stages == 2)))
+
+    return TwoStageResult(scores, stages, mean_scores)
+
+
+def validate_two_stage(sim_analyses: List[Dict[str, float]],
+                       method: str = 'random_forest_general',
+                       lower: float = 0.5,
+                       upper: float = 0.9,
+                       threshold: float = 0.5) -> Dict[str, Union[int, float]]:
+    """Compare the two-stage scoring with the classifier on a validation set
+
+    All pairs are scored with the classifier and with :func:`get_two_stage_scores`.
+    A pair is a duplicate if its score is at least `threshold`.
+
+    :param sim_analyses: list of results of :func:`evaluate_records_similarity`
+    :param method: classifier used for the ambiguous pairs
+    :param lower: pairs with a lower mean are rejected
+    :param upper: pairs with a higher mean are accepted
+    :param threshold: minimum score of the duplicates
+
+    :return: dictionary with the report of :meth:`TwoStageResult.get_report`, the
+        agreement rate of the decisions, the number of duplicates only found by the
+        classifier (missed) and only found by the two-stage scoring (added)
+    """
+    result = get_two_stage_scores(sim_analyses, method, lower, upper)
+    full_decisions = scorelib.methods.get_scores_batch(sim_analyses, method) >= threshold
+    decisions = result.scores >= threshold
+
+    report = result.get_report()
+    report['agreement'] = float(np.mean(decisions == full_decisions)) if len(decisions) > 0 else 1.0
+    report['nb_missed'] = int(np.count_nonzero(full_decisions & ~decisions))
+    report['nb_added'] = int(np.count_nonzero(decisions & ~full_decisions))
+
+    return report
+
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,265 @@
+"""
+Module to deduplicate records arriving continuously
+
+A :class:`DedupIndex` is a long-lived object holding the records already
+deduplicated. It keeps the blocks of the records, their data prepared for the
+evaluations and the clusters of duplicates. A new record is only compared with
+the records of its blocks, the index doesn't need to be rebuilt.
+
+Example:
+
+>>> index = DedupIndex(method='mean', threshold=0.8)
+>>> for rec in readers.iter_brief_records(['records.xml']):
+...     index.add(rec)
+>>> index.find_duplicates(new_rec)
+[('991000000000105501', 0.93)]
+>>> duplicates = index.add(new_rec)
+>>> index.get_cluster(new_rec.data['rec_id'])
+['991000000000105501', '991000000000205501']
+"""
+from dedupmarcxml.briefrecord import BriefRec
+from dedupmarcxml.blocking import BlockIndex, get_record_keys, get_exact_key
+from dedupmarcxml.evaluate import evaluate_records_similarity, get_similarity_score, EvaluationPlan
+from dedupmarcxml.cache import ScoreCache
+from typing import List, Dict, Set, Tuple, Optional
+
+# Prefix of the block keys of the exact duplicates
+EXACT_KEY_PREFIX = 'exact:'
+
+
+def get_dedup_keys(rec: BriefRec) -> List[str]:
+    """Return the block keys used by :class:`DedupIndex`
+
+    The first key groups the exact duplicates, see :func:`dedupmarcxml.blocking.get_exact_key`,
+    the other keys are the keys of :func:`dedupmarcxml.blocking.get_record_keys`.
+
+    :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+    :return: list of block keys
+    """
+    return [f'{EXACT_KEY_PREFIX}{get_exact_key(rec)}'] + get_record_keys(rec)
+
+
+class DedupIndex:
+    """Index of deduplicated records
+
+    Duplicates of a record are the records of the same blocks with a similarity
+    score above the threshold. Exact duplicates have a score of 1.0 and are not
+    evaluated. Clusters are the connected components of the duplicates, they are
+    updated when records are added or removed.
+
+    The index is not thread safe.
+
+    :ivar block_index: :class:`dedupmarcxml.blocking.BlockIndex` with the records
+    :ivar method: method of :func:`dedupmarcxml.evaluate.get_similarity_score`
+    :ivar threshold: minimum similarity score of the duplicates
+    :ivar plan: :class:`dedupmarcxml.evaluate.EvaluationPlan` used to prepare and evaluate the records
+    :ivar cache: optional :class:`dedupmarcxml.cache.ScoreCache`
+    :ivar matches: dictionary with record ids and dictionaries of their duplicates and scores
+    :ivar clusters: dictionary with cluster ids and sets of record ids, only clusters
+        with at least two records are kept
+    """
+
+    def __init__(self,
+                 method: str = 'mean',
+                 threshold: float = 0.8,
+                 max_block_size: Optional[int] = 1000,
+                 plan: Optional[EvaluationPlan] = None,
+                 cache: Optional[ScoreCache] = None,
+                 block_index: Optional[BlockIndex] = None) -> None:
+        """Dedup index object
+
+        :param method: method of :func:`dedupmarcxml.evaluate.get_similarity_score`
+        :param threshold: minimum similarity score of the duplicates
+        :param max_block_size: blocks with more records are ignored, None for no limit,
+            not used if `block_index` is provided
+        :param plan: :class:`dedupmarcxml.evaluate.EvaluationPlan` object, a new plan is created if None
+        :param cache: optional :class:`dedupmarcxml.cache.ScoreCache`, pairs already scored are not evaluated again
+        :param block_index: index of the records, default is a :class:`dedupmarcxml.blocking.BlockIndex`
+            using :func:`get_dedup_keys`
+        """
+        self.block_index = block_index if block_index is not None else BlockIndex(get_dedup_keys, max_block_size)
+        self.method = method
+        self.threshold = threshold
+        self.plan = plan if plan is not None else EvaluationPlan()
+        self.cache = cache
+        self.matches: Dict[str, Dict[str, float]] = dict()
+        self.clusters: Dict[int, Set[str]] = dict()
+        self._cluster_ids: Dict[str, int] = dict()
+        self._next_cluster_id = 1
+
+    def __len__(self) -> int:
+        return len(self.block_index)
+
+    def __contains__(self, rec_id: str) -> bool:
+        return rec_id in self.block_index
+
+    def get(self, rec_id: str) -> Optional[BriefRec]:
+        """Return a record of the index
+
+        :param rec_id: record id
+
+        :return: :class:`dedupmarcxml.briefrecord.BriefRec` object or None if not indexed
+        """
+        return self.block_index.get(rec_id)
+
+    def _get_score(self, rec1: BriefRec, rec2: BriefRec) -> float:
+        """Return the similarity score of two records
+
+        :param rec1: :class:`dedupmarcxml.briefrecord.BriefRec` object
+        :param rec2: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: similarity score
+        """
+        if self.cache is not None:
+            return self.cache.get_score(rec1, rec2, method=self.method, plan=self.plan)
+
+        sim_analysis = evaluate_records_similarity(rec1, rec2, plan=self.plan)
+        return float(get_similarity_score(sim_analysis, method=self.method))
+
+    def find_duplicates(self, rec: BriefRec) -> List[Tuple[str, float]]:
+        """Return the duplicates of a record in the index
+
+        The record itself is ignored, the index is not modified.
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: list of tuples with the ids of the duplicates and their score,
+            sorted by decreasing score
+        """
+        rec_id = rec.data['rec_id']
+        exact_ids = self.block_index.get_block(f'{EXACT_KEY_PREFIX}{get_exact_key(rec)}') - {rec_id}
+
+        duplicates = [(exact_id, 1.0) for exact_id in exact_ids]
+        for candidate in self.block_index.get_candidates(rec):
+            candidate_id = candidate.data['rec_id']
+            if candidate_id in exact_ids:
+                continue
+            score = self._get_score(candidate, rec)
+            if score >= self.threshold:
+                duplicates.append((candidate_id, score))
+
+        return sorted(duplicates, key=lambda duplicate: (-duplicate[1], duplicate[0]))
+
+    def add(self, rec: BriefRec) -> List[Tuple[str, float]]:
+        """Add a record to the index and update the clusters
+
+        A record with the same id is replaced.
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: list of tuples with the ids of the duplicates and their score,
+            see :meth:`find_duplicates`
+        """
+        rec_id = rec.data['rec_id']
+        if rec_id in self:
+            self.remove(rec_id)
+
+        duplicates = self.find_duplicates(rec)
+        self.plan.prepare(rec)
+        self.block_index.add(rec)
+
+        if len(duplicates) > 0:
+            self.matches[rec_id] = dict(duplicates)
+            for duplicate_id, score in duplicates:
+                self.matches.setdefault(duplicate_id, dict())[rec_id] = score
+            self._merge_clusters(rec_id, [duplicate_id for duplicate_id, _ in duplicates])
+
+        return duplicates
+
+    def remove(self, rec_id: str) -> None:
+        """Remove a record from the index and split its cluster if required
+
+        :param rec_id: id of the record to remove
+        """
+        for duplicate_id in self.matches.pop(rec_id, dict()):
+            del self.matches[duplicate_id][rec_id]
+            if len(self.matches[duplicate_id]) == 0:
+                del self.matches[duplicate_id]
+
+        cluster_id = self._cluster_ids.pop(rec_id, None)
+        if cluster_id is not None:
+            members = self.clusters.pop(cluster_id)
+            members.discard(rec_id)
+            for member in members:
+                del self._cluster_ids[member]
+            for component in self._get_components(members):
+                if len(component) > 1:
+                    self._set_cluster(component)
+
+        self.block_index.remove(rec_id)
+
+    def _set_cluster(self, members: Set[str], cluster_id: Optional[int] = None) -> None:
+        """Store a cluster
+
+        :param members: set of record ids
+        :param cluster_id: id of the cluster, a new id is used if None
+        """
+        if cluster_id is None:
+            cluster_id = self._next_cluster_id
+            self._next_cluster_id += 1
+        self.clusters[cluster_id] = members
+        for member in members:
+            self._cluster_ids[member] = cluster_id
+
+    def _merge_clusters(self, rec_id: str, duplicate_ids: List[str]) -> None:
+        """Merge a new record with the clusters of its duplicates
+
+        The largest cluster is kept and receives the records of the other clusters.
+
+        :param rec_id: id of the new record
+        :param duplicate_ids: ids of the duplicates of the new record
+        """
+        cluster_ids = {self._cluster_ids[duplicate_id] for duplicate_id in duplicate_ids
+                       if duplicate_id in self._cluster_ids}
+        kept_id = max(cluster_ids, key=lambda cluster_id: len(self.clusters[cluster_id]), default=None)
+
+        members = self.clusters.get(kept_id, set())
+        for cluster_id in cluster_ids - {kept_id}:
+            members.update(self.clusters.pop(cluster_id))
+        members.add(rec_id)
+        members.update(duplicate_ids)
+        self._set_cluster(members, kept_id)
+
+    def _get_components(self, rec_ids: Set[str]) -> List[Set[str]]:
+        """Return the connected components of the duplicates of a set of records
+
+        :param rec_ids: set of record ids
+
+        :return: list of sets of record ids
+        """
+        components = []
+        remaining = set(rec_ids)
+        while len(remaining) > 0:
+            stack = [remaining.pop()]
+            component = set(stack)
+            while len(stack) > 0:
+                for duplicate_id in self.matches.get(stack.pop(), dict()):
+                    if duplicate_id in remaining:
+                        remaining.discard(duplicate_id)
+                        component.add(duplicate_id)
+                        stack.append(duplicate_id)
+            components.append(component)
+
+        return components
+
+    def get_cluster(self, rec_id: str) -> List[str]:
+        """Return the cluster of a record
+
+        :param rec_id: record id
+
+        :return: sorted list of record ids, only the record itself if it has no
+            duplicate, empty list if the record is not in the index
+        """
+        cluster_id = self._cluster_ids.get(rec_id)
+        if cluster_id is not None:
+            return sorted(self.clusters[cluster_id])
+
+        return [rec_id] if rec_id in self else []
+
+    def get_clusters(self) -> List[List[str]]:
+        """Return the clusters with at least two records
+
+        :return: list of clusters, each cluster is a sorted list of record ids
+        """
+        return sorted(sorted(members) for members in self.clusters.values())
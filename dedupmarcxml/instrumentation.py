@@ -0,0 +1,226 @@
+"""
+Module to measure the cost of the evaluations
+
+The instrumentation is disabled by default. When enabled, it counts the calls of
+the field evaluators of :func:`dedupmarcxml.evaluate.evaluate_records_similarity`
+and of the methods of :func:`dedupmarcxml.evaluate.get_similarity_score`. Only one
+call out of `sample_every` is timed, total times are estimated with the sampled calls.
+
+When disabled, the cost is a single test of :data:`enabled` by call.
+
+Metrics are identified by a group and a name, for example ('evaluator', 'titles') or
+('method', 'random_forest_book'). They can be read with :func:`get_stats` or exported in
+Prometheus text format with :func:`to_prometheus` and :func:`dump_prometheus`. Metrics of
+several processes can be aggregated with :func:`snapshot` and :func:`merge`.
+
+Counters are not protected by a lock, with threads some calls can be lost.
+"""
+from bisect import bisect_left
+from typing import Dict, List, Tuple, Optional
+import os
+import time
+
+# Upper bounds of the buckets of the time histograms, in seconds
+BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1, 1.0)
+
+enabled = False
+sample_every = 16
+
+_calls: Dict[Tuple[str, str], int] = dict()
+_histograms: Dict[Tuple[str, str], List] = dict()
+
+
+def enable(sample: int = 16) -> None:
+    """Enable the instrumentation
+
+    :param sample: one call out of `sample` is timed, 1 to time all calls
+    """
+    global enabled, sample_every
+    if sample < 1:
+        raise ValueError(f'sample must be greater than 0: {sample}')
+    sample_every = sample
+    enabled = True
+
+
+def disable() -> None:
+    """Disable the instrumentation, collected metrics are kept"""
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    """Remove all collected metrics"""
+    _calls.clear()
+    _histograms.clear()
+
+
+def count(group: str, name: str, nb: int = 1) -> None:
+    """Count calls without timing
+
+    :param group: group of the metric
+    :param name: name of the metric
+    :param nb: number of calls
+    """
+    key = (group, name)
+    _calls[key] = _calls.get(key, 0) + nb
+
+
+def should_sample(group: str, name: str) -> bool:
+    """Count a call and tell if it should be timed
+
+    :param group: group of the metric
+    :param name: name of the metric
+
+    :return: True if the call should be timed
+    """
+    key = (group, name)
+    nb = _calls.get(key, 0) + 1
+    _calls[key] = nb
+    return nb % sample_every == 0
+
+
+def observe(group: str, name: str, seconds: float) -> None:
+    """Add a timed call to the histogram of the metric
+
+    The call is not counted, see :func:`count` and :func:`should_sample`.
+
+    :param group: group of the metric
+    :param name: name of the metric
+    :param seconds: duration of the call
+    """
+    key = (group, name)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        # Counts of each bucket, the last one is +Inf, then sum of the times
+        histogram = [0] * (len(BUCKETS) + 1) + [0.0]
+        _histograms[key] = histogram
+    histogram[bisect_left(BUCKETS, seconds)] += 1
+    histogram[-1] += seconds
+
+
+def get_stats() -> Dict[str, Dict[str, Dict]]:
+    """Return the collected metrics
+
+    For each metric:
+    - calls: number of calls
+    - sampled: number of timed calls
+    - sampled_time: total time of the timed calls in seconds
+    - estimated_time: estimated total time of all calls in seconds
+    - buckets: dictionary with the upper bounds of the buckets and the number of timed calls
+
+    :return: dictionary with groups, names and metrics
+    """
+    stats = dict()
+    for key in sorted(set(_calls) | set(_histograms)):
+        group, name = key
+        calls = _calls.get(key, 0)
+        histogram = _histograms.get(key, [0] * (len(BUCKETS) + 1) + [0.0])
+        sampled = sum(histogram[:-1])
+        stats.setdefault(group, dict())[name] = {
+            'calls': calls,
+            'sampled': sampled,
+            'sampled_time': histogram[-1],
+            'estimated_time': histogram[-1] * calls / sampled if sampled > 0 else 0.0,
+            'buckets': dict(zip(list(BUCKETS) + [float('inf')], histogram[:-1]))}
+
+    return stats
+
+
+def snapshot() -> Dict:
+    """Return a copy of the collected metrics
+
+    The snapshot can be pickled, for example to send the metrics of a worker
+    process to the main process, see :func:`merge`.
+
+    :return: dictionary with the raw metrics
+    """
+    return {'calls': dict(_calls),
+            'histograms': {key: list(histogram) for key, histogram in _histograms.items()}}
+
+
+def merge(data: Dict) -> None:
+    """Add the metrics of a snapshot to the collected metrics
+
+    :param data: snapshot created with :func:`snapshot`
+    """
+    for key, nb in data['calls'].items():
+        _calls[key] = _calls.get(key, 0) + nb
+
+    for key, histogram in data['histograms'].items():
+        if key not in _histograms:
+            _histograms[key] = list(histogram)
+        else:
+            _histograms[key] = [v1 + v2 for v1, v2 in zip(_histograms[key], histogram)]
+
+
+def to_prometheus(prefix: str = 'dedupmarcxml') -> str:
+    """Return the collected metrics in Prometheus text format
+
+    For each group, a counter `<prefix>_<group>_calls_total` and a histogram
+    `<prefix>_<group>_seconds` of the timed calls are exported. Metrics are
+    labelled with their name.
+
+    :param prefix: prefix of the metric names
+
+    :return: string in Prometheus text exposition format
+    """
+    lines = []
+    for group, metrics in get_stats().items():
+        metric_name = f'{prefix}_{group}'
+        lines.append(f'# HELP {metric_name}_calls_total Number of calls')
+        lines.append(f'# TYPE {metric_name}_calls_total counter')
+        for name, metric in metrics.items():
+            lines.append(f'{metric_name}_calls_total{{name="{name}"}} {metric["calls"]}')
+
+        lines.append(f'# HELP {metric_name}_seconds Duration of the sampled calls')
+        lines.append(f'# TYPE {metric_name}_seconds histogram')
+        for name, metric in metrics.items():
+            cumulative = 0
+            for bound, nb in metric['buckets'].items():
+                cumulative += nb
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric_name}_seconds_bucket{{name="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric_name}_seconds_sum{{name="{name}"}} {metric["sampled_time"]}')
+            lines.append(f'{metric_name}_seconds_count{{name="{name}"}} {metric["sampled"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def dump_prometheus(path: str, prefix: str = 'dedupmarcxml') -> None:
+    """Write the collected metrics in Prometheus text format
+
+    The file is written atomically, it can be read by the textfile collector
+    of the node exporter.
+
+    :param path: path of the file
+    :param prefix: prefix of the metric names
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(to_prometheus(prefix))
+    os.replace(tmp_path, path)
+
+
+class Timer:
+    """Context manager timing a block if the call is sampled
+
+    The call is always counted. Example:
+
+    >>> with Timer('stage', 'parse'):
+    ...     parse()
+    """
+    __slots__ = ('group', 'name', 'start')
+
+    def __init__(self, group: str, name: str) -> None:
+        self.group = group
+        self.name = name
+        self.start: Optional[float] = None
+
+    def __enter__(self) -> 'Timer':
+        if enabled is True and should_sample(self.group, self.name):
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self.start is not None:
+            observe(self.group, self.name, time.perf_counter() - self.start)
@@ -0,0 +1,275 @@
+"""
+Module to store the classifiers in memory-mapped files
+
+The pickled scikit-learn models are copied in each process that loads them. In
+this format, the large arrays of the models are saved in `.npy` files and opened
+read-only with `numpy.load(mmap_mode='r')`: all processes using the same files
+share the same physical memory pages.
+
+A model is a folder with a `model.json` file describing the model and one `.npy`
+file for each array. Supported models:
+- random forest classifiers: nodes of all the trees in concatenated arrays,
+  see :class:`MappedForestClassifier`
+- multi-layer perceptron classifiers: weights and biases of each layer, see
+  :class:`MappedMLPClassifier`
+
+Predictions are the same as the predictions of the scikit-learn models. Models are
+created with :func:`export_model`, scikit-learn is only required for the export,
+see `utils/export_models.py`. Use :func:`load_model` to open a model.
+"""
+from typing import Dict, Union, Any
+import numpy as np
+import pandas as pd
+import json
+import os
+
+MODEL_FILE = 'model.json'
+
+
+class MappedClassifier:
+    """Base class of the memory-mapped classifiers
+
+    :ivar classes_: array of the labels of the classes
+    :ivar feature_names_in_: array of the names of the features
+    :ivar n_features_in_: number of features
+    """
+
+    def __init__(self, meta: Dict[str, Any]) -> None:
+        """Memory-mapped classifier
+
+        :param meta: content of the `model.json` file
+        """
+        self.classes_ = np.array(meta['classes'])
+        self.feature_names_in_ = np.array(meta['feature_names'], dtype=object)
+        self.n_features_in_ = len(meta['feature_names'])
+
+    def _get_features(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """Return the features as an array of floats in the order of the model
+
+        :param X: data frame with the features as columns or array
+
+        :return: 2D array of features
+        """
+        if isinstance(X, pd.DataFrame):
+            missing = [name for name in self.feature_names_in_ if name not in X.columns]
+            if len(missing) > 0:
+                raise ValueError(f'Features missing in X: {missing}')
+            X = X[list(self.feature_names_in_)]
+
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'X has {X.shape[-1]} features, but the model expects {self.n_features_in_} features')
+        if np.isnan(X).any():
+            raise ValueError('Input X contains NaN')
+
+        return X
+
+    def predict_proba(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """Return the probability of each class
+
+        :param X: data frame with the features as columns or array
+
+        :return: 2D array with a column for each class
+        """
+        raise NotImplementedError
+
+    def predict(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """Return the most probable class
+
+        :param X: data frame with the features as columns or array
+
+        :return: array of labels
+        """
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class MappedForestClassifier(MappedClassifier):
+    """Random forest classifier with memory-mapped trees
+
+    Nodes of all the trees are stored in concatenated arrays, the children of
+    the nodes are global positions and leaves have no children (-1). Values
+    of the leaves are normalized like in `DecisionTreeClassifier.predict_proba`.
+
+    :ivar roots: position of the root of each tree
+    :ivar children_left: left child of each node
+    :ivar children_right: right child of each node
+    :ivar feature: feature of the split of each node
+    :ivar threshold: threshold of the split of each node
+    :ivar value: probability of each class for each node
+    """
+    arrays = ['roots', 'children_left', 'children_right', 'feature', 'threshold', 'value']
+
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> None:
+        """Memory-mapped random forest classifier
+
+        :param meta: content of the `model.json` file
+        :param arrays: dictionary with the names and the arrays of :attr:`arrays`
+        """
+        super().__init__(meta)
+        for name in self.arrays:
+            setattr(self, name, arrays[name])
+
+    def predict_proba(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """Return the probability of each class, mean of the probabilities of the trees
+
+        Like scikit-learn, features are compared as 32 bits floats to the thresholds.
+
+        :param X: data frame with the features as columns or array
+
+        :return: 2D array with a column for each class
+        """
+        X = self._get_features(X).astype(np.float32)
+        nb_rows, nb_trees = len(X), len(self.roots)
+
+        # One node for each row and each tree, only the nodes not in a leaf are updated
+        nodes = np.tile(np.asarray(self.roots), nb_rows)
+        rows = np.repeat(np.arange(nb_rows), nb_trees)
+        active = np.flatnonzero(self.children_left[nodes] != -1)
+        while len(active) > 0:
+            active_nodes = nodes[active]
+            go_left = X[rows[active], self.feature[active_nodes]] <= self.threshold[active_nodes]
+            active_nodes = np.where(go_left, self.children_left[active_nodes], self.children_right[active_nodes])
+            nodes[active] = active_nodes
+            active = active[self.children_left[active_nodes] != -1]
+
+        # Sum over the trees in the order of the trees, like scikit-learn
+        return self.value[nodes].reshape(nb_rows, nb_trees, -1).sum(axis=1) / nb_trees
+
+
+class MappedMLPClassifier(MappedClassifier):
+    """Multi-layer perceptron classifier with memory-mapped weights
+
+    :ivar coefs: list of the weights of each layer
+    :ivar intercepts: list of the biases of each layer
+    :ivar activation: activation function of the hidden layers
+    :ivar out_activation: activation function of the output layer
+    """
+    activations = {'identity': lambda x: x,
+                   'relu': lambda x: np.maximum(x, 0),
+                   'tanh': np.tanh,
+                   'logistic': lambda x: 1 / (1 + np.exp(-x))}
+
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> None:
+        """Memory-mapped MLP classifier
+
+        :param meta: content of the `model.json` file
+        :param arrays: dictionary with the names and the arrays of the layers, `coef_<i>` and `intercept_<i>`
+        """
+        super().__init__(meta)
+        self.coefs = [arrays[f'coef_{i}'] for i in range(meta['nb_layers'])]
+        self.intercepts = [arrays[f'intercept_{i}'] for i in range(meta['nb_layers'])]
+        self.activation = meta['activation']
+        self.out_activation = meta['out_activation']
+
+    def predict_proba(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """Return the probability of each class
+
+        :param X: data frame with the features as columns or array
+
+        :return: 2D array with a column for each class
+        """
+        output = self._get_features(X)
+        for i, (coef, intercept) in enumerate(zip(self.coefs, self.intercepts)):
+            output = output @ coef + intercept
+            if i < len(self.coefs) - 1:
+                output = self.activations[self.activation](output)
+
+        if self.out_activation == 'softmax':
+            output = np.exp(output - output.max(axis=1, keepdims=True))
+            return output / output.sum(axis=1, keepdims=True)
+
+        output = self.activations[self.out_activation](output).ravel()
+        return np.vstack([1 - output, output]).T
+
+
+model_classes = {'forest': MappedForestClassifier, 'mlp': MappedMLPClassifier}
+
+
+def _get_forest_arrays(model: Any) -> Dict[str, np.ndarray]:
+    """Return the arrays of a scikit-learn random forest
+
+    :param model: `RandomForestClassifier` object
+
+    :return: dictionary with the names and the arrays of :class:`MappedForestClassifier`
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+
+    children_left = []
+    children_right = []
+    values = []
+    for offset, tree in zip(offsets, trees):
+        leaves = tree.children_left == -1
+        children_left.append(np.where(leaves, -1, tree.children_left + offset))
+        children_right.append(np.where(leaves, -1, tree.children_right + offset))
+
+        value = tree.value[:, 0, :].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer)
+
+    return {'roots': offsets[:-1].astype(np.int64),
+            'children_left': np.concatenate(children_left).astype(np.int64),
+            'children_right': np.concatenate(children_right).astype(np.int64),
+            'feature': np.concatenate([tree.feature for tree in trees]).astype(np.int64),
+            'threshold': np.concatenate([tree.threshold for tree in trees]).astype(np.float64),
+            'value': np.concatenate(values)}
+
+
+def export_model(model: Any, path: str) -> None:
+    """Save a scikit-learn classifier in the memory-mapped format
+
+    :param model: `RandomForestClassifier` or `MLPClassifier` object, fitted with a data frame
+    :param path: folder of the model, created if it doesn't exist
+    """
+    meta = {'classes': model.classes_.tolist(), 'feature_names': [str(name) for name in model.feature_names_in_]}
+    model_type = type(model).__name__
+    if model_type == 'RandomForestClassifier':
+        meta['type'] = 'forest'
+        arrays = _get_forest_arrays(model)
+    elif model_type == 'MLPClassifier':
+        meta.update({'type': 'mlp',
+                     'nb_layers': len(model.coefs_),
+                     'activation': model.activation,
+                     'out_activation': model.out_activation_})
+        arrays = {f'coef_{i}': np.asarray(coef, dtype=np.float64) for i, coef in enumerate(model.coefs_)}
+        arrays.update({f'intercept_{i}': np.asarray(intercept, dtype=np.float64)
+                       for i, intercept in enumerate(model.intercepts_)})
+    else:
+        raise ValueError(f'Unsupported model: {model_type}')
+
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(array))
+    meta['arrays'] = sorted(arrays)
+
+    # Description is written last: a folder without it is not a valid model
+    with open(os.path.join(path, MODEL_FILE), 'w') as f:
+        json.dump(meta, f, indent=4)
+
+
+def is_model_folder(path: str) -> bool:
+    """Check if a folder contains a memory-mapped model
+
+    :param path: folder of the model
+
+    :return: True if the folder contains the description of a model
+    """
+    return os.path.isfile(os.path.join(path, MODEL_FILE))
+
+
+def load_model(path: str, mmap: bool = True) -> MappedClassifier:
+    """Open a memory-mapped model
+
+    :param path: folder of the model, see :func:`export_model`
+    :param mmap: if False, arrays are read in memory
+
+    :return: :class:`MappedForestClassifier` or :class:`MappedMLPClassifier` object
+    """
+    with open(os.path.join(path, MODEL_FILE)) as f:
+        meta = json.load(f)
+
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap is True else None)
+              for name in meta['arrays']}
+
+    return model_classes[meta['type']](meta, arrays)
@@ -0,0 +1,485 @@
+"""
+Module to process continuous feeds of records
+
+A :class:`Pipeline` runs stages concurrently. Each stage runs in one or more threads
+and stages are connected by bounded queues: when a stage is slow, the queues before it
+fill up and the upstream stages wait: the items in transit are bounded whatever the size
+of the feed. :class:`BlockingStage` keeps the records in its index, use `max_records` to
+bound it on long feeds.
+
+Ready-made stages:
+- :class:`ParseStage`: raw records to brief records, see :func:`dedupmarcxml.readers.iter_raw_records`
+- :class:`NormalizeStage`: precompute the data of the records used by the evaluations
+- :class:`BlockingStage`: pairs of each new record with the previous records of the same blocks
+- :class:`ScoringStage`: similarity score of the pairs
+- :class:`CallbackStage`: call a function for each item, for example to write the results
+
+Example:
+
+>>> pipeline = Pipeline([ParseStage(), NormalizeStage(), BlockingStage(), ScoringStage(threshold=0.8)])
+>>> for rec_id1, rec_id2, score in pipeline.run(readers.iter_raw_records(['records.xml'])):
+...     print(rec_id1, rec_id2, score)
+
+Threads share the GIL: stages mainly computing in Python don't run in parallel, but
+reading and writing overlap with the computations. To use all the cores, run several
+pipelines in separate processes or use the `dedupmarcxml` command.
+"""
+from dedupmarcxml.briefrecord import BriefRec
+from dedupmarcxml.blocking import BlockIndex
+from dedupmarcxml.evaluate import evaluate_records_similarity, get_similarity_score, EvaluationPlan
+from dedupmarcxml.cache import ScoreCache
+from dedupmarcxml import readers
+from dedupmarcxml import instrumentation
+from typing import List, Dict, Iterable, Iterator, Optional, Callable, Any, Tuple, Union
+from collections import OrderedDict
+import logging
+import threading
+import queue
+import time
+
+# Marker of the end of the feed in the queues
+_END = object()
+
+# Plan shared by the stages when no plan is provided, prepared data is bound to a plan
+_default_plan: Optional[EvaluationPlan] = None
+
+
+def get_default_plan() -> EvaluationPlan:
+    """Return the evaluation plan shared by the stages by default
+
+    :return: :class:`dedupmarcxml.evaluate.EvaluationPlan` object
+    """
+    global _default_plan
+    if _default_plan is None:
+        _default_plan = EvaluationPlan()
+    return _default_plan
+
+
+class Stage:
+    """Base class of the stages of a :class:`Pipeline`
+
+    Subclasses implement :meth:`process`, it returns the items sent to the next
+    stage for each input item. :meth:`flush` is called once at the end of the feed.
+
+    :cvar max_workers: maximum number of threads, 1 for stages with a state
+    :ivar name: name of the stage used in the metrics
+    :ivar workers: number of threads of the stage
+    """
+    max_workers: Optional[int] = None
+
+    def __init__(self, name: Optional[str] = None, workers: int = 1) -> None:
+        """Stage of a pipeline
+
+        :param name: name of the stage, default is the name of the class
+        :param workers: number of threads of the stage
+        """
+        if self.max_workers is not None and workers > self.max_workers:
+            raise ValueError(f'{self.__class__.__name__} supports at most {self.max_workers} worker(s)')
+        self.name = name if name is not None else self.__class__.__name__
+        self.workers = workers
+
+    def process(self, item: Any) -> Iterable:
+        """Process one item
+
+        :param item: item of the previous stage
+
+        :return: iterable of the items sent to the next stage
+        """
+        raise NotImplementedError
+
+    def flush(self) -> Iterable:
+        """Return the remaining items at the end of the feed
+
+        :return: iterable of the items sent to the next stage
+        """
+        return []
+
+
+class StageMetrics:
+    """Metrics of a stage of a :class:`Pipeline`
+
+    :ivar items_in: number of processed items
+    :ivar items_out: number of items sent to the next stage
+    :ivar busy_time: total time spent in :meth:`Stage.process` by all threads, in seconds
+    :ivar max_queue_depth: maximum number of items observed in the input queue
+    """
+    __slots__ = ('items_in', 'items_out', 'busy_time', 'max_queue_depth', 'lock')
+
+    def __init__(self) -> None:
+        self.items_in = 0
+        self.items_out = 0
+        self.busy_time = 0.0
+        self.max_queue_depth = 0
+        self.lock = threading.Lock()
+
+    def add(self, nb_out: int, busy_time: float, queue_depth: int) -> None:
+        """Add the result of one processed item
+
+        :param nb_out: number of items sent to the next stage
+        :param busy_time: processing time in seconds
+        :param queue_depth: number of items in the input queue
+        """
+        with self.lock:
+            self.items_in += 1
+            self.items_out += nb_out
+            self.busy_time += busy_time
+            if queue_depth > self.max_queue_depth:
+                self.max_queue_depth = queue_depth
+
+
+class Pipeline:
+    """Stages connected by bounded queues
+
+    Each stage reads the items of its input queue and writes its results in the
+    input queue of the next stage. The results of the last stage are returned by
+    :meth:`run`. If a stage raises an exception, the pipeline stops and the
+    exception is raised by :meth:`run`.
+
+    :ivar stages: list of :class:`Stage` objects
+    :ivar queue_size: maximum number of items in each queue
+    :ivar metrics: dictionary with stage names and :class:`StageMetrics` objects
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 1000) -> None:
+        """Pipeline object
+
+        :param stages: list of :class:`Stage` objects, names must be unique
+        :param queue_size: maximum number of items in each queue
+        """
+        if len({stage.name for stage in stages}) < len(stages):
+            raise ValueError('Names of the stages must be unique')
+        self.stages = stages
+        self.queue_size = queue_size
+        self.metrics: Dict[str, StageMetrics] = dict()
+        self._queues: List[queue.Queue] = []
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._start_time: Optional[float] = None
+        self._end_time: Optional[float] = None
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        """Put an item in a queue, wait while the queue is full
+
+        :param q: queue
+        :param item: item to put
+
+        :return: False if the pipeline has been stopped
+        """
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        """Get an item from a queue, wait while the queue is empty
+
+        :param q: queue
+
+        :return: item or :data:`_END` if the pipeline has been stopped
+        """
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, error: BaseException) -> None:
+        """Stop the pipeline after an error
+
+        :param error: exception raised by a stage
+        """
+        self._errors.append(error)
+        self._stop.set()
+
+    def _feed(self, source: Iterable) -> None:
+        """Put the items of the source in the first queue
+
+        :param source: iterable of items
+        """
+        try:
+            for item in source:
+                if self._put(self._queues[0], item) is False:
+                    return
+        except BaseException as e:
+            self._fail(e)
+            return
+
+        for _ in range(self.stages[0].workers):
+            self._put(self._queues[0], _END)
+
+    def _run_stage(self, i: int, remaining: List[int], lock: threading.Lock) -> None:
+        """Run one thread of a stage
+
+        The last thread of a stage to finish flushes the stage and sends the end
+        of the feed to the next stage.
+
+        :param i: position of the stage
+        :param remaining: list with the number of running threads of the stage
+        :param lock: lock protecting `remaining`
+        """
+        stage = self.stages[i]
+        metrics = self.metrics[stage.name]
+        input_queue = self._queues[i]
+        output_queue = self._queues[i + 1]
+
+        try:
+            while True:
+                item = self._get(input_queue)
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                results = list(stage.process(item))
+                busy_time = time.perf_counter() - start
+                metrics.add(len(results), busy_time, input_queue.qsize())
+                if instrumentation.enabled is True:
+                    instrumentation.count('stage', stage.name)
+                    instrumentation.observe('stage', stage.name, busy_time)
+                for result in results:
+                    if self._put(output_queue, result) is False:
+                        return
+
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last is False or self._stop.is_set():
+                return
+
+            results = list(stage.flush())
+            with metrics.lock:
+                metrics.items_out += len(results)
+            for result in results:
+                if self._put(output_queue, result) is False:
+                    return
+            nb_ends = self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+            for _ in range(nb_ends):
+                self._put(output_queue, _END)
+
+        except BaseException as e:
+            logging.error(f'Pipeline stopped, error in stage {stage.name}: {repr(e)}')
+            self._fail(e)
+
+    def run(self, source: Iterable) -> Iterator:
+        """Run the pipeline
+
+        The pipeline is stopped if the returned iterator is closed before the end.
+
+        :param source: iterable of the items of the first stage
+
+        :return: iterator of the items of the last stage
+        """
+        self._stop.clear()
+        self._errors = []
+        self.metrics = {stage.name: StageMetrics() for stage in self.stages}
+        self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._start_time = time.perf_counter()
+        self._end_time = None
+
+        threads = [threading.Thread(target=self._feed, args=(source,), name='pipeline-source', daemon=True)]
+        for i, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for j in range(stage.workers):
+                threads.append(threading.Thread(target=self._run_stage,
+                                                args=(i, remaining, lock),
+                                                name=f'pipeline-{stage.name}-{j}',
+                                                daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(self._queues[-1])
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self._end_time = time.perf_counter()
+
+        if len(self._errors) > 0:
+            raise self._errors[0]
+
+    def get_metrics(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        """Return the metrics of each stage
+
+        For each stage:
+        - items_in: number of processed items
+        - items_out: number of items sent to the next stage
+        - busy_time: total processing time of all the threads of the stage in seconds
+        - throughput: processed items by second since the start of the pipeline
+        - queue_depth: current number of items in the input queue
+        - max_queue_depth: maximum number of items observed in the input queue
+
+        :return: dictionary with stage names and metrics
+        """
+        if self._start_time is None:
+            return dict()
+
+        end_time = self._end_time if self._end_time is not None else time.perf_counter()
+        elapsed = end_time - self._start_time
+        return {stage.name: {'items_in': self.metrics[stage.name].items_in,
+                             'items_out': self.metrics[stage.name].items_out,
+                             'busy_time': self.metrics[stage.name].busy_time,
+                             'throughput': self.metrics[stage.name].items_in / elapsed if elapsed > 0 else 0.0,
+                             'queue_depth': self._queues[i].qsize(),
+                             'max_queue_depth': self.metrics[stage.name].max_queue_depth}
+                for i, stage in enumerate(self.stages)}
+
+
+class ParseStage(Stage):
+    """Create brief records from raw records
+
+    Input items are tuples with the format and the raw record, see
+    :func:`dedupmarcxml.readers.iter_raw_records`. Records with errors are logged
+    and skipped.
+
+    With `lazy`, the fields of the records are only extracted when a later stage
+    reads them, see :class:`dedupmarcxml.briefrecord.LazyBriefData`.
+    """
+
+    def __init__(self,
+                 lazy: bool = False,
+                 fields: Optional[Iterable[str]] = None,
+                 name: Optional[str] = None,
+                 workers: int = 1) -> None:
+        """Parsing stage
+
+        :param lazy: if True, fields are extracted on first access
+        :param fields: with `lazy`, fields extracted by the stage
+        :param name: name of the stage
+        :param workers: number of threads of the stage
+        """
+        super().__init__(name, workers)
+        self.lazy = lazy
+        self.fields = fields
+
+    def process(self, item: Tuple[str, Union[bytes, Dict]]) -> Iterable[BriefRec]:
+        rec = readers.parse_raw_record(*item, lazy=self.lazy, fields=self.fields)
+        if rec.error is True:
+            logging.error(f'Record skipped: {rec.error_messages}')
+            return []
+        return [rec]
+
+
+class NormalizeStage(Stage):
+    """Precompute the data of the records used by the evaluations
+
+    Records are prepared with :meth:`dedupmarcxml.evaluate.EvaluationPlan.prepare`,
+    the same plan should be used by :class:`ScoringStage`.
+    """
+
+    def __init__(self, plan: Optional[EvaluationPlan] = None, name: Optional[str] = None, workers: int = 1) -> None:
+        """Normalization stage
+
+        :param plan: :class:`dedupmarcxml.evaluate.EvaluationPlan` object, default is :func:`get_default_plan`
+        :param name: name of the stage
+        :param workers: number of threads of the stage
+        """
+        super().__init__(name, workers)
+        self.plan = plan if plan is not None else get_default_plan()
+
+    def process(self, item: BriefRec) -> Iterable[BriefRec]:
+        self.plan.prepare(item)
+        return [item]
+
+
+class BlockingStage(Stage):
+    """Pair each new record with the previous records of the same blocks
+
+    Records are added to a :class:`dedupmarcxml.blocking.BlockIndex` after the
+    search of their candidates: each pair is sent only once. By default the index
+    keeps all the records of the feed. With `max_records`, the oldest records are
+    removed from the index when it is full: new records are only compared with
+    the last `max_records` records.
+    """
+    max_workers = 1
+
+    def __init__(self,
+                 index: Optional[BlockIndex] = None,
+                 name: Optional[str] = None,
+                 max_records: Optional[int] = None) -> None:
+        """Blocking stage
+
+        :param index: :class:`dedupmarcxml.blocking.BlockIndex` object, a new index is created if None
+        :param name: name of the stage
+        :param max_records: maximum number of records added by the stage kept in the index, no limit if None
+        """
+        super().__init__(name, 1)
+        self.index = index if index is not None else BlockIndex()
+        self.max_records = max_records
+        self._rec_ids: OrderedDict = OrderedDict()
+
+    def process(self, item: BriefRec) -> Iterable[Tuple[BriefRec, BriefRec]]:
+        candidates = sorted(self.index.get_candidates(item), key=lambda rec: rec.data['rec_id'])
+        if self.index.add(item) is True and self.max_records is not None:
+            rec_id = item.data['rec_id']
+            self._rec_ids[rec_id] = None
+            self._rec_ids.move_to_end(rec_id)
+            while len(self._rec_ids) > self.max_records:
+                self.index.remove(self._rec_ids.popitem(last=False)[0])
+        return [(candidate, item) for candidate in candidates]
+
+
+class ScoringStage(Stage):
+    """Compute the similarity score of pairs of records
+
+    Output items are tuples with the ids of the records and the score. Pairs
+    with a score lower than the threshold are skipped.
+    """
+
+    def __init__(self,
+                 method: str = 'mean',
+                 threshold: Optional[float] = None,
+                 plan: Optional[EvaluationPlan] = None,
+                 cache: Optional[ScoreCache] = None,
+                 name: Optional[str] = None,
+                 workers: int = 1) -> None:
+        """Scoring stage
+
+        :param method: method of :func:`dedupmarcxml.evaluate.get_similarity_score`
+        :param threshold: minimum score of the returned pairs, None to return all pairs
+        :param plan: :class:`dedupmarcxml.evaluate.EvaluationPlan` object, default is :func:`get_default_plan`
+        :param cache: optional :class:`dedupmarcxml.cache.ScoreCache`, pairs already scored are not evaluated again
+        :param name: name of the stage
+        :param workers: number of threads of the stage
+        """
+        super().__init__(name, workers)
+        self.method = method
+        self.threshold = threshold
+        self.plan = plan if plan is not None else get_default_plan()
+        self.cache = cache
+
+    def process(self, item: Tuple[BriefRec, BriefRec]) -> Iterable[Tuple[str, str, float]]:
+        rec1, rec2 = item
+        if self.cache is not None:
+            score = self.cache.get_score(rec1, rec2, method=self.method, plan=self.plan)
+        else:
+            sim_analysis = evaluate_records_similarity(rec1, rec2, plan=self.plan)
+            score = get_similarity_score(sim_analysis, method=self.method)
+        if self.threshold is not None and score < self.threshold:
+            return []
+        return [(rec1.data['rec_id'], rec2.data['rec_id'], float(score))]
+
+
+class CallbackStage(Stage):
+    """Call a function for each item and send the item to the next stage"""
+
+    def __init__(self, func: Callable[[Any], Any], name: Optional[str] = None, workers: int = 1) -> None:
+        """Callback stage
+
+        :param func: function called with each item
+        :param name: name of the stage
+        :param workers: number of threads of the stage
+        """
+        super().__init__(name, workers)
+        self.func = func
+
+    def process(self, item: Any) -> Iterable:
+        self.func(item)
+        return [item]
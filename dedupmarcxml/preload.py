@@ -0,0 +1,185 @@
+"""
+Module to prepare the process before forking worker processes
+
+With the "fork" start method, worker processes share the memory pages of the
+main process until they are written. Python writes in the objects even when
+they are only read: reference counts are updated and the cyclic garbage
+collector marks the tracked objects at each collection. Pages of the data and
+of the models are copied in each worker, memory grows with the number of workers.
+
+:func:`preload_for_fork` should be called in the main process just before
+creating the workers:
+
+- all the resources of :mod:`dedupmarcxml.tools` are loaded, including the
+  vocabulary of the publishers
+- a sample record is parsed and evaluated with all the methods: regular
+  expressions are compiled and stored in the cache of :mod:`re`, lazy objects
+  are created in the main process and not in each worker
+- existing objects are moved to the permanent generation of the garbage
+  collector with :func:`gc.freeze`, collections in the workers don't touch them
+
+Reference counts are still updated, but only the pages of the objects actually
+used by the workers are copied. :func:`get_memory_usage` returns the shared and
+private memory of a process, see `benchmarks/fork_memory.py`.
+
+Example:
+
+>>> records = load_records()
+>>> preload_for_fork()
+>>> with multiprocessing.get_context('fork').Pool(4) as pool:
+...     results = pool.map(score_chunk, chunks)
+>>> unfreeze()
+"""
+from dedupmarcxml.briefrecord import XmlBriefRec, BriefRec
+from dedupmarcxml.evaluate import evaluate_records_similarity, get_similarity_score, EvaluationPlan
+from dedupmarcxml.score import methods, publishers
+from dedupmarcxml.blocking import get_record_keys, get_exact_key
+from dedupmarcxml import tools
+from dedupmarcxml import instrumentation
+from typing import Dict, Optional, Tuple
+from lxml import etree
+import gc
+import os
+
+# Record used to warm up the extraction and the evaluation functions
+SAMPLE_RECORD = '''<record xmlns="http://www.loc.gov/MARC21/slim">
+  <leader>01013nam a2200265 c 4500</leader>
+  <controlfield tag="001">000000000000000001</controlfield>
+  <controlfield tag="008">120202s2013    maua     |||| 001 0 eng|^</controlfield>
+  <datafield ind1=" " ind2=" " tag="020"><subfield code="a">9780132805575</subfield></datafield>
+  <datafield ind1=" " ind2=" " tag="035"><subfield code="a">(OCoLC)123456789</subfield></datafield>
+  <datafield ind1="1" ind2=" " tag="100"><subfield code="a">Punch, William</subfield></datafield>
+  <datafield ind1="2" ind2=" " tag="110"><subfield code="a">Michigan State University</subfield></datafield>
+  <datafield ind1="1" ind2="0" tag="245">
+    <subfield code="a">&lt;&lt;The&gt;&gt; practice of computing using Python :</subfield>
+    <subfield code="b">an introduction</subfield>
+    <subfield code="c">William Punch</subfield>
+  </datafield>
+  <datafield ind1=" " ind2=" " tag="250"><subfield code="a">2nd ed.</subfield></datafield>
+  <datafield ind1=" " ind2="1" tag="264">
+    <subfield code="a">Boston</subfield>
+    <subfield code="b">Pearson Education</subfield>
+    <subfield code="c">2013</subfield>
+  </datafield>
+  <datafield ind1=" " ind2=" " tag="300"><subfield code="a">xv, 764 p.</subfield></datafield>
+  <datafield ind1=" " ind2=" " tag="338"><subfield code="b">nc</subfield></datafield>
+  <datafield ind1="1" ind2=" " tag="490"><subfield code="a">Computer science ; 12</subfield></datafield>
+  <datafield ind1="1" ind2=" " tag="700"><subfield code="a">Enbody, Richard</subfield></datafield>
+</record>'''
+
+# Changes of the sample record, the evaluations should not stop at the first test
+SAMPLE_CHANGES = [('000000000000000001', '000000000000000002'),
+                  ('9780132805575', '013280557X'),
+                  ('2nd ed.', 'Second edition'),
+                  ('Pearson Education', 'Pearson'),
+                  ('xv, 764 p.', '780 pages'),
+                  ('2013', '2012')]
+
+
+def load_resources() -> Dict[str, object]:
+    """Load the data and the models used by the evaluations
+
+    :return: dictionary with the names and the loaded resources
+    """
+    resources = {name: getattr(tools, name) for name in ['editions_data', 'publishers_data', 'rf_music_model',
+                                                         'rf_book_model', 'rf_general_model', 'mlp_book_model']}
+    resources['publishers_vocabulary'] = publishers.get_vocabulary()
+
+    return resources
+
+
+def get_sample_records() -> Tuple[BriefRec, BriefRec]:
+    """Return two similar brief records, see :data:`SAMPLE_RECORD`
+
+    :return: tuple of two :class:`dedupmarcxml.briefrecord.XmlBriefRec` objects
+    """
+    xml = SAMPLE_RECORD
+    for old, new in SAMPLE_CHANGES:
+        xml = xml.replace(old, new)
+
+    return XmlBriefRec(etree.fromstring(SAMPLE_RECORD)), XmlBriefRec(etree.fromstring(xml))
+
+
+def warm_up() -> None:
+    """Parse and evaluate sample records with all the methods
+
+    Regular expressions and lazy objects used by the extraction, the blocking and
+    the evaluations are created. Evaluations of the sample records are not counted
+    by :mod:`dedupmarcxml.instrumentation`.
+    """
+    instrumentation_enabled = instrumentation.enabled
+    instrumentation.disable()
+    try:
+        rec1, rec2 = get_sample_records()
+        for rec in (rec1, rec2):
+            get_record_keys(rec)
+            get_exact_key(rec)
+
+        sim_analyses = [evaluate_records_similarity(rec1, rec2),
+                        evaluate_records_similarity(rec1, rec2, plan=EvaluationPlan())]
+        for method in methods.method_list + ['random_forest_general']:
+            get_similarity_score(sim_analyses[0], method)
+            methods.get_scores_batch(sim_analyses, method)
+    finally:
+        if instrumentation_enabled is True:
+            instrumentation.enable(instrumentation.sample_every)
+
+
+def preload_for_fork(warm: bool = True, freeze: bool = True) -> int:
+    """Prepare the main process before forking worker processes
+
+    Resources are loaded, see :func:`load_resources`, the functions are warmed up,
+    see :func:`warm_up`, and all objects are frozen with :func:`gc.freeze`. Objects
+    created before the call, for example the records to compare, are frozen too.
+
+    :param warm: if True, sample records are parsed and evaluated
+    :param freeze: if True, objects are moved to the permanent generation of the
+        garbage collector
+
+    :return: number of frozen objects
+    """
+    load_resources()
+    if warm is True:
+        warm_up()
+
+    if freeze is True:
+        # Garbage is collected first, frozen objects are never collected
+        gc.collect()
+        gc.freeze()
+
+    return gc.get_freeze_count()
+
+
+def unfreeze() -> None:
+    """Move the frozen objects back to the collected generations, see :func:`preload_for_fork`"""
+    gc.unfreeze()
+
+
+def get_memory_usage(pid: Optional[int] = None) -> Optional[Dict[str, int]]:
+    """Return the memory usage of a process
+
+    Values are read in `/proc/<pid>/smaps_rollup`. Shared memory is the memory of
+    the pages used by several processes, private memory is only used by the process.
+    PSS is the private memory plus the shared memory divided by the number of
+    processes sharing each page.
+
+    :param pid: id of the process, default is the current process
+
+    :return: dictionary with "rss", "pss", "shared" and "private" in kB or None
+        if the information is not available (not Linux)
+    """
+    path = f'/proc/{pid if pid is not None else "self"}/smaps_rollup'
+    if os.path.isfile(path) is False:
+        return None
+
+    values = dict()
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+
+    return {'rss': values['Rss'],
+            'pss': values['Pss'],
+            'shared': values['Shared_Clean'] + values['Shared_Dirty'],
+            'private': values['Private_Clean'] + values['Private_Dirty']}
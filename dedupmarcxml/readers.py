@@ -0,0 +1,303 @@
+"""
+Module to read records from files
+
+MARCXML files are parsed incrementally, only one record is kept in memory at a time.
+Supported files:
+- MARCXML: collection, single record or SRU response (extension ".xml")
+- JSON: one record or a list of records (extension ".json")
+- JSON lines: one record per line (extensions ".jsonl" and ".ndjson")
+
+JSON records have the structure of the Alma JSON records, see
+:class:`dedupmarcxml.briefrecord.JsonBriefRecFactory`. Large JSON lines exports
+and database cursors can be read in batches with :func:`iter_json_brief_record_batches`.
+"""
+from dedupmarcxml.briefrecord import BriefRec, XmlBriefRec, JsonBriefRec, RawBriefRec
+from lxml import etree
+from typing import List, Dict, Iterator, Iterable, Tuple, Union, Optional
+from collections import deque
+import multiprocessing
+import json
+import logging
+import os
+
+MARC_NS = '{http://www.loc.gov/MARC21/slim}'
+
+XML_EXTENSIONS = ('.xml',)
+JSON_EXTENSIONS = ('.json',)
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+
+def iter_files(paths: List[str]) -> Iterator[str]:
+    """Iterate over the files to read
+
+    Folders are read recursively, only files with supported extensions are returned.
+
+    :param paths: list of files or folders
+
+    :return: iterator of file paths
+    """
+    extensions = XML_EXTENSIONS + JSON_EXTENSIONS + JSON_LINES_EXTENSIONS
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, _, file_names in sorted(os.walk(path)):
+                for file_name in sorted(file_names):
+                    if file_name.endswith(extensions):
+                        yield os.path.join(dir_path, file_name)
+        else:
+            yield path
+
+
+def iter_xml_records(path: str) -> Iterator[etree.Element]:
+    """Iterate over the MARCXML records of a file
+
+    Records are parsed incrementally and detached from the document after use:
+    memory is released unless the returned element is kept.
+
+    :param path: path of the XML file
+
+    :return: iterator of :class:`etree.Element` records
+    """
+    for _, element in etree.iterparse(path, events=('end',), tag=(f'{MARC_NS}record', 'record')):
+        # Records of SRU responses without namespace are not MARC records
+        if element.tag == 'record' and element.find('leader') is None:
+            continue
+        yield element
+        parent = element.getparent()
+        if parent is not None:
+            parent.remove(element)
+
+
+def iter_json_records(path: str) -> Iterator[Dict]:
+    """Iterate over the JSON records of a file
+
+    :param path: path of the JSON file
+
+    :return: iterator of JSON records
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(JSON_LINES_EXTENSIONS):
+            for line in f:
+                if len(line.strip()) > 0:
+                    yield json.loads(line)
+        else:
+            data = json.load(f)
+            if isinstance(data, list):
+                yield from data
+            else:
+                yield data
+
+
+def iter_raw_records(paths: List[str]) -> Iterator[Tuple[str, Union[bytes, Dict]]]:
+    """Iterate over the raw records of files
+
+    XML records are serialized, raw records can be sent to other processes
+    and parsed with :func:`parse_raw_record`.
+
+    :param paths: list of files or folders
+
+    :return: iterator of tuples with the format ('xml' or 'json') and the raw record
+    """
+    for path in iter_files(paths):
+        if path.endswith(XML_EXTENSIONS):
+            for element in iter_xml_records(path):
+                yield 'xml', etree.tostring(element)
+        elif path.endswith(JSON_EXTENSIONS + JSON_LINES_EXTENSIONS):
+            for record in iter_json_records(path):
+                yield 'json', record
+        else:
+            logging.warning(f'Unsupported file format, file skipped: {path}')
+
+
+def parse_raw_record(rec_format: str,
+                     raw: Union[bytes, Dict],
+                     lazy: bool = False,
+                     fields: Optional[Iterable[str]] = None) -> BriefRec:
+    """Create a brief record from a raw record
+
+    :param rec_format: format of the raw record, 'xml' or 'json'
+    :param raw: serialized XML record or JSON record
+    :param lazy: if True, fields are extracted on first access, see :class:`dedupmarcxml.briefrecord.LazyBriefData`
+    :param fields: with `lazy`, fields extracted immediately
+
+    :return: :class:`dedupmarcxml.briefrecord.BriefRec` object
+    """
+    if rec_format == 'xml':
+        return XmlBriefRec(etree.fromstring(raw), lazy=lazy, fields=fields)
+
+    return JsonBriefRec(raw, lazy=lazy, fields=fields)
+
+
+def iter_brief_records(paths: List[str],
+                       lazy: bool = False,
+                       fields: Optional[Iterable[str]] = None) -> Iterator[BriefRec]:
+    """Iterate over the brief records of files
+
+    Records with errors are skipped and logged.
+
+    :param paths: list of files or folders
+    :param lazy: if True, fields are extracted on first access, see :class:`dedupmarcxml.briefrecord.LazyBriefData`
+    :param fields: with `lazy`, fields extracted immediately
+
+    :return: iterator of :class:`dedupmarcxml.briefrecord.BriefRec` objects
+    """
+    for path in iter_files(paths):
+        if path.endswith(XML_EXTENSIONS):
+            records = ((XmlBriefRec, element) for element in iter_xml_records(path))
+        elif path.endswith(JSON_EXTENSIONS + JSON_LINES_EXTENSIONS):
+            records = ((JsonBriefRec, record) for record in iter_json_records(path))
+        else:
+            logging.warning(f'Unsupported file format, file skipped: {path}')
+            continue
+
+        for brief_rec_class, record in records:
+            rec = brief_rec_class(record, lazy=lazy, fields=fields)
+            if rec.error is True:
+                logging.error(f'Record skipped in {path}: {rec.error_messages}')
+                continue
+            yield rec
+
+
+def iter_ndjson_lines(path: str) -> Iterator[bytes]:
+    """Iterate over the lines of a JSON lines file without decoding them
+
+    Empty lines are skipped. Lines can be decoded in other processes, see
+    :func:`iter_json_brief_record_batches`.
+
+    :param path: path of the JSON lines file
+
+    :return: iterator of lines
+    """
+    with open(path, 'rb') as f:
+        for line in f:
+            if len(line.strip()) > 0:
+                yield line
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Split an iterable in lists of `batch_size` items
+
+    Items are read only when the batch is required.
+
+    :param items: iterable to split
+    :param batch_size: maximum number of items of each list
+
+    :return: iterator of lists
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def parse_json_batch(batch: List[Union[str, bytes, Dict]],
+                     lazy: bool = False,
+                     fields: Optional[Iterable[str]] = None) -> List[BriefRec]:
+    """Create the brief records of a batch of JSON documents
+
+    Documents can be decoded records or JSON strings. Documents that can't be
+    decoded and records with errors are skipped and logged.
+
+    :param batch: list of JSON documents
+    :param lazy: if True, fields are extracted on first access, see :class:`dedupmarcxml.briefrecord.LazyBriefData`
+    :param fields: with `lazy`, fields extracted immediately
+
+    :return: list of :class:`dedupmarcxml.briefrecord.JsonBriefRec` objects
+    """
+    recs = []
+    for document in batch:
+        if isinstance(document, (str, bytes)):
+            try:
+                document = json.loads(document)
+            except ValueError as e:
+                logging.error(f'Record skipped, invalid JSON: {e}')
+                continue
+
+        rec = JsonBriefRec(document, lazy=lazy, fields=fields)
+        if rec.error is True:
+            logging.error(f'Record skipped: {rec.error_messages}')
+            continue
+        recs.append(rec)
+
+    return recs
+
+
+def _parse_json_batch_data(batch: List[Union[str, bytes, Dict]]) -> List[Dict]:
+    """Return the data of the brief records of a batch, used by the worker processes
+
+    :param batch: list of JSON documents
+
+    :return: list of data of the brief records, see :func:`parse_json_batch`
+    """
+    return [rec.data for rec in parse_json_batch(batch)]
+
+
+def iter_json_brief_record_batches(source: Union[str, Iterable[Union[str, bytes, Dict]]],
+                                   batch_size: int = 1000,
+                                   workers: int = 1,
+                                   max_pending: Optional[int] = None,
+                                   lazy: bool = False,
+                                   fields: Optional[Iterable[str]] = None) -> Iterator[List[BriefRec]]:
+    """Iterate over batches of brief records of a stream of JSON documents
+
+    The source is read one batch at a time, memory is bounded by the size and the
+    number of the batches in progress. Documents can come from:
+
+    - a JSON lines file (extensions ".jsonl" and ".ndjson"), lines are decoded with
+      the records
+    - a JSON file, the whole file is decoded first
+    - any iterable of decoded records or JSON strings, for example a database cursor
+
+    With several workers, batches are decoded by a pool of processes, at most
+    `max_pending` batches are in progress. Workers return the data of the records:
+    the brief records are :class:`dedupmarcxml.briefrecord.RawBriefRec` objects
+    without source data. Order of the batches is kept.
+
+    Example:
+
+    >>> cursor = collection.find({}, batch_size=1000)
+    >>> for recs in iter_json_brief_record_batches(cursor, batch_size=1000):
+    ...     index.add_records(recs)
+
+    :param source: path of a JSON file or iterable of JSON documents
+    :param batch_size: number of documents of each batch
+    :param workers: number of worker processes, 1 to decode in the current process
+    :param max_pending: maximum number of batches sent to the workers and not yet
+        returned, default is twice the number of workers
+    :param lazy: if True, fields are extracted on first access, not available with
+        several workers
+    :param fields: with `lazy`, fields extracted immediately
+
+    :return: iterator of lists of :class:`dedupmarcxml.briefrecord.BriefRec` objects
+    """
+    if workers > 1 and lazy is True:
+        raise ValueError('Lazy brief records are not available with several workers')
+
+    if isinstance(source, str):
+        source = iter_ndjson_lines(source) if source.endswith(JSON_LINES_EXTENSIONS) else iter_json_records(source)
+    batches = iter_batches(source, batch_size)
+
+    if workers <= 1:
+        for batch in batches:
+            yield parse_json_batch(batch, lazy=lazy, fields=fields)
+        return
+
+    max_pending = max_pending if max_pending is not None else 2 * workers
+    methods_available = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods_available else None)
+    pool = context.Pool(workers)
+    try:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(_parse_json_batch_data, (batch,)))
+            if len(pending) >= max_pending:
+                yield [RawBriefRec(data) for data in pending.popleft().get()]
+        while len(pending) > 0:
+            yield [RawBriefRec(data) for data in pending.popleft().get()]
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
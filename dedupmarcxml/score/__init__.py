@@ -3,3 +3,4 @@ import dedupmarcxml.score.publishers
 import dedupmarcxml.score.extent
 import dedupmarcxml.score.editions
 import dedupmarcxml.score.methods
+import dedupmarcxml.score.batch
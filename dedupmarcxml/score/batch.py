@@ -0,0 +1,494 @@
+"""
+Array-based evaluation of one record against many candidates
+
+The cheap fields (years, languages, format, extent and identifiers) are encoded once for a list
+of candidate records in numpy arrays. One record can then be scored against all
+the candidates in a single numpy pass. Results are the same as the functions of
+:mod:`dedupmarcxml.evaluate`, including the handling of missing values.
+
+It is useful to prefilter thousands of candidates before the complete evaluation.
+"""
+
+import numpy as np
+from typing import List, Dict, Optional, NamedTuple, Union
+from dedupmarcxml.score import extent as extent_lib
+from dedupmarcxml import evaluate
+
+# Integer codes of the categories (languages, types, 33X fields...). They are shared
+# between all the encoded arrays.
+_codes: Dict[str, int] = {}
+
+# Default score used by :func:`dedupmarcxml.tools.handle_missing_values`
+DEFAULT_SCORE = 0.2
+
+
+class YearsArrays(NamedTuple):
+    """Encoded years of a list of records
+
+    :ivar y1: start years, padded with NaN
+    :ivar y2: end years, NaN if not available
+    :ivar empty: True if the record has no start year
+    """
+    y1: np.ndarray
+    y2: np.ndarray
+    empty: np.ndarray
+
+
+class LanguagesArrays(NamedTuple):
+    """Encoded languages of a list of records
+
+    :ivar codes: unique language codes, padded with -1
+    :ivar first: code of the first language
+    :ivar und_count: number of undetermined languages
+    :ivar empty: True if the record has no language
+    """
+    codes: np.ndarray
+    first: np.ndarray
+    und_count: np.ndarray
+    empty: np.ndarray
+
+
+class FormatsArrays(NamedTuple):
+    """Encoded formats of a list of records
+
+    :ivar type: code of the type
+    :ivar access: code of the access
+    :ivar analytical: True for analytical records
+    :ivar f33x: codes of the 33X parts, -1 when the part is absent
+    :ivar f33x_blank: True when the 33X part is blank
+    :ivar empty: True if the record has no type
+    """
+    type: np.ndarray
+    access: np.ndarray
+    analytical: np.ndarray
+    f33x: np.ndarray
+    f33x_blank: np.ndarray
+    empty: np.ndarray
+
+
+class ExtentsArrays(NamedTuple):
+    """Encoded extents of a list of records
+
+    :ivar nb: unique numbers of the extent, padded with -1
+    :ivar rounded: unique rounded numbers of the extent, padded with -1
+    :ivar total: sum of the numbers of the extent
+    :ivar types: extent types found in the text, see :func:`dedupmarcxml.score.extent.get_extent_types`
+    :ivar empty: True if the record has no extent number
+    """
+    nb: np.ndarray
+    rounded: np.ndarray
+    total: np.ndarray
+    types: np.ndarray
+    empty: np.ndarray
+
+
+class IdentifiersArrays(NamedTuple):
+    """Encoded identifiers of a list of records
+
+    Identifiers are replaced by their hash, arrays are only valid in the current process.
+
+    :ivar raw: hashes of the identifiers, padded with 0
+    :ivar extended: hashes of the identifiers and of their digits only versions, padded with 0
+    :ivar empty: True if the record has no identifier
+    """
+    raw: np.ndarray
+    extended: np.ndarray
+    empty: np.ndarray
+
+
+class RecordsArrays(NamedTuple):
+    """Encoded cheap fields of a list of records, see :func:`encode_records`"""
+    years: YearsArrays
+    languages: LanguagesArrays
+    formats: FormatsArrays
+    extents: ExtentsArrays
+    std_nums: IdentifiersArrays
+    sys_nums: IdentifiersArrays
+
+
+def get_code(value: str) -> int:
+    """Return the integer code of a category
+
+    :param value: category to encode
+
+    :return: integer code of the category
+    """
+    code = _codes.get(value)
+    if code is None:
+        code = _codes.setdefault(value, len(_codes))
+
+    return code
+
+
+def _pad(rows: List[List], fill_value: float, dtype: type) -> np.ndarray:
+    """Build a 2D array from lists of different lengths"""
+    width = max([len(row) for row in rows] + [1])
+    array = np.full((len(rows), width), fill_value, dtype=dtype)
+    for i, row in enumerate(rows):
+        array[i, :len(row)] = row
+
+    return array
+
+
+def _apply_missing_values(scores: np.ndarray,
+                          empty1: Union[bool, np.ndarray],
+                          empty2: np.ndarray,
+                          default_score: float = DEFAULT_SCORE) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.tools.handle_missing_values`
+
+    :param scores: raw scores of the evaluation
+    :param empty1: True if the value of the first record is missing
+    :param empty2: array indicating missing values of the candidates
+    :param default_score: score to use for missing values
+
+    :return: array with the final scores
+    """
+    scores = np.where(scores < 0, np.abs(scores), scores * (1 - default_score) + default_score)
+    scores = np.where(empty1 | empty2, default_score / 2, scores)
+
+    return np.where(empty1 & empty2, 0.0, scores)
+
+
+def encode_years(years_list: List[Optional[Dict]]) -> YearsArrays:
+    """Encode the years of several records
+
+    :param years_list: list of years dictionaries of the brief records
+
+    :return: :class:`YearsArrays` object
+    """
+    y1 = _pad([[] if y is None else y.get('y1', []) for y in years_list], np.nan, np.float64)
+    y2 = np.array([np.nan if y is None or y.get('y2') is None else y['y2'] for y in years_list], dtype=np.float64)
+    empty = np.array([y is None or len(y.get('y1', [])) == 0 for y in years_list], dtype=bool)
+
+    return YearsArrays(y1, y2, empty)
+
+
+def encode_languages(languages_list: List[Optional[List[str]]]) -> LanguagesArrays:
+    """Encode the languages of several records
+
+    :param languages_list: list of languages of the brief records
+
+    :return: :class:`LanguagesArrays` object
+    """
+    rows = []
+    first = []
+    und_count = []
+    for languages in languages_list:
+        languages = ['und' if lang in ['zxx', 'mul'] else lang.lower() for lang in languages or []]
+        rows.append(sorted({get_code(lang) for lang in languages}))
+        first.append(get_code(languages[0]) if len(languages) > 0 else -1)
+        und_count.append(languages.count('und'))
+
+    return LanguagesArrays(_pad(rows, -1, np.int64),
+                           np.array(first, dtype=np.int64),
+                           np.array(und_count, dtype=np.int64),
+                           np.array([languages is None or len(languages) == 0 for languages in languages_list],
+                                    dtype=bool))
+
+
+def encode_formats(formats_list: List[Optional[Dict]]) -> FormatsArrays:
+    """Encode the formats of several records
+
+    :param formats_list: list of formats of the brief records
+
+    :return: :class:`FormatsArrays` object
+    """
+    f33x_rows = []
+    f33x_blank_rows = []
+    for res_format in formats_list:
+        parts = [] if res_format is None else res_format.get('f33x', '').strip().split(';')
+        f33x_rows.append([get_code(part) for part in parts])
+        f33x_blank_rows.append([part.strip() == '' for part in parts])
+
+    formats_list = [res_format or {} for res_format in formats_list]
+
+    return FormatsArrays(np.array([get_code(str(f.get('type'))) for f in formats_list], dtype=np.int64),
+                         np.array([get_code(str(f.get('access'))) for f in formats_list], dtype=np.int64),
+                         np.array([f.get('analytical') is True for f in formats_list], dtype=bool),
+                         _pad(f33x_rows, -1, np.int64),
+                         _pad(f33x_blank_rows, False, bool),
+                         np.array([f.get('type') is None or len(f['type'].strip()) == 0 for f in formats_list],
+                                  dtype=bool))
+
+
+def encode_extents(extents_list: List[Optional[Dict]]) -> ExtentsArrays:
+    """Encode the extents of several records
+
+    :param extents_list: list of extents of the brief records
+
+    :return: :class:`ExtentsArrays` object
+    """
+    nb_rows = []
+    rounded_rows = []
+    types_rows = []
+    for extent in extents_list:
+        nb = [] if extent is None else extent.get('nb', [])
+        nb_rows.append(sorted(set(nb)))
+        rounded_rows.append(sorted(extent_lib.get_rounded_extent(set(nb))))
+        txt = '' if extent is None else extent.get('txt', '')
+        types_rows.append(list(extent_lib.get_extent_types(txt).values()))
+
+    return ExtentsArrays(_pad(nb_rows, -1, np.float64),
+                         _pad(rounded_rows, -1, np.float64),
+                         np.array([0 if e is None else sum(e.get('nb', [])) for e in extents_list], dtype=np.float64),
+                         np.array(types_rows, dtype=bool).reshape(len(extents_list), len(extent_lib.extent_types)),
+                         np.array([e is None or len(e.get('nb', [])) == 0 for e in extents_list], dtype=bool))
+
+
+def _hash_identifiers(ids) -> List[int]:
+    """Return the sorted non-null hashes of a set of identifiers"""
+    return sorted({hash(num) or 1 for num in ids})
+
+
+def encode_identifiers(ids_list: List[Optional[List[str]]]) -> IdentifiersArrays:
+    """Encode the identifiers of several records
+
+    :param ids_list: list of standard numbers or system numbers of the brief records
+
+    :return: :class:`IdentifiersArrays` object
+    """
+    raw_rows = []
+    extended_rows = []
+    for ids in ids_list:
+        id_sets = evaluate.prepare_identifiers(ids or [])
+        raw_rows.append(_hash_identifiers(id_sets.raw))
+        extended_rows.append(_hash_identifiers(id_sets.extended))
+
+    return IdentifiersArrays(_pad(raw_rows, 0, np.int64),
+                             _pad(extended_rows, 0, np.int64),
+                             np.array([ids is None or len(ids) == 0 for ids in ids_list], dtype=bool))
+
+
+def encode_records(recs: List) -> RecordsArrays:
+    """Encode the cheap fields of several brief records
+
+    :param recs: list of :class:`dedupmarcxml.briefrecord.BriefRec` objects
+
+    :return: :class:`RecordsArrays` object
+    """
+    return RecordsArrays(encode_years([rec.data['years'] for rec in recs]),
+                         encode_languages([rec.data['languages'] for rec in recs]),
+                         encode_formats([rec.data['format'] for rec in recs]),
+                         encode_extents([rec.data['extent'] for rec in recs]),
+                         encode_identifiers([rec.data['std_nums'] for rec in recs]),
+                         encode_identifiers([rec.data['sys_nums'] for rec in recs]))
+
+
+def _evaluate_year_values(years1: np.ndarray, years2: np.ndarray) -> np.ndarray:
+    """Return the best year score of each candidate, NaN values are ignored"""
+    if years1.size == 0 or years2.size == 0:
+        return np.full(len(years2), np.nan)
+
+    diff = np.abs(years2[:, :, np.newaxis] - years1[np.newaxis, np.newaxis, :])
+    scores = 1 / ((diff * .5) ** 2 + 1)
+
+    # Scores of NaN years are NaN and must be ignored
+    scores = np.where(np.isnan(scores), -np.inf, scores).max(axis=(1, 2))
+    return np.where(np.isinf(scores), np.nan, scores)
+
+
+def evaluate_years_start_and_end_batch(years: Optional[Dict], candidates: YearsArrays) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.evaluate.evaluate_years_start_and_end`
+
+    :param years: dictionary containing start and end year of the record
+    :param candidates: encoded years of the candidates, see :func:`encode_years`
+
+    :return: array with the score of each candidate
+    """
+    encoded = encode_years([years])
+
+    # Start years, handled like lists of values
+    score_start = _evaluate_year_values(encoded.y1[0][~np.isnan(encoded.y1[0])], candidates.y1)
+    score_start = np.where(np.isnan(score_start), 0.0, score_start * (1 - DEFAULT_SCORE) + DEFAULT_SCORE)
+
+    # End years, missing values get special scores
+    y2 = encoded.y2[0]
+    score_end = _apply_missing_values(1 / ((np.abs(candidates.y2 - y2) * .5) ** 2 + 1),
+                                      np.isnan(y2),
+                                      np.isnan(candidates.y2))
+
+    scores = np.where(score_end == 0,
+                      score_start,
+                      np.where(score_end == DEFAULT_SCORE / 2,
+                               score_start * 0.9,
+                               (score_start * 3 + score_end) / 4))
+
+    return _apply_missing_values(scores, encoded.empty[0], candidates.empty)
+
+
+def evaluate_languages_batch(languages: Optional[List[str]], candidates: LanguagesArrays) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.evaluate.evaluate_languages`
+
+    :param languages: list of languages of the record
+    :param candidates: encoded languages of the candidates, see :func:`encode_languages`
+
+    :return: array with the score of each candidate
+    """
+    encoded = encode_languages([languages])
+    codes = encoded.codes[0][encoded.codes[0] >= 0]
+
+    valid = candidates.codes >= 0
+    intersection = (np.isin(candidates.codes, codes) & valid).sum(axis=1)
+    union = len(codes) + valid.sum(axis=1) - intersection
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(union > 0, intersection / np.maximum(union, 1), 0)
+    scores = np.where(candidates.first == encoded.first[0], 0.7 + 0.3 * scores, scores)
+    scores = np.where(candidates.und_count + encoded.und_count[0] == 1, -0.1, scores)
+
+    return _apply_missing_values(scores, encoded.empty[0], candidates.empty)
+
+
+def evaluate_format_batch(res_format: Optional[Dict], candidates: FormatsArrays) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.evaluate.evaluate_format`
+
+    :param res_format: dictionary containing format of the record
+    :param candidates: encoded formats of the candidates, see :func:`encode_formats`
+
+    :return: array with the score of each candidate
+    """
+    encoded = encode_formats([res_format])
+
+    scores = np.where(candidates.access == encoded.access[0], 0.55, 0)
+
+    # Compare fields 33X => 0.45 max for the 3 fields
+    for i in range(encoded.f33x.shape[1]):
+        if encoded.f33x[0, i] < 0:
+            break
+        if i >= candidates.f33x.shape[1]:
+            break
+        available = candidates.f33x[:, i] >= 0
+        blank1 = encoded.f33x_blank[0, i]
+        blank2 = candidates.f33x_blank[:, i]
+        scores = scores + np.where(~available, 0,
+                                   np.where(candidates.f33x[:, i] == encoded.f33x[0, i], 0.15,
+                                            np.where(blank1 & blank2, 0.5,
+                                                     np.where(blank1 | blank2, 0.1, 0))))
+
+    # Type and analytical must be the same
+    same_type = (candidates.type == encoded.type[0]) & (candidates.analytical == encoded.analytical[0])
+    scores = np.where(same_type, scores, 0)
+
+    return _apply_missing_values(scores, encoded.empty[0], candidates.empty)
+
+
+def _calc_with_sets_batch(values: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.score.extent.calc_with_sets`"""
+    valid = candidates >= 0
+    in_values = np.isin(candidates, values) & valid
+    intersection = in_values.sum(axis=1)
+    union = len(values) + (valid & ~in_values).sum(axis=1)
+
+    score = intersection / np.maximum(union, 1)
+    factor = np.prod(np.where(in_values, candidates, 1), axis=1) / (
+            np.prod(values) * np.prod(np.where(valid & ~in_values, candidates, 1), axis=1) * 1.01)
+
+    return score + (1 - score) * factor
+
+
+def evaluate_extent_batch(extent: Optional[Dict],
+                          candidates: ExtentsArrays,
+                          rec_type: Optional[Union[str, np.ndarray]] = None) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.evaluate.evaluate_extent`
+
+    :param extent: dictionary containing extent of the record
+    :param candidates: encoded extents of the candidates, see :func:`encode_extents`
+    :param rec_type: type of the records or array with the type of each pair, None
+        when types are different
+
+    :return: array with the score of each candidate
+    """
+    encoded = encode_extents([extent])
+    nb = encoded.nb[0][encoded.nb[0] >= 0]
+    rounded = encoded.rounded[0][encoded.rounded[0] >= 0]
+
+    score1 = _calc_with_sets_batch(nb, candidates.nb)
+    score2 = _calc_with_sets_batch(rounded, candidates.rounded)
+
+    total1 = encoded.total[0]
+    totals = total1 + candidates.total
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score3 = np.where(totals > 0,
+                          1 - np.clip((np.abs(total1 - candidates.total) / totals) * 15, 0, 1),
+                          0)
+
+    scores = np.where((score3 - score1 > 0.5) & (score3 > 0.95) & (totals > 100),
+                      (score1 + score2 + score3 * 10) / 12,
+                      (score1 + score2 + score3) / 3)
+
+    # Notated music: penalty if extent types are different, bonus if types are the same
+    notated_music = np.asarray(rec_type) == 'Notated Music'
+    if np.any(notated_music):
+        types1 = encoded.types[0]
+        both_typed = types1.any() & candidates.types.any(axis=1)
+        penalty = np.where(both_typed, (candidates.types != types1).sum(axis=1), 0)
+        bonus = np.where(both_typed, (candidates.types & types1).sum(axis=1), 0)
+        with np.errstate(divide='ignore'):
+            music_scores = np.where(penalty > 0, 0,
+                                    np.where(bonus > 0, scores ** (0.5 / np.maximum(bonus, 1)), scores))
+        scores = np.where(notated_music, music_scores, scores)
+
+    return _apply_missing_values(scores, encoded.empty[0], candidates.empty)
+
+
+def _calc_identifiers_score_batch(ids: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Vectorized similarity of sets of identifiers"""
+    ids = ids[ids != 0]
+    valid = candidates != 0
+    intersection = (np.isin(candidates, ids) & valid).sum(axis=1)
+    union = len(ids) + valid.sum(axis=1) - intersection
+    score = intersection / np.maximum(union, 1)
+
+    return np.where(intersection > 0, score ** .05, 0)
+
+
+def evaluate_std_nums_batch(ids: Optional[List[str]], candidates: IdentifiersArrays) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.evaluate.evaluate_std_nums`
+
+    :param ids: list of standard numbers of the record
+    :param candidates: encoded standard numbers of the candidates, see :func:`encode_identifiers`
+
+    :return: array with the score of each candidate
+    """
+    encoded = encode_identifiers([ids])
+    score1 = _calc_identifiers_score_batch(encoded.raw[0], candidates.raw)
+    score2 = _calc_identifiers_score_batch(encoded.extended[0], candidates.extended)
+    scores = np.where(score1 >= score2, score1, score2 * 0.9)
+
+    return _apply_missing_values(scores, encoded.empty[0], candidates.empty)
+
+
+def evaluate_identifiers_batch(ids: Optional[List[str]], candidates: IdentifiersArrays) -> np.ndarray:
+    """Vectorized version of :func:`dedupmarcxml.evaluate.evaluate_identifiers`
+
+    :param ids: list of identifiers of the record
+    :param candidates: encoded identifiers of the candidates, see :func:`encode_identifiers`
+
+    :return: array with the score of each candidate
+    """
+    encoded = encode_identifiers([ids])
+    scores = _calc_identifiers_score_batch(encoded.raw[0], candidates.raw)
+
+    return _apply_missing_values(scores, encoded.empty[0], candidates.empty)
+
+
+def evaluate_records_batch(rec, candidates: RecordsArrays) -> Dict[str, np.ndarray]:
+    """Evaluate the cheap fields of a record against many candidates
+
+    :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+    :param candidates: encoded candidates, see :func:`encode_records`
+
+    :return: dictionary with an array of scores for the fields 'format', 'languages',
+        'extent', 'years', 'std_nums' and 'sys_nums'
+    """
+    res_format = rec.data['format']
+    rec_types = np.where(candidates.formats.type == get_code(str(res_format.get('type'))),
+                         str(res_format.get('type')),
+                         '')
+
+    return {'format': evaluate_format_batch(res_format, candidates.formats),
+            'languages': evaluate_languages_batch(rec.data['languages'], candidates.languages),
+            'extent': evaluate_extent_batch(rec.data['extent'], candidates.extents, rec_type=rec_types),
+            'years': evaluate_years_start_and_end_batch(rec.data['years'], candidates.years),
+            'std_nums': evaluate_std_nums_batch(rec.data['std_nums'], candidates.std_nums),
+            'sys_nums': evaluate_identifiers_batch(rec.data['sys_nums'], candidates.sys_nums)}
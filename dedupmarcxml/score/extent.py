@@ -1,4 +1,5 @@
 import numpy as np
+from typing import Dict
 from dedupmarcxml import tools
 import re
 
@@ -51,6 +52,25 @@ def calc_with_sum(extent1, extent2):
     return 1 - score
 
 
+def get_extent_types(extent: str) -> Dict[str, bool]:
+    """Return the extent types found in the text of an extent
+
+    It uses the dictionary `extent_types` with the words of each category.
+
+    :param extent: text of the extent
+
+    :return: dictionary with extent type as key and a boolean indicating
+        if the type is mentioned"""
+    norm_extent = tools.to_ascii(extent)
+    result = {k: False for k in extent_types.keys()}
+    for extent_type, extent_values in extent_types.items():
+        for extent_value in extent_values:
+            if re.search(extent_value, norm_extent) is not None:
+                result[extent_type] = True
+
+    return result
+
+
 def calc_notated_music_score(extent1, extent2, score):
     """Calculate score for notated music extent comparison
 
@@ -64,15 +84,9 @@ def calc_notated_music_score(extent1, extent2, score):
     :param score: float with matching score
 
     :return: float with matching score"""
-    norm_extent1 = tools.to_ascii(extent1)
-    norm_extent2 = tools.to_ascii(extent2)
-    result = {k:{'rec1': False, 'rec2': False} for k in extent_types.keys()}
-    for extent_type, extent_values in extent_types.items():
-        for extent_value in extent_values:
-            if re.search(extent_value, norm_extent1) is not None:
-                result[extent_type]['rec1'] = True
-            if re.search(extent_value, norm_extent2) is not None:
-                result[extent_type]['rec2'] = True
+    types1 = get_extent_types(extent1)
+    types2 = get_extent_types(extent2)
+    result = {k: {'rec1': types1[k], 'rec2': types2[k]} for k in extent_types.keys()}
 
     penalty = 0
     bonus = 0
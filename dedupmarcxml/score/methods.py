@@ -1,10 +1,173 @@
-from typing import Dict
+from typing import Dict, List, Tuple, Callable, Optional, Union
+from collections import OrderedDict
+from functools import wraps
+import threading
 import numpy as np
 import pandas as pd
 from dedupmarcxml import tools
 
 method_list = ['mean', 'random_forest_book', 'random_forest_music', 'mlp_book']
 
+
+class PredictionCache:
+    """Cache of the predictions of the classifiers
+
+    Similarity results are quantized with the precision: values are rounded to
+    a multiple of the precision. The key of an entry is the name of the method
+    and the quantized values. The classifier always predicts the quantized values,
+    the result doesn't depend on which equivalent results were predicted first.
+    A coarse precision increases the hit rate, but predictions can differ from
+    the predictions of the exact results.
+
+    The least recently used entries are removed when the cache is full. The cache
+    is thread safe.
+
+    :ivar max_size: maximum number of entries
+    :ivar precision: precision of the quantization
+    :ivar hits: number of predictions found in the cache
+    :ivar misses: number of predictions computed by the classifiers
+    """
+
+    def __init__(self, max_size: int = 100000, precision: float = 1e-6) -> None:
+        """Prediction cache
+
+        :param max_size: maximum number of entries
+        :param precision: precision of the quantization
+        """
+        self.max_size = max_size
+        self.precision = precision
+        # Values are divided by the inverse of the precision: 0.1 is restored exactly
+        self._scale = 1 / precision
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_key(self, method: str, results: Dict[str, float]) -> Tuple:
+        """Return the key of the results
+
+        :param method: name of the method
+        :param results: dictionary with results values
+
+        :return: tuple with the method, the names of the results and the quantized values
+        """
+        return method, tuple(results), tuple([round(v * self._scale) for v in results.values()])
+
+    def get_results(self, key: Tuple) -> Dict[str, float]:
+        """Return the quantized results of a key
+
+        :param key: key returned by :meth:`get_key`
+
+        :return: dictionary with results values
+        """
+        return {k: v / self._scale for k, v in zip(key[1], key[2])}
+
+    def get(self, key: Tuple) -> Optional[float]:
+        """Return a cached prediction
+
+        :param key: key returned by :meth:`get_key`
+
+        :return: prediction or None if not cached
+        """
+        with self._lock:
+            score = self._entries.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def set(self, key: Tuple, score: float) -> None:
+        """Store a prediction
+
+        :param key: key returned by :meth:`get_key`
+        :param score: prediction
+        """
+        with self._lock:
+            self._entries[key] = score
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def add_hits(self, nb: int) -> None:
+        """Count predictions found without reading the cache
+
+        :param nb: number of hits, for example results repeated in a batch
+        """
+        with self._lock:
+            self.hits += nb
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        """Return the statistics of the cache
+
+        :return: dictionary with the number of hits, misses, the hit rate and the number of entries
+        """
+        with self._lock:
+            nb = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / nb if nb > 0 else 0.0,
+                    'size': len(self._entries)}
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Cache used by the classifiers, see :func:`enable_prediction_cache`
+prediction_cache: Optional[PredictionCache] = None
+
+
+def enable_prediction_cache(max_size: int = 100000, precision: float = 1e-6) -> PredictionCache:
+    """Cache the predictions of the classifiers
+
+    :param max_size: maximum number of entries
+    :param precision: precision of the quantization of the results
+
+    :return: new :class:`PredictionCache` object
+    """
+    global prediction_cache
+    prediction_cache = PredictionCache(max_size, precision)
+    return prediction_cache
+
+
+def disable_prediction_cache() -> None:
+    """Stop caching the predictions of the classifiers"""
+    global prediction_cache
+    prediction_cache = None
+
+
+def cached_prediction(func: Callable[[Dict[str, float]], float]) -> Callable[[Dict[str, float]], float]:
+    """Decorator using the prediction cache if it is enabled
+
+    On a cache miss, the classifier is called with the quantized results.
+
+    :param func: function of a classifier
+
+    :return: decorated function
+    """
+    @wraps(func)
+    def wrapper(results: Dict[str, float]) -> float:
+        if prediction_cache is None:
+            return func(results)
+
+        key = prediction_cache.get_key(func.__name__, results)
+        score = prediction_cache.get(key)
+        if score is None:
+            score = func(prediction_cache.get_results(key))
+            prediction_cache.set(key, score)
+        return score
+
+    return wrapper
+
 def mean(results: Dict[str, float]) -> float:
     """
     Calculate the mean of the values in the two dictionaries. We exclude
@@ -22,6 +185,7 @@ def mean(results: Dict[str, float]) -> float:
 
     return np.mean(norm_values) if len(norm_values) > 0 else 0.0
 
+@cached_prediction
 def random_forest_music(results: Dict[str, float]) -> float:
     """
     Calculate the mean of the values in the two dictionaries. We exclude
@@ -37,6 +201,7 @@ def random_forest_music(results: Dict[str, float]) -> float:
     return score
 
 
+@cached_prediction
 def mlp_book(results: Dict[str, float]) -> float:
     """
     Calculate the probability according to the model using the
@@ -53,6 +218,7 @@ def mlp_book(results: Dict[str, float]) -> float:
 
     return score
 
+@cached_prediction
 def random_forest_book(results: Dict[str, float]) -> float:
     """
     Calculate the probability according to the model using the
@@ -69,6 +235,7 @@ def random_forest_book(results: Dict[str, float]) -> float:
 
     return score
 
+@cached_prediction
 def random_forest_general(results: Dict[str, float]) -> float:
     """
     Calculate the probability according to the model using the
@@ -84,3 +251,153 @@ def random_forest_general(results: Dict[str, float]) -> float:
         score = 0.0
 
     return score
+
+
+# Models of the classifiers, names of the attributes of :mod:`dedupmarcxml.tools`
+classifier_models = {'random_forest_music': 'rf_music_model',
+                     'random_forest_book': 'rf_book_model',
+                     'random_forest_general': 'rf_general_model',
+                     'mlp_book': 'mlp_book_model'}
+
+
+def mean_batch(results_list: List[Dict[str, float]]) -> np.ndarray:
+    """
+    Calculate the mean of the values of each dictionary like :func:`mean`,
+    missing values (0.0 and 0.1) are excluded.
+
+    :param results_list: list of dictionaries with results values
+
+    :return: array of means
+    """
+    if len(results_list) == 0:
+        return np.zeros(0)
+
+    values = pd.DataFrame(results_list).to_numpy(dtype=float)
+    valid = values >= 0.2
+    nb_valid = valid.sum(axis=1)
+    sums = np.where(valid, values, 0.0).sum(axis=1)
+
+    return np.divide(sums, nb_valid, out=np.zeros(len(results_list)), where=nb_valid > 0)
+
+
+def classifier_batch(results_list: List[Dict[str, float]], method: str) -> np.ndarray:
+    """
+    Calculate the probabilities of a classifier for many dictionaries
+    with a single prediction.
+
+    If the prediction fails, each dictionary is scored separately with the
+    function of the method.
+
+    :param results_list: list of dictionaries with results values
+    :param method: name of the classifier, key of :data:`classifier_models`
+
+    :return: array of probabilities
+    """
+    if len(results_list) == 0:
+        return np.zeros(0)
+
+    if prediction_cache is not None:
+        return _cached_classifier_batch(results_list, method, prediction_cache)
+
+    model = getattr(tools, classifier_models[method])
+    try:
+        return model.predict_proba(pd.DataFrame(results_list))[:, 1]
+    except ValueError:
+        return np.array([globals()[method](results) for results in results_list], dtype=float)
+
+
+def _cached_classifier_batch(results_list: List[Dict[str, float]], method: str, cache: PredictionCache) -> np.ndarray:
+    """
+    Calculate the probabilities of a classifier with a prediction cache, see
+    :func:`classifier_batch`. Only the distinct quantized results missing in
+    the cache are predicted.
+
+    :param results_list: list of dictionaries with results values
+    :param method: name of the classifier, key of :data:`classifier_models`
+    :param cache: :class:`PredictionCache` object
+
+    :return: array of probabilities
+    """
+    keys = [cache.get_key(method, results) for results in results_list]
+    scores = np.zeros(len(keys))
+    missing: Dict[Tuple, List[int]] = dict()
+    nb_repeated = 0
+    for i, key in enumerate(keys):
+        if key in missing:
+            # Same quantized results already missing in the batch, predicted once
+            missing[key].append(i)
+            nb_repeated += 1
+            continue
+        score = cache.get(key)
+        if score is None:
+            missing[key] = [i]
+        else:
+            scores[i] = score
+
+    if nb_repeated > 0:
+        cache.add_hits(nb_repeated)
+
+    if len(missing) == 0:
+        return scores
+
+    missing_keys = list(missing)
+    model = getattr(tools, classifier_models[method])
+    try:
+        predictions = model.predict_proba(pd.DataFrame([cache.get_results(key) for key in missing_keys]))[:, 1]
+    except ValueError:
+        predictions = [globals()[method].__wrapped__(cache.get_results(key)) for key in missing_keys]
+
+    for key, score in zip(missing_keys, predictions):
+        cache.set(key, float(score))
+        scores[missing[key]] = score
+
+    return scores
+
+
+def get_scores_batch(results_list: List[Dict[str, float]], method: str = 'mean') -> np.ndarray:
+    """
+    Calculate the scores of many dictionaries with a method.
+
+    :param results_list: list of dictionaries with results values
+    :param method: 'mean' or name of a classifier of :data:`classifier_models`
+
+    :return: array of scores
+    """
+    if method in classifier_models:
+        return classifier_batch(results_list, method)
+
+    return mean_batch(results_list)
+
+
+def two_stage_batch(results_list: List[Dict[str, float]],
+                    method: str,
+                    lower: float = 0.5,
+                    upper: float = 0.9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Score many dictionaries in two stages.
+
+    All dictionaries are first scored with :func:`mean_batch`. Pairs with a
+    mean lower than `lower` are rejected and get a score of 0.0, pairs with a
+    mean higher than `upper` are accepted and get a score of 1.0. Only the other
+    pairs are scored with the classifier.
+
+    :param results_list: list of dictionaries with results values
+    :param method: name of the classifier, key of :data:`classifier_models`
+    :param lower: pairs with a lower mean are rejected
+    :param upper: pairs with a higher mean are accepted
+
+    :return: tuple with the array of scores, the array of stages (0: rejected by
+        the mean, 1: accepted by the mean, 2: scored by the classifier) and the
+        array of means
+    """
+    means = mean_batch(results_list)
+    stages = np.full(len(results_list), 2, dtype=np.int8)
+    stages[means < lower] = 0
+    stages[means > upper] = 1
+
+    scores = stages.astype(float)
+    ambiguous = np.nonzero(stages == 2)[0]
+    if len(ambiguous) > 0:
+        scores[ambiguous] = classifier_batch([results_list[i] for i in ambiguous], method)
+
+    return scores, stages, means
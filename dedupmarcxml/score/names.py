@@ -71,28 +71,39 @@ def evaluate_names(name1: str, name2: str) -> float:
     scores = []
     already_used_n2 = []
     for r1, n1 in enumerate(names1):
-        temp_scores = []
+        best_score = None
+        best_r2 = None
         for r2, n2 in enumerate(names2):
             if r2 in already_used_n2:
                 continue
             temp_n1, temp_n2 = (n1, n2) if len(n1) >= len(n2) else (n2, n1)
+
+            # Levenshtein distance is at least the difference of lengths. For short words
+            # only the beginning of the longer word is compared.
+            min_distance = 0 if len(temp_n2) <= 2 else len(temp_n1) - len(temp_n2)
+            min_score = (min_distance * 4 + 0.2 * abs(r1 - r2) + len(temp_n1) - len(
+                temp_n2)) / max([len(n2), len(n1)])
+
+            # If the lowest reachable score cannot beat the best match, Levenshtein is not required
+            if best_score is not None and min_score >= best_score:
+                tools.prefilter_stats['skipped_by_length'] += 1
+                continue
+
+            tools.prefilter_stats['computed'] += 1
             if len(temp_n2) <= 2:
-                temp_scores.append((
-                    (Levenshtein.distance(temp_n1[:len(temp_n2)], temp_n2, weights=(1, 1, 1)) * 4 + 0.2 * abs(r1 - r2) + len(
-                        temp_n1) - len(temp_n2)) / max([len(n2), len(n1)]), r2)
-                )
+                distance = Levenshtein.distance(temp_n1[:len(temp_n2)], temp_n2, weights=(1, 1, 1))
             else:
-                temp_scores.append((
-                    (Levenshtein.distance(temp_n1, temp_n2, weights=(1, 1, 1)) * 4 + 0.2 * abs(r1 - r2) + len(temp_n1) - len(
-                        temp_n2)) / max([len(n2), len(n1)]), r2)
-                )
-                # print(temp_n1, temp_n2, distance(temp_n1, temp_n2[:len(temp_n1)], weights=(1, 1, 1)) * 3)
+                distance = Levenshtein.distance(temp_n1, temp_n2, weights=(1, 1, 1))
+            score = (distance * 4 + 0.2 * abs(r1 - r2) + len(temp_n1) - len(temp_n2)) / max([len(n2), len(n1)])
+
+            if best_score is None or score < best_score:
+                best_score = score
+                best_r2 = r2
 
-        temp_scores = sorted(temp_scores, key=lambda x: x[0])
         if n1 == '':
-            scores.append((n1, names2[temp_scores[0][1]], 0.2))
+            scores.append((n1, names2[best_r2], 0.2))
         else:
-            scores.append((n1, names2[temp_scores[0][1]], temp_scores[0][0] ** 2))
-        already_used_n2.append(temp_scores[0][1])
+            scores.append((n1, names2[best_r2], best_score ** 2))
+        already_used_n2.append(best_r2)
 
     return 1 / (sum([s[2] for s in scores]) + 1)
\ No newline at end of file
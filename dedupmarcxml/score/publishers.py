@@ -6,12 +6,37 @@ and evaluate the similarity between publisher names using vectorized systems.
 """
 
 import re
+import math
 import numpy as np
-import Levenshtein
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Tuple, Optional, Dict, List, NamedTuple, Union
 from dedupmarcxml import tools
 
 
+class PublisherVector(NamedTuple):
+    """Sparse vector of a normalized publisher name
+
+    :ivar weights: dictionary with word id as key and weight as value
+    :ivar norm: euclidean norm of the vector
+    """
+    weights: Dict[int, float]
+    norm: float
+
+
+class PublishersMatrix(NamedTuple):
+    """Sparse matrix of several publisher vectors in CSR layout
+
+    :ivar ids: word ids of all the vectors, sorted inside each row
+    :ivar weights: weights corresponding to the ids
+    :ivar indptr: limits of each row in `ids` and `weights`
+    :ivar norms: euclidean norm of each row
+    """
+    ids: np.ndarray
+    weights: np.ndarray
+    indptr: np.ndarray
+    norms: np.ndarray
+
+
 def normalize_publishers(pub1: str, pub2: str, keep_dash=True) -> Tuple[str, str, float]:
     """Normalize publisher names and calculate a factor to correct small differences
 
@@ -114,8 +139,12 @@ def correct_small_differences(pub1: str, pub2: str) -> Tuple[str, str, float]:
 
         # Iterate words of the second publisher
         for w2 in pub2_only:
-            score = Levenshtein.ratio(w1, w2)
-            if score > get_threshold(w1, w2) and score > max_score:
+            threshold = get_threshold(w1, w2)
+
+            # Words that cannot beat the threshold or the current best match are skipped
+            # with the length and q-gram bounds before calling Levenshtein
+            score = tools.levenshtein_ratio(w1, w2, score_cutoff=max(threshold, max_score), use_qgrams=True)
+            if score > threshold and score > max_score:
                 max_score = score
                 best_w2 = w2
 
@@ -137,71 +166,160 @@ def correct_small_differences(pub1: str, pub2: str) -> Tuple[str, str, float]:
     return pub1, pub2, factor
 
 
-def evaluate_publishers_vect(pub1, pub2):
-    """Calculate angle between the two publisher names.
+@lru_cache(maxsize=1)
+def get_vocabulary() -> Tuple[Dict[str, int], np.ndarray]:
+    """Return the compiled vocabulary of the publishers
 
-    Angle is normalized between 1 and 0. Value of 1 indicates complete match. To calculate
-    the angle we use the publishers data pickle: "publishers_data.pickle". Each word
-    has value related to his frequency in the corpus.
+    Each word of the publishers data pickle "publishers_data.pickle" gets an id. The
+    weight of the word is its normalized frequency at the power of 4. It is computed
+    only once.
 
-    :param pub1: string containing publisher of the first record
-    :param pub2: string containing publisher of the second record
+    :return: tuple with dictionary of the word ids and array with the weights
+    """
+    norm_counter = tools.publishers_data['norm_counter']
+    word_ids = {w: i for i, w in enumerate(norm_counter.keys())}
+    weights = np.array([v ** 4 for v in norm_counter.values()], dtype=np.float64)
 
-    :return: float containing angle between the two vectors.
+    return word_ids, weights
+
+
+def get_word_id(word: str) -> int:
+    """Return the id of a word of a publisher name
+
+    Words absent of the vocabulary get a negative id derived from their hash.
+
+    :param word: word of a normalized publisher name
+
+    :return: id of the word
     """
+    word_id = get_vocabulary()[0].get(word)
+    if word_id is None:
+        return -1 - (hash(word) & 0x7FFFFFFFFFFFFFFF)
 
-    normalize_vectors = lambda x: x ** 4
+    return word_id
 
-    # Build bag of words
-    pub1_set = set(pub1.split())
-    pub2_set = set(pub2.split())
 
-    # Create a list with union of the two sets. It is useful to build same
-    # length vectors.
-    pub_words = list(set.union(set(pub2.split()), set(pub1.split())))
+@lru_cache(maxsize=65536)
+def get_publisher_vector(pub: str) -> PublisherVector:
+    """Return the sparse vector of a normalized publisher name
+
+    Result is cached, a publisher name is vectorized only once.
+
+    :param pub: string containing normalized publisher name
+
+    :return: :class:`PublisherVector` object
+    """
+    word_ids, vocabulary_weights = get_vocabulary()
+    weights = {}
+    for w in set(pub.split()):
+        word_id = word_ids.get(w)
+
+        # if the word is absent of the model, we assign max value: 1
+        weights[get_word_id(w)] = 1.0 if word_id is None else float(vocabulary_weights[word_id])
+
+    return PublisherVector(weights, math.sqrt(sum(v * v for v in weights.values())))
 
-    vect1 = []
-    vect2 = []
 
-    # Iterate the common list to build the two vectors
-    for w in pub_words:
+def get_publishers_matrix(pubs: List[str]) -> PublishersMatrix:
+    """Build the sparse matrix of a list of normalized publisher names
 
-        # Build vector for publisher 1
-        if w in pub1_set:
+    It can be computed once and reused with :func:`evaluate_publishers_vect_batch`.
 
-            # if the word is absent of the model, we assign max value: 1
-            vect1.append(normalize_vectors(tools.publishers_data['norm_counter'].get(w, 1)))
-        else:
-            # if word is absent, vector value will be 0
-            vect1.append(0)
+    :param pubs: list of normalized publisher names
+
+    :return: :class:`PublishersMatrix` object
+    """
+    vectors = [get_publisher_vector(pub) for pub in pubs]
+    indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(v.weights) for v in vectors])
+    ids = np.empty(indptr[-1], dtype=np.int64)
+    weights = np.empty(indptr[-1], dtype=np.float64)
 
-        # Build vector for publisher 2
-        if w in pub2_set:
-            vect2.append(normalize_vectors(tools.publishers_data['norm_counter'].get(w, 1)))
-        else:
-            vect2.append(0)
+    for i, vector in enumerate(vectors):
+        items = sorted(vector.weights.items())
+        ids[indptr[i]:indptr[i + 1]] = [item[0] for item in items]
+        weights[indptr[i]:indptr[i + 1]] = [item[1] for item in items]
 
-    # transform to numpy array to be able to use numpy dot product
-    vect1 = np.array(vect1)
-    vect2 = np.array(vect2)
+    return PublishersMatrix(ids, weights, indptr, np.array([v.norm for v in vectors], dtype=np.float64))
 
-    # Calculate norms of the two vectors
-    norm_vect1 = np.linalg.norm(vect1)
-    norm_vect2 = np.linalg.norm(vect2)
 
-    # Dot product of the two vectors
-    dot_product = np.dot(vect1, vect2)
+def _angle_to_score(dot_product: float, norms_product: float) -> float:
+    """Transform the cosine of two vectors to a score between 0 and 1"""
 
     # Normalization using the product of the norms
-    if norm_vect1 * norm_vect2 == 0:
+    if norms_product == 0:
         return 0
-    cos_theta = dot_product / (norm_vect1 * norm_vect2)
+    cos_theta = dot_product / norms_product
 
-    # Be sure to have correct interval data
-    cos_theta = np.clip(cos_theta, -1, 1)
-
-    # Calculate angle
-    angle = np.arccos(cos_theta)
+    # Be sure to have correct interval data and calculate angle
+    angle = math.acos(min(max(cos_theta, -1), 1))
 
     # Normalize angle value to have it between 0 and 1.
-    return 1 - angle / np.pi * 2
+    return 1 - angle / math.pi * 2
+
+
+def evaluate_publishers_vect(pub1: str, pub2: str) -> float:
+    """Calculate angle between the two publisher names.
+
+    Angle is normalized between 1 and 0. Value of 1 indicates complete match. To calculate
+    the angle we use the publishers data pickle: "publishers_data.pickle". Each word
+    has value related to his frequency in the corpus.
+
+    Vectors are sparse and cached, see :func:`get_publisher_vector`. For such small
+    vectors, pure python is faster than numpy.
+
+    :param pub1: string containing publisher of the first record
+    :param pub2: string containing publisher of the second record
+
+    :return: float containing angle between the two vectors.
+    """
+    vect1 = get_publisher_vector(pub1)
+    vect2 = get_publisher_vector(pub2)
+
+    if len(vect1.weights) > len(vect2.weights):
+        vect1, vect2 = (vect2, vect1)
+
+    # Dot product of the two vectors, only common words are useful
+    dot_product = sum(w * vect2.weights[i] for i, w in vect1.weights.items() if i in vect2.weights)
+
+    return _angle_to_score(dot_product, vect1.norm * vect2.norm)
+
+
+def evaluate_publishers_vect_batch(pub: str, pubs: Union[List[str], PublishersMatrix]) -> np.ndarray:
+    """Calculate angle between one publisher name and many others
+
+    Same result as :func:`evaluate_publishers_vect` for each publisher, but
+    computed in one numpy pass. No correction of small differences is applied,
+    publisher names should be already normalized.
+
+    :param pub: string containing normalized publisher name
+    :param pubs: list of normalized publisher names or matrix built with
+        :func:`get_publishers_matrix`
+
+    :return: array with the score of each publisher of the list
+    """
+    if not isinstance(pubs, PublishersMatrix):
+        pubs = get_publishers_matrix(pubs)
+
+    vect = get_publisher_vector(pub)
+    query_ids = np.array(sorted(vect.weights.keys()), dtype=np.int64)
+    query_weights = np.array([vect.weights[i] for i in query_ids], dtype=np.float64)
+
+    # Weight of the query for each entry of the matrix, 0 if the word is absent of the query
+    pos = np.clip(np.searchsorted(query_ids, pubs.ids), 0, max(len(query_ids) - 1, 0))
+    if len(query_ids) > 0:
+        matched_weights = np.where(query_ids[pos] == pubs.ids, query_weights[pos], 0)
+    else:
+        matched_weights = np.zeros(len(pubs.ids))
+
+    # Dot products for each row, empty rows have a null sum
+    dot_products = np.zeros(len(pubs.norms), dtype=np.float64)
+    non_empty = pubs.indptr[1:] > pubs.indptr[:-1]
+    if np.any(non_empty):
+        dot_products[non_empty] = np.add.reduceat(matched_weights * pubs.weights, pubs.indptr[:-1][non_empty])
+
+    norms_products = pubs.norms * vect.norm
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_theta = np.clip(np.where(norms_products > 0, dot_products / norms_products, 0), -1, 1)
+
+    return np.where(norms_products > 0, 1 - np.arccos(cos_theta) / np.pi * 2, 0)
@@ -0,0 +1,355 @@
+"""
+Module to store the block index on disk
+
+:class:`SqliteBlockIndex` has the same API as :class:`dedupmarcxml.blocking.BlockIndex`
+but keeps the records and their block keys in a SQLite database. The index survives
+the restarts of the process and doesn't need to be rebuilt from the MARCXML records.
+It can be used by :class:`dedupmarcxml.index.DedupIndex`:
+
+>>> index = DedupIndex(block_index=SqliteBlockIndex('index.db', key_func=get_dedup_keys))
+
+Tables:
+- records: order of insertion, record id, fingerprint, block keys and data of the record
+  compressed with zlib
+- keys: block keys with record ids, indexed by key
+
+Writes are grouped in transactions of `commit_every` operations, use :meth:`SqliteBlockIndex.commit`
+or :meth:`SqliteBlockIndex.close` to save the last operations. Use :meth:`SqliteBlockIndex.add_records`
+to insert many records.
+"""
+from dedupmarcxml.briefrecord import BriefRec, RawBriefRec
+from dedupmarcxml.blocking import get_record_keys
+from collections import OrderedDict
+from typing import List, Dict, Set, Tuple, Iterator, Iterable, Optional, Callable
+import sqlite3
+import json
+import zlib
+
+
+def serialize_record(rec: BriefRec) -> bytes:
+    """Serialize the data of a brief record
+
+    :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+    :return: compressed JSON data
+    """
+    return zlib.compress(json.dumps(dict(rec.data), ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def deserialize_record(blob: bytes) -> BriefRec:
+    """Create a brief record from serialized data
+
+    :param blob: data returned by :func:`serialize_record`
+
+    :return: :class:`dedupmarcxml.briefrecord.RawBriefRec` object
+    """
+    return RawBriefRec(json.loads(zlib.decompress(blob).decode('utf-8')))
+
+
+class SqliteBlockIndex:
+    """Index of records grouped in blocks stored in a SQLite database
+
+    Recently used records are kept in memory: data prepared for the evaluations
+    by :class:`dedupmarcxml.evaluate.EvaluationPlan` is stored in the records and is
+    not computed again.
+
+    :ivar path: path of the database
+    :ivar key_func: function returning the block keys of a record
+    :ivar max_block_size: maximum number of records of a block or None for no limit
+    :ivar cache_size: maximum number of records kept in memory
+    :ivar commit_every: number of operations of a transaction
+    """
+
+    def __init__(self,
+                 path: str,
+                 key_func: Callable[[BriefRec], List[str]] = get_record_keys,
+                 max_block_size: Optional[int] = None,
+                 cache_size: int = 10000,
+                 commit_every: int = 10000) -> None:
+        """SQLite block index object
+
+        :param path: path of the database, created if it doesn't exist
+        :param key_func: function returning the block keys of a record, must be the
+            same function each time the database is opened
+        :param max_block_size: maximum number of records of a block or None for no limit
+        :param cache_size: maximum number of records kept in memory
+        :param commit_every: number of operations of a transaction
+        """
+        self.path = path
+        self.key_func = key_func
+        self.max_block_size = max_block_size
+        self.cache_size = cache_size
+        self.commit_every = commit_every
+        self._records: OrderedDict = OrderedDict()
+        self._nb_uncommitted = 0
+
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS records ('
+                                 'seq INTEGER PRIMARY KEY, '
+                                 'rec_id TEXT NOT NULL UNIQUE, '
+                                 'fingerprint TEXT NOT NULL, '
+                                 'keys TEXT NOT NULL, '
+                                 'data BLOB NOT NULL)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS keys ('
+                                 'key TEXT NOT NULL, '
+                                 'rec_id TEXT NOT NULL, '
+                                 'seq INTEGER NOT NULL, '
+                                 'PRIMARY KEY (key, rec_id)) WITHOUT ROWID')
+        self._connection.commit()
+
+    def __enter__(self) -> 'SqliteBlockIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def __contains__(self, rec_id: str) -> bool:
+        if rec_id in self._records:
+            return True
+        return self._connection.execute('SELECT 1 FROM records WHERE rec_id = ?', (rec_id,)).fetchone() is not None
+
+    def _cache_record(self, rec: BriefRec) -> None:
+        """Keep a record in memory, remove the least recently used records
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+        """
+        rec_id = rec.data['rec_id']
+        self._records[rec_id] = rec
+        self._records.move_to_end(rec_id)
+        if len(self._records) > self.cache_size:
+            self._records.popitem(last=False)
+
+    def _on_write(self, nb: int = 1) -> None:
+        """Commit the transaction after `commit_every` operations
+
+        :param nb: number of operations
+        """
+        self._nb_uncommitted += nb
+        if self._nb_uncommitted >= self.commit_every:
+            self.commit()
+
+    def get(self, rec_id: str) -> Optional[BriefRec]:
+        """Return a record of the index
+
+        :param rec_id: record id
+
+        :return: :class:`dedupmarcxml.briefrecord.BriefRec` object or None if not indexed
+        """
+        rec = self._records.get(rec_id)
+        if rec is not None:
+            self._records.move_to_end(rec_id)
+            return rec
+
+        row = self._connection.execute('SELECT data FROM records WHERE rec_id = ?', (rec_id,)).fetchone()
+        if row is None:
+            return None
+
+        rec = deserialize_record(row[0])
+        self._cache_record(rec)
+        return rec
+
+    def get_fingerprint(self, rec_id: str) -> Optional[str]:
+        """Return the fingerprint of a stored record
+
+        Compare it with :meth:`dedupmarcxml.briefrecord.BriefRec.get_fingerprint` of a
+        new version of the record to check if the record has changed.
+
+        :param rec_id: record id
+
+        :return: fingerprint or None if the record is not indexed
+        """
+        row = self._connection.execute('SELECT fingerprint FROM records WHERE rec_id = ?', (rec_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_block(self, key: str) -> Set[str]:
+        """Return the ids of the records of a block, whatever its size
+
+        :param key: block key
+
+        :return: set of record ids
+        """
+        return {row[0] for row in self._connection.execute('SELECT rec_id FROM keys WHERE key = ?', (key,))}
+
+    def add(self, rec: BriefRec) -> bool:
+        """Add a record to the index
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: boolean indicating whether the record has been indexed
+        """
+        return self.add_records([rec]) == 1
+
+    def add_records(self, records: Iterable[BriefRec], batch_size: int = 10000) -> int:
+        """Add records to the index
+
+        Records of a batch are inserted with a single statement per table, the
+        transaction is committed every `commit_every` records.
+
+        :param records: iterable of :class:`dedupmarcxml.briefrecord.BriefRec` objects
+        :param batch_size: number of records of a batch
+
+        :return: number of indexed records, records without block keys are not indexed
+        """
+        nb = 0
+        batch = []
+        for rec in records:
+            keys = self.key_func(rec)
+            if len(keys) == 0:
+                continue
+            batch.append((rec, keys))
+            if len(batch) >= batch_size:
+                nb += self._insert_batch(batch)
+                batch = []
+        if len(batch) > 0:
+            nb += self._insert_batch(batch)
+
+        return nb
+
+    def _insert_batch(self, batch: List[Tuple[BriefRec, List[str]]]) -> int:
+        """Insert a batch of records with their keys
+
+        :param batch: list of tuples with records and their block keys
+
+        :return: number of inserted records
+        """
+        rec_ids = list({rec.data['rec_id'] for rec, _ in batch})
+        for i in range(0, len(rec_ids), 500):
+            self._delete(rec_ids[i:i + 500])
+
+        # Last version of each record of the batch is kept
+        last_versions = {rec.data['rec_id']: (rec, keys) for rec, keys in batch}
+        seq = self._connection.execute('SELECT COALESCE(MAX(seq), 0) FROM records').fetchone()[0]
+        record_rows = []
+        key_rows = []
+        for rec_id, (rec, keys) in last_versions.items():
+            seq += 1
+            record_rows.append((seq, rec_id, rec.get_fingerprint(), json.dumps(keys), serialize_record(rec)))
+            key_rows += [(key, rec_id, seq) for key in dict.fromkeys(keys)]
+            self._cache_record(rec)
+
+        self._connection.executemany('INSERT INTO records VALUES (?, ?, ?, ?, ?)', record_rows)
+        self._connection.executemany('INSERT INTO keys VALUES (?, ?, ?)', key_rows)
+        self._on_write(len(record_rows))
+
+        return len(record_rows)
+
+    def _delete(self, rec_ids: List[str]) -> None:
+        """Delete records and their keys
+
+        :param rec_ids: list of record ids
+        """
+        placeholders = ', '.join('?' * len(rec_ids))
+        rows = self._connection.execute(f'SELECT rec_id, keys FROM records WHERE rec_id IN ({placeholders})',
+                                        rec_ids).fetchall()
+        if len(rows) == 0:
+            return
+
+        self._connection.executemany('DELETE FROM keys WHERE key = ? AND rec_id = ?',
+                                     [(key, rec_id) for rec_id, keys in rows for key in json.loads(keys)])
+        self._connection.executemany('DELETE FROM records WHERE rec_id = ?', [(rec_id,) for rec_id, _ in rows])
+        for rec_id, _ in rows:
+            self._records.pop(rec_id, None)
+
+    def remove(self, rec_id: str) -> None:
+        """Remove a record from the index
+
+        :param rec_id: record id of the record to remove
+        """
+        self._delete([rec_id])
+        self._on_write()
+
+    def _get_keys(self, rec: BriefRec) -> List[str]:
+        """Return the stored keys of a record or compute them if the record is not indexed
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: list of block keys
+        """
+        row = self._connection.execute('SELECT keys FROM records WHERE rec_id = ?', (rec.data['rec_id'],)).fetchone()
+        return json.loads(row[0]) if row is not None else self.key_func(rec)
+
+    def _get_blocks(self, keys: List[str]) -> Dict[str, int]:
+        """Return the record ids of the blocks with their order of insertion
+
+        Blocks larger than `max_block_size` are skipped.
+
+        :param keys: list of block keys
+
+        :return: dictionary with record ids and their order of insertion
+        """
+        limit = -1 if self.max_block_size is None else self.max_block_size + 1
+        rec_ids = dict()
+        for key in dict.fromkeys(keys):
+            rows = self._connection.execute('SELECT rec_id, seq FROM keys WHERE key = ? LIMIT ?', (key, limit)).fetchall()
+            if self.max_block_size is not None and len(rows) > self.max_block_size:
+                continue
+            rec_ids.update(rows)
+
+        return rec_ids
+
+    def get_candidate_ids(self, rec: BriefRec) -> Set[str]:
+        """Return the ids of the records of the same blocks
+
+        The record does not need to be in the index.
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: set of record ids, the record itself is excluded
+        """
+        return set(self._get_blocks(self._get_keys(rec))) - {rec.data['rec_id']}
+
+    def get_candidates(self, rec: BriefRec) -> List[BriefRec]:
+        """Return the records of the same blocks
+
+        :param rec: :class:`dedupmarcxml.briefrecord.BriefRec` object
+
+        :return: list of :class:`dedupmarcxml.briefrecord.BriefRec` objects
+        """
+        return [self.get(rec_id) for rec_id in self.get_candidate_ids(rec)]
+
+    def get_candidate_pairs(self) -> Iterator[Tuple[BriefRec, BriefRec]]:
+        """Iterate over the pairs of records to compare
+
+        Each pair is yielded only once, even if the records share several blocks.
+
+        :return: iterator of tuples with two :class:`dedupmarcxml.briefrecord.BriefRec` objects
+        """
+        for seq, rec_id, keys in self._connection.execute('SELECT seq, rec_id, keys FROM records ORDER BY seq'):
+            rec = None
+            for candidate_id, candidate_seq in self._get_blocks(json.loads(keys)).items():
+                if candidate_seq > seq:
+                    rec = rec if rec is not None else self.get(rec_id)
+                    yield rec, self.get(candidate_id)
+
+    def get_block_sizes(self) -> Dict[str, int]:
+        """Return the number of records in each block
+
+        :return: dictionary with block keys and number of records
+        """
+        return dict(self._connection.execute('SELECT key, COUNT(*) FROM keys GROUP BY key'))
+
+    def get_oversized_blocks(self) -> Dict[str, int]:
+        """Return the blocks ignored because of their size
+
+        :return: dictionary with block keys and number of records
+        """
+        if self.max_block_size is None:
+            return dict()
+
+        return dict(self._connection.execute('SELECT key, COUNT(*) FROM keys GROUP BY key HAVING COUNT(*) > ?',
+                                             (self.max_block_size,)))
+
+    def commit(self) -> None:
+        """Commit the current transaction"""
+        self._connection.commit()
+        self._nb_uncommitted = 0
+
+    def close(self) -> None:
+        """Commit the current transaction and close the database"""
+        self.commit()
+        self._connection.close()
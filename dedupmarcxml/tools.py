@@ -4,31 +4,56 @@ General tools to clean and normalize text
 
 import unicodedata
 import re
-from typing import Tuple, Optional, Callable, List, Dict, Union
+from typing import Tuple, Optional, Callable, List, Dict, Union, Iterator
 import Levenshtein
 import numpy as np
 from lxml import etree
 import pickle
 import os
-from functools import wraps
+from functools import wraps, lru_cache
+from collections import Counter
 import itertools
+from dedupmarcxml import models
 
 editions_data = pickle.load(open(os.path.join(os.path.dirname(__file__), 'data/editions_data.pickle'), 'rb'))
 publishers_data = pickle.load(open(os.path.join(os.path.dirname(__file__), 'data/publishers_data.pickle'), 'rb'))
-rf_music_model = pickle.load(open(os.path.join(os.path.dirname(__file__),
-                                               'data/randomforest_music_model.pickle'), 'rb'))
-rf_book_model = pickle.load(open(os.path.join(os.path.dirname(__file__),
-                                              'data/randomforest_book_model.pickle'), 'rb'))
-rf_general_model = pickle.load(open(os.path.join(os.path.dirname(__file__),
-                                                 'data/randomforest_general_model.pickle'), 'rb'))
-mlp_book_model = pickle.load(open(os.path.join(os.path.dirname(__file__),
-                                               'data/mlp_classifier_book_model.pickle'), 'rb'))
+
+
+def load_model(name: str) -> object:
+    """Load a classifier of the data folder
+
+    The memory-mapped version of the model, see :mod:`dedupmarcxml.models`, is used
+    when the folder `data/<name>` exists. Its arrays are shared by all the processes
+    using the model. Otherwise, the pickled scikit-learn model is loaded.
+
+    :param name: name of the model, without extension
+
+    :return: classifier with a `predict_proba` method
+    """
+    path = os.path.join(os.path.dirname(__file__), 'data', name)
+    if models.is_model_folder(path):
+        return models.load_model(path)
+
+    with open(f'{path}.pickle', 'rb') as f:
+        return pickle.load(f)
+
+
+rf_music_model = load_model('randomforest_music_model')
+rf_book_model = load_model('randomforest_book_model')
+rf_general_model = load_model('randomforest_general_model')
+mlp_book_model = load_model('mlp_classifier_book_model')
+
+# Counters of the pre-filters applied before the Levenshtein calls, see :func:`get_prefilter_stats`
+prefilter_stats = {'computed': 0, 'skipped_by_length': 0, 'skipped_by_qgrams': 0}
 
 def handle_values_lists(func: Callable) -> Callable:
     """
     Decorator to handle lists of values instead of single strings.
     It compares each value from the first list with each value from the second list
     and returns the maximum score found, with small penalty for each value not matched.
+
+    Pairs are compared with :func:`get_best_pair_score`: likely matches first and
+    the comparison stops as soon as the best possible score is reached.
     """
     @wraps(func)
     def wrapper(values1: Union[List[str], str], values2: Union[List[str],str]) -> float:
@@ -37,20 +62,118 @@ def handle_values_lists(func: Callable) -> Callable:
         if not isinstance(values2, list):
             values2 = [values2]
 
-        max_score = 0.0
-
-        # Compare each value from the first list with each value from the second list
-        for p1 in values1:
-            for p2 in values2:
-                current_score = func(p1, p2)
-                if current_score > max_score:
-                    max_score = current_score
+        return get_best_pair_score(values1, values2, func)
 
-        return max_score
+    # Used by :class:`dedupmarcxml.evaluate.EvaluationPlan` to bypass the decorators
+    wrapper.values_lists = True
 
     return wrapper
 
 
+def _get_order_info(value) -> Optional[Tuple[str, Union[int, float]]]:
+    """Return first token and length of a value, used to order the pairs to compare
+
+    Titles and editions dictionaries are represented by their main text. For numbers
+    like years, the value itself is used instead of the length.
+    """
+    if isinstance(value, dict):
+        value = value.get('m', value.get('txt'))
+
+    if isinstance(value, str):
+        tokens = value.upper().split()
+        return tokens[0] if len(tokens) > 0 else '', len(value)
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return '', value
+
+    return None
+
+
+def get_order_infos(values: List) -> List[Optional[Tuple[str, Union[int, float]]]]:
+    """Return the information used to sort the pairs of values to compare
+
+    :param values: list of values
+
+    :return: list with first token and length of each value
+    """
+    return [_get_order_info(value) for value in values]
+
+
+def _iter_likely_pairs(infos1: List[Optional[Tuple]], infos2: List[Optional[Tuple]]) -> Iterator[Tuple[int, int]]:
+    """Iterate over the pairs of indexes, likely matches first
+
+    Values of the second list are grouped by first token. Pairs sharing the first
+    token are yielded first, then the other pairs. Pairs are generated lazily: when
+    the comparison stops early, the other pairs are never built.
+    """
+    buckets: Dict[str, List[int]] = dict()
+    for i2, info2 in enumerate(infos2):
+        if info2 is not None:
+            buckets.setdefault(info2[0], []).append(i2)
+
+    for i1, info1 in enumerate(infos1):
+        if info1 is not None:
+            for i2 in buckets.get(info1[0], []):
+                yield i1, i2
+
+    for i1, info1 in enumerate(infos1):
+        for i2, info2 in enumerate(infos2):
+            if info1 is None or info2 is None or info1[0] != info2[0]:
+                yield i1, i2
+
+
+def get_best_pair_score(values1: List,
+                        values2: List,
+                        func: Callable,
+                        best_possible_score: float = 1.0,
+                        infos1: Optional[List[Optional[Tuple]]] = None,
+                        infos2: Optional[List[Optional[Tuple]]] = None,
+                        bound: Optional[Callable] = None) -> float:
+    """Return the best score of the comparison of all the pairs of values
+
+    To avoid to compute the complete cross product, likely matches are tested first
+    (same first token) and the loop stops once the best possible score is reached.
+    With `bound`, pairs whose upper bound cannot beat the best score found are skipped.
+
+    :param values1: list of values of the first record
+    :param values2: list of values of the second record
+    :param func: function comparing two values and returning a score
+    :param best_possible_score: score that cannot be beaten, default is 1.0
+    :param infos1: precomputed sort information of the first values, see :func:`get_order_infos`
+    :param infos2: precomputed sort information of the second values, see :func:`get_order_infos`
+    :param bound: optional function returning an upper bound of `func` for two values,
+        for example :func:`ratio_length_bound` when `func` is a Levenshtein ratio
+
+    :return: float with the best score found
+    """
+    if len(values1) * len(values2) > 1:
+        if infos1 is None:
+            infos1 = get_order_infos(values1)
+        if infos2 is None:
+            infos2 = get_order_infos(values2)
+        pairs = _iter_likely_pairs(infos1, infos2)
+    else:
+        pairs = itertools.product(range(len(values1)), range(len(values2)))
+
+    max_score = 0.0
+
+    # Compare each value from the first list with each value from the second list
+    for i1, i2 in pairs:
+        if bound is not None and max_score > 0 and bound(values1[i1], values2[i2]) <= max_score:
+            prefilter_stats['skipped_by_length'] += 1
+            continue
+
+        current_score = func(values1[i1], values2[i2])
+        if current_score > max_score:
+            max_score = current_score
+
+            # No other pair can be better
+            if max_score >= best_possible_score:
+                break
+
+    return max_score
+
+
 def handle_missing_values(default_score: float = 0.2, key=None) -> Callable:
     """
     Decorator to handle missing or invalid input values.
@@ -84,6 +207,10 @@ def handle_missing_values(default_score: float = 0.2, key=None) -> Callable:
                 return abs(result)
             return result * (1 - default_score) + default_score
 
+        # Used by :class:`dedupmarcxml.evaluate.EvaluationPlan` to bypass the decorators
+        wrapper.default_score = default_score
+        wrapper.missing_key = key
+
         return wrapper
 
     return decorator
@@ -183,6 +310,98 @@ def solve_abbreviations(txt1: str, txt2: str) -> Tuple[str, str]:
     return txt1, txt2
 
 
+def get_prefilter_stats() -> Dict[str, int]:
+    """Return the counters of the Levenshtein pre-filters
+
+    Keys of the returned dictionary:
+    - computed: number of Levenshtein calls really done
+    - skipped_by_length: number of calls avoided thanks to the length bound
+    - skipped_by_qgrams: number of calls avoided thanks to the q-gram bound
+
+    :return: dictionary with the counters
+    """
+    return dict(prefilter_stats)
+
+
+def reset_prefilter_stats() -> None:
+    """Reset the counters of the Levenshtein pre-filters"""
+    for k in prefilter_stats:
+        prefilter_stats[k] = 0
+
+
+@lru_cache(maxsize=65536)
+def _get_qgrams(txt: str) -> Counter:
+    """Return the bag of q-grams (single characters) of a word"""
+    return Counter(txt)
+
+
+def ratio_length_bound(txt1: str, txt2: str) -> float:
+    """Return an upper bound of :func:`Levenshtein.ratio` using only the lengths
+
+    At least the difference of the lengths must be inserted or deleted, so the
+    ratio cannot be better than 2 * min(len) / (len1 + len2).
+
+    :param txt1: first string to compare
+    :param txt2: second string to compare
+
+    :return: float with the maximum reachable ratio
+    """
+    total = len(txt1) + len(txt2)
+    if total == 0:
+        return 1.0
+
+    return 2 * min(len(txt1), len(txt2)) / total
+
+
+def ratio_qgram_bound(txt1: str, txt2: str) -> float:
+    """Return an upper bound of :func:`Levenshtein.ratio` using the q-gram counts
+
+    The longest common subsequence cannot contain more characters than the
+    characters the two strings have in common. The bound is tighter than
+    :func:`ratio_length_bound` but more expensive to calculate.
+
+    :param txt1: first string to compare
+    :param txt2: second string to compare
+
+    :return: float with the maximum reachable ratio
+    """
+    total = len(txt1) + len(txt2)
+    if total == 0:
+        return 1.0
+
+    common = sum((_get_qgrams(txt1) & _get_qgrams(txt2)).values())
+
+    return 2 * common / total
+
+
+def levenshtein_ratio(txt1: str, txt2: str, score_cutoff: Optional[float] = None, use_qgrams: bool = False) -> float:
+    """Return the Levenshtein ratio of two strings, skipping hopeless comparisons
+
+    When a cutoff is provided, the length bound and optionally the q-gram bound
+    are checked first. If they prove that the ratio cannot be above the
+    cutoff, 0.0 is returned without calling Levenshtein.
+
+    :param txt1: first string to compare
+    :param txt2: second string to compare
+    :param score_cutoff: ratio to beat, 0.0 is returned if it cannot be beaten
+    :param use_qgrams: boolean to use the q-gram bound after the length bound
+
+    :return: float with the ratio or 0.0 if the cutoff cannot be beaten
+    """
+    if score_cutoff is not None:
+        if ratio_length_bound(txt1, txt2) <= score_cutoff:
+            prefilter_stats['skipped_by_length'] += 1
+            return 0.0
+
+        if use_qgrams is True and ratio_qgram_bound(txt1, txt2) <= score_cutoff:
+            prefilter_stats['skipped_by_qgrams'] += 1
+            return 0.0
+
+    prefilter_stats['computed'] += 1
+
+    return Levenshtein.ratio(txt1, txt2)
+
+
 def evaluate_text_similarity(txt1: str, txt2: str, strict: Optional[bool] = False) -> float:
     """Evaluate similarity between two texts
 
@@ -210,15 +429,34 @@ def evaluate_text_similarity(txt1: str, txt2: str, strict: Optional[bool] = Fals
             coef = np.log(len(t_list2)*1.2) / np.log(len(t_list1)*1.2)
 
     score = 0
+    nb_words = len(t_list2)
+
+    # No word to compare or null coefficient, the result is 0 whatever the ratios
+    if nb_words == 0 or coef == 0:
+        return coef * score
+
     # Idea is to compare the two texts word by word and take the best score.
     # If text 1 has 3 words and text 2 has 2 words: t1_w1 <=> t2_w1 / t1_w2 <=> t2_w2
     # Second test: t1_w2 <=> t2_w1 / t1_w3 <=> t2_w2
     # We use the max result between test 1 and 2
-    for pos in range(len(t_list1) - len(t_list2) + 1):
-        temp_score = np.mean([Levenshtein.ratio(t_list1[i + pos], t_list2[i]) for i in range(len(t_list2))])
+    for pos in range(len(t_list1) - nb_words + 1):
+        words = list(zip(t_list1[pos:pos + nb_words], t_list2))
+
+        # The mean of the length bounds is a bound of the mean of the ratios. If it
+        # cannot beat the best position, Levenshtein ratios are not required.
+        if sum(ratio_length_bound(w1, w2) for w1, w2 in words) / nb_words < score - 1e-9:
+            prefilter_stats['skipped_by_length'] += nb_words
+            continue
+
+        prefilter_stats['computed'] += nb_words
+        temp_score = np.mean([Levenshtein.ratio(w1, w2) for w1, w2 in words])
         if temp_score > score:
             score = temp_score
 
+            # Perfect match, no other position can be better
+            if score >= 1:
+                break
+
     return coef * score
 
 
@@ -0,0 +1,86 @@
+import unittest
+
+from dedupmarcxml.blocking import *
+from dedupmarcxml.briefrecord import RawBriefRec
+
+
+def get_rec(rec_id, parent, analytical=True):
+    return RawBriefRec({'rec_id': rec_id,
+                        'format': {'type': 'Book', 'access': 'Physical', 'analytical': analytical, 'f33x': None},
+                        'titles': [{'m': 'Title', 's': ''}],
+                        'short_titles': ['Title'],
+                        'creators': None,
+                        'corp_creators': None,
+                        'languages': None,
+                        'extent': None,
+                        'editions': None,
+                        'years': None,
+                        'publishers': None,
+                        'series': None,
+                        'parent': parent,
+                        'std_nums': None,
+                        'sys_nums': None})
+
+
+class TestBlocking(unittest.TestCase):
+
+    def test_normalize_parent_title(self):
+        self.assertEqual(normalize_parent_title('ZAK : Zeitschrift für die Ausgleichskassen'), 'ZAK')
+        self.assertEqual(normalize_parent_title('Brugger Neujahrsblätter'), 'BRUGGER NEUJAHRSBLAETTER')
+        self.assertIsNone(normalize_parent_title(' : '))
+
+    def test_get_parent_keys(self):
+        self.assertEqual(get_parent_keys(get_rec('1', {'title': 'ZAK', 'std_num': '00445231'})),
+                         ['parent_title:ZAK', 'parent_std_num:00445231'])
+        self.assertEqual(get_parent_keys(get_rec('2', {'title': 'ZAK'}, analytical=False)), [])
+        self.assertEqual(get_parent_keys(get_rec('3', None)), [])
+
+    def test_parent_index(self):
+        index = ParentIndex()
+        self.assertTrue(index.add(get_rec('1', {'title': 'ZAK : Zeitschrift', 'year': 1987})))
+        self.assertTrue(index.add(get_rec('2', {'title': 'ZAK', 'std_num': '00445231'})))
+        self.assertTrue(index.add(get_rec('3', {'title': 'Other title', 'std_num': '00445231'})))
+        self.assertTrue(index.add(get_rec('4', {'title': 'Other journal'})))
+        self.assertFalse(index.add(get_rec('5', {'title': 'ZAK'}, analytical=False)))
+
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.get_candidate_ids(index.records['2']), {'1', '3'})
+        self.assertEqual(index.get_candidate_ids(index.records['4']), set())
+
+        pairs = [(rec1.data['rec_id'], rec2.data['rec_id']) for rec1, rec2 in index.get_candidate_pairs()]
+        self.assertEqual(sorted(pairs), [('1', '2'), ('2', '3')])
+
+        index.remove('2')
+        self.assertNotIn('2', index)
+        self.assertEqual(index.get_candidate_ids(index.records['1']), set())
+        self.assertEqual(index.get_block_sizes()['parent_std_num:00445231'], 1)
+
+    def test_get_record_keys(self):
+        rec = get_rec('1', None, analytical=False)
+        rec.data['std_nums'] = ['9782843853395']
+        rec.data['short_titles'] = ['Histoire de la musique', 'Histoire de la musique']
+        self.assertEqual(get_record_keys(rec), ['std_num:9782843853395', 'title:HISTOIRE DE LA'])
+        self.assertEqual(get_record_keys(get_rec('2', {'title': 'ZAK'})), ['parent_title:ZAK'])
+        self.assertEqual(get_record_keys(get_rec('3', {'title': 'ZAK', 'year': 1987})), ['parent_title:ZAK'])
+
+    def test_block_index_parent_year(self):
+        # A copy without the year of the parent is in the same block
+        index = BlockIndex()
+        index.add(get_rec('1', {'title': 'ZAK', 'year': 1987, 'number': '4'}))
+        index.add(get_rec('2', {'title': 'ZAK', 'number': '4'}))
+        pairs = [(rec1.data['rec_id'], rec2.data['rec_id']) for rec1, rec2 in index.get_candidate_pairs()]
+        self.assertEqual(pairs, [('1', '2')])
+
+    def test_block_index_max_block_size(self):
+        index = BlockIndex(max_block_size=2)
+        for i in range(3):
+            index.add(get_rec(str(i), None, analytical=False))
+        index.add(get_rec('3', {'title': 'ZAK'}))
+        index.add(get_rec('4', {'title': 'ZAK'}))
+        self.assertEqual(index.get_oversized_blocks(), {'title:TITLE': 3})
+        pairs = [(rec1.data['rec_id'], rec2.data['rec_id']) for rec1, rec2 in index.get_candidate_pairs()]
+        self.assertEqual(pairs, [('3', '4')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,10 @@ from almasru import config_log
 import unittest
 from dedupmarcxml import XmlBriefRec, JsonBriefRec, XmlBriefRecFactory, JsonBriefRecFactory, RawBriefRec
 import pickle
+import json
+import copy
+from dedupmarcxml import readers
+from dedupmarcxml.briefrecord import LazyBriefData, IndexedJsonRecord, parse_json_path
 
 config_log()
 SruClient.set_base_url('https://swisscovery.slsp.ch/view/sru/41SLSP_NETWORK')
@@ -103,6 +107,7 @@ class TestSruClient(unittest.TestCase):
         self.assertEqual(rec.data['years']['y1'][0], 1981)
         self.assertEqual(rec.data['parent']['title'], 'Brugger Neujahrsbl\u00e4tter')
         self.assertEqual(rec.data['parent']['parts']['nb'][1], 91)
+        self.assertNotIn('parts_nb', rec.data['parent'])
         self.assertEqual(rec.data['languages'][0], 'ger')
         self.assertEqual(rec.data['creators'][1], 'Sommer, Werner')
 
@@ -113,3 +118,66 @@ class TestSruClient(unittest.TestCase):
         rec1 = JsonBriefRec(data)
         rec2 = RawBriefRec(rec1.data)
         self.assertTrue(rec1.data['creators'][1] == rec2.data['creators'][1] == 'Sommer, Werner', f'{rec1.data["creators"][1]} != {rec2.data["creators"][1]}')
+
+    def test_lazy_brief_record(self):
+        folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+        for raw_rec in readers.iter_raw_records([folder]):
+            rec = readers.parse_raw_record(*raw_rec)
+            lazy_rec = readers.parse_raw_record(*raw_rec, lazy=True, fields=['rec_id'])
+            self.assertIsInstance(lazy_rec.data, LazyBriefData)
+            self.assertEqual(lazy_rec.data.get_extracted_fields(), ['rec_id'])
+
+            # Fields are extracted on first access
+            self.assertEqual(lazy_rec.data['short_titles'], rec.data['short_titles'])
+            self.assertEqual(lazy_rec.data.get('std_nums'), rec.data['std_nums'])
+            self.assertIn('years', lazy_rec.data)
+            self.assertEqual(lazy_rec.data.get_extracted_fields(), ['rec_id', 'short_titles', 'std_nums'])
+            with self.assertRaises(KeyError):
+                lazy_rec.data['unknown']
+
+            # Reading all the fields gives the same data as the eager extraction
+            self.assertNotIsInstance(lazy_rec.data, dict)
+            self.assertEqual(json.dumps(dict(lazy_rec.data)), json.dumps(rec.data))
+            self.assertEqual(lazy_rec.data, rec.data)
+            self.assertEqual(lazy_rec.get_fingerprint(), rec.get_fingerprint())
+            self.assertIs(type(copy.deepcopy(lazy_rec.data)), dict)
+            self.assertEqual(RawBriefRec(lazy_rec.data).data, rec.data)
+
+    def test_lazy_json_brief_record(self):
+        with open('data_for_testing/record3.pkl' if os.getcwd().endswith('tests') else 'tests/data_for_testing/record3.pkl', 'rb') as f:
+            data = pickle.load(f)
+        rec = JsonBriefRec(data, lazy=True)
+        self.assertEqual(rec.data.get_extracted_fields(), [])
+        self.assertEqual(json.loads(str(rec)), JsonBriefRec(data).data)
+        rec = JsonBriefRec(data, lazy=True)
+        self.assertEqual(json.dumps(rec.data.copy()), json.dumps(JsonBriefRec(data).data))
+        with self.assertRaises(TypeError):
+            json.dumps(JsonBriefRec(data, lazy=True).data)
+        self.assertEqual(rec.data['creators'][1], 'Sommer, Werner')
+        self.assertEqual(pickle.loads(pickle.dumps(rec.data)), JsonBriefRec(data).data)
+
+    def test_json_indexed_record(self):
+        self.assertEqual(parse_json_path('245$$a'), ('245', 'a'))
+        self.assertEqual(parse_json_path('336$$2'), ('336', 'n2'))
+        self.assertEqual(parse_json_path('773'), ('773', None))
+
+        with open('data_for_testing/record3.pkl' if os.getcwd().endswith('tests') else 'tests/data_for_testing/record3.pkl', 'rb') as f:
+            data = pickle.load(f)
+        data = copy.deepcopy(data)
+        data['marc']['035'] += [{'ind1': ' ', 'ind2': ' ', 'sub': [{'a': f'(OCoLC){i}'}, {'9': 'ExL'}]} for i in range(10)]
+        rec = JsonBriefRec(data)
+        self.assertIsInstance(rec.src_data, IndexedJsonRecord)
+        self.assertEqual(rec.src_data['marc'], data['marc'])
+        self.assertEqual(rec.data, JsonBriefRecFactory.get_bib_info(data))
+
+        # Tags with many datafields are read in the index
+        nb_sys_nums = len([subfield for field in data['marc']['035'] for subfield in field['sub'] if 'a' in subfield])
+        sys_nums = JsonBriefRecFactory.findall(rec.src_data, '035$$a')
+        self.assertEqual(len(sys_nums), nb_sys_nums)
+        self.assertIn(('035', 'a'), rec.src_data.subfields)
+        self.assertEqual(JsonBriefRecFactory.find(rec.src_data, '035$$a'), '(ABN)000267102ABN01')
+        sys_nums.append('modified')
+        self.assertEqual(len(JsonBriefRecFactory.findall(rec.src_data, '035$$a')), nb_sys_nums)
+        self.assertEqual(JsonBriefRecFactory.findall(rec.src_data, '035$$b'), [])
+        self.assertIsNone(JsonBriefRecFactory.find(rec.src_data, '035$$b'))
+        self.assertEqual(JsonBriefRecFactory.findall(data, '035$$a'), sys_nums[:-1])
@@ -0,0 +1,90 @@
+import unittest
+import copy
+import os
+import tempfile
+
+from dedupmarcxml.cache import ScoreCache, get_cache_key
+from dedupmarcxml.briefrecord import RawBriefRec
+from dedupmarcxml.evaluate import EvaluationPlan
+from dedupmarcxml import readers
+
+
+class TestCache(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.recs = list(readers.iter_brief_records([cls.folder]))[:3]
+
+    def test_get_fingerprint(self):
+        rec = self.recs[0]
+        fingerprint = rec.get_fingerprint()
+        self.assertEqual(len(fingerprint), 32)
+
+        # Other id and other order of the identifiers: same content
+        data = copy.deepcopy(rec.data)
+        data['rec_id'] = 'other_id'
+        if data['std_nums'] is not None:
+            data['std_nums'] = list(reversed(data['std_nums']))
+        self.assertEqual(RawBriefRec(data).get_fingerprint(), fingerprint)
+        self.assertNotEqual(RawBriefRec(data).get_fingerprint(exclude=()), rec.get_fingerprint(exclude=()))
+
+        data['titles'] = [{'m': 'Other title', 's': ''}]
+        self.assertNotEqual(RawBriefRec(data).get_fingerprint(), fingerprint)
+
+    def test_get_cache_key(self):
+        self.assertEqual(get_cache_key('b', 'a', 'mean'), get_cache_key('a', 'b', 'mean'))
+
+    def test_memory_cache(self):
+        cache = ScoreCache(max_size=2)
+        rec1, rec2, rec3 = self.recs
+        score = cache.get_score(rec1, rec2)
+        self.assertEqual(cache.get_score(rec2, rec1), score)
+        self.assertIsNone(cache.get(rec1, rec2, 'vector_mean'))
+        cache.set(rec1, rec3, 'mean', 0.5)
+        cache.set(rec2, rec3, 'mean', 0.4)
+        self.assertIsNone(cache.get(rec1, rec2, 'mean'))
+        self.assertEqual(len(cache), 2)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['hit_rate'], 0.25)
+
+        # Modified record: previous entry is not used
+        rec = RawBriefRec(copy.deepcopy(rec1.data))
+        self.assertEqual(cache.get(rec, rec3, 'mean'), 0.5)
+        rec.data['years'] = None
+        self.assertIsNone(cache.get(rec, rec3, 'mean'))
+
+    def test_cache_with_plan(self):
+        cache = ScoreCache()
+        plan = EvaluationPlan()
+        rec1 = RawBriefRec(copy.deepcopy(self.recs[0].data))
+        rec2 = RawBriefRec(copy.deepcopy(self.recs[0].data))
+        rec2.data['rec_id'] = 'other_id'
+        self.assertEqual(cache.get_score(rec1, rec2, plan=plan), cache.get_score(self.recs[0], rec2))
+
+        # Record modified in place after its evaluation: prepared data is computed again
+        rec2.data['titles'] = [{'m': 'Other title', 's': ''}]
+        rec2.data['short_titles'] = ['Other title']
+        self.assertEqual(cache.get_score(rec1, rec2, plan=plan),
+                         ScoreCache().get_score(rec1, RawBriefRec(copy.deepcopy(rec2.data))))
+
+    def test_sqlite_cache(self):
+        rec1, rec2, _ = self.recs
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'scores.db')
+            with ScoreCache(path=path) as cache:
+                score = cache.get_score(rec1, rec2)
+
+            with ScoreCache(path=path) as cache:
+                self.assertEqual(cache.get(rec2, rec1, 'mean'), score)
+                self.assertEqual(cache.get(rec1, rec2, 'mean'), score)
+                self.assertEqual(cache.get_stats()['sqlite_hits'], 1)
+                self.assertEqual(cache.get_stats()['memory_hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
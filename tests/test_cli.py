@@ -0,0 +1,107 @@
+import unittest
+import csv
+import os
+import tempfile
+
+from lxml import etree
+
+from dedupmarcxml.cli import main, iter_chunks, map_chunks
+import multiprocessing.pool
+from dedupmarcxml.clustering import get_clusters
+from dedupmarcxml.blocking import group_exact_duplicates
+from dedupmarcxml.briefrecord import RawBriefRec
+from dedupmarcxml import readers
+from dedupmarcxml import instrumentation
+
+
+class TestCli(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_map_chunks(self):
+        read = []
+
+        def get_chunks():
+            for i in range(10):
+                read.append(i)
+                yield [i]
+
+        self.assertEqual(list(map_chunks(sum, get_chunks())), list(range(10)))
+        read.clear()
+        with multiprocessing.pool.ThreadPool(2) as pool:
+            results = map_chunks(sum, get_chunks(), pool, max_pending=3)
+            self.assertEqual(next(results), 0)
+            # Only the chunks in progress are read from the input
+            self.assertEqual(len(read), 3)
+            self.assertEqual(list(results), list(range(1, 10)))
+
+    def test_get_clusters(self):
+        pairs = [('1', '2', 0.9), ('3', '2', 0.9), ('4', '5', 0.9)]
+        self.assertEqual(get_clusters(pairs), [['1', '2', '3'], ['4', '5']])
+
+    def test_group_exact_duplicates(self):
+        recs = list(readers.iter_brief_records([self.folder]))
+        copy = RawBriefRec(dict(recs[0].data, rec_id='copy', sys_nums=['(OCoLC)1']))
+        self.assertEqual(group_exact_duplicates(recs + [copy]), [[recs[0].data['rec_id'], 'copy']])
+        self.assertEqual(group_exact_duplicates(recs + recs[:1]), [])
+
+    def test_main_same_input_twice(self):
+        with tempfile.TemporaryDirectory() as output:
+            xml = etree.parse(os.path.join(self.folder, sorted(os.listdir(self.folder))[0]))
+            for controlfield in xml.getroot().iter('{http://www.loc.gov/MARC21/slim}controlfield'):
+                if controlfield.get('tag') == '001':
+                    controlfield.text = f'{controlfield.text}_copy'
+            xml.write(os.path.join(output, 'copy.xml'))
+
+            # Records read twice are not their own duplicates and are still compared with the copy
+            self.assertEqual(main([self.folder, self.folder, os.path.join(output, 'copy.xml'),
+                                   '-o', output, '-w', '1', '-t', '0.9']), 0)
+            with open(os.path.join(output, 'pairs.csv')) as f:
+                pairs = list(csv.DictReader(f))
+            self.assertTrue(all(pair['rec_id1'] != pair['rec_id2'] for pair in pairs))
+            self.assertEqual(len(pairs), 1)
+            self.assertTrue(pairs[0]['rec_id2'].endswith('_copy'))
+
+    def test_readers(self):
+        recs = list(readers.iter_brief_records([self.folder]))
+        self.assertEqual(len(recs), 16)
+        raw_recs = list(readers.iter_raw_records([self.folder]))
+        self.assertEqual(readers.parse_raw_record(*raw_recs[0]).data, recs[0].data)
+
+    def test_main(self):
+        nb_evaluations = dict()
+        for workers, exact, preload in [(1, True, False), (2, True, True), (1, False, False)]:
+            with tempfile.TemporaryDirectory() as output:
+                # Copy of the first record with another id, it is its only duplicate
+                xml = etree.parse(os.path.join(self.folder, sorted(os.listdir(self.folder))[0]))
+                for controlfield in xml.getroot().iter('{http://www.loc.gov/MARC21/slim}controlfield'):
+                    if controlfield.get('tag') == '001':
+                        controlfield.text = f'{controlfield.text}_copy'
+                xml.write(os.path.join(output, 'copy.xml'))
+
+                args = [self.folder, os.path.join(output, 'copy.xml'),
+                        '-o', output, '-w', str(workers), '-t', '0.9', '--profile']
+                args += ['--preload'] if preload is True else []
+                self.assertEqual(main(args if exact is True else args + ['--no-exact']), 0)
+                self.assertFalse(instrumentation.enabled)
+                with open(os.path.join(output, 'pairs.csv')) as f:
+                    pairs = list(csv.DictReader(f))
+                with open(os.path.join(output, 'clusters.csv')) as f:
+                    clusters = list(csv.DictReader(f))
+                self.assertEqual(len(pairs), 1)
+                self.assertTrue(pairs[0]['rec_id2'].endswith('_copy'))
+                self.assertTrue(all(float(pair['score']) >= 0.9 for pair in pairs))
+                self.assertEqual(len(clusters), 2)
+                with open(os.path.join(output, 'profile.prom')) as f:
+                    lines = [line for line in f if line.startswith('dedupmarcxml_evaluation_calls_total')]
+                nb_evaluations[exact] = int(lines[0].split()[-1]) if len(lines) > 0 else 0
+
+        # The copy is an exact duplicate, it is not evaluated
+        self.assertLess(nb_evaluations[True], nb_evaluations[False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from dedupmarcxml.clustering import *
+
+
+class TestClustering(unittest.TestCase):
+
+    pairs = [('1', '2', 0.95), ('2', '3', 0.82), ('4', '5', 0.9), ('3', '6', 0.7), ('6', '7', 0.6)]
+
+    def test_union_find(self):
+        union_find = UnionFind(4)
+        self.assertTrue(union_find.union(0, 1))
+        self.assertTrue(union_find.union(1, 2))
+        self.assertFalse(union_find.union(2, 3, max_size=3))
+        self.assertEqual(union_find.add(), 4)
+        self.assertEqual(union_find.get_roots().tolist().count(union_find.find(0)), 3)
+
+    def test_get_clusters(self):
+        self.assertEqual(get_clusters(self.pairs, 0.8), [['1', '2', '3'], ['4', '5']])
+        self.assertEqual(get_clusters(self.pairs), [['1', '2', '3', '6', '7'], ['4', '5']])
+
+    def test_sweep(self):
+        edges = EdgeStore()
+        edges.add_pairs(self.pairs)
+        self.assertEqual(len(edges), 5)
+        results = edges.sweep([0.9, 0.5, 0.8])
+        self.assertEqual(list(results), [0.5, 0.8, 0.9])
+        self.assertEqual(results[0.9].clusters, [['1', '2'], ['4', '5']])
+        for threshold, result in results.items():
+            self.assertEqual(result, edges.get_clusters(threshold))
+
+    def test_guards(self):
+        edges = EdgeStore()
+        edges.add_pairs(self.pairs)
+
+        # Weakest pairs are rejected
+        result = edges.get_clusters(0.5, max_cluster_size=3)
+        self.assertEqual(result.clusters, [['1', '2', '3'], ['4', '5'], ['6', '7']])
+        self.assertEqual(result.nb_rejected_edges, 1)
+
+        result = edges.get_clusters(0.5, min_mean_score=0.8)
+        self.assertEqual(result.clusters, [['4', '5']])
+        self.assertEqual(result.flagged_clusters, [['1', '2', '3', '6', '7']])
+
+
+if __name__ == '__main__':
+    unittest.main()
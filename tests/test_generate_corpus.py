@@ -0,0 +1,51 @@
+import unittest
+import importlib.util
+import csv
+import io
+import os
+import tempfile
+
+from dedupmarcxml import readers
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+spec = importlib.util.spec_from_file_location('generate_corpus', os.path.join(ROOT_DIR, 'utils', 'generate_corpus.py'))
+generate_corpus = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(generate_corpus)
+
+
+class TestGenerateCorpus(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    def test_get_pairs_path(self):
+        self.assertEqual(generate_corpus.get_pairs_path('corpus.xml'), 'corpus.xml_pairs.csv')
+        self.assertNotEqual(generate_corpus.get_pairs_path('corpus.xml'),
+                            generate_corpus.get_pairs_path('corpus.ndjson'))
+
+    def test_write_corpus(self):
+        templates = generate_corpus.load_templates(self.folder)
+        for output_format, extension in [('xml', '.xml'), ('json', '.ndjson')]:
+            records = generate_corpus.generate_corpus(templates, 50, 0.3, seed=1)
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, f'corpus{extension}')
+                with open(path, 'w', encoding='utf-8') as f:
+                    pairs_output = io.StringIO()
+                    nb_records, nb_duplicates = generate_corpus.write_corpus(records, f, pairs_output,
+                                                                             output_format)
+                recs = list(readers.iter_brief_records([path]))
+
+            self.assertEqual(nb_records, 50)
+            self.assertEqual(len(recs), 50)
+            self.assertGreater(nb_duplicates, 0)
+
+            # Ground truth pairs refer to generated records
+            rec_ids = {rec.data['rec_id'] for rec in recs}
+            pairs = list(csv.DictReader(io.StringIO(pairs_output.getvalue())))
+            self.assertEqual(len(pairs), nb_duplicates)
+            for pair in pairs:
+                self.assertIn(pair['rec_id1'], rec_ids)
+                self.assertIn(pair['rec_id2'], rec_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
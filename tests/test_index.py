@@ -0,0 +1,66 @@
+import unittest
+import copy
+import os
+
+from dedupmarcxml.index import DedupIndex, get_dedup_keys
+from dedupmarcxml.briefrecord import RawBriefRec
+from dedupmarcxml import readers
+
+
+def get_copy(rec, rec_id, **changes):
+    data = copy.deepcopy(rec.data)
+    data['rec_id'] = rec_id
+    data.update(changes)
+    return RawBriefRec(data)
+
+
+class TestIndex(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.recs = list(readers.iter_brief_records([cls.folder]))
+
+    def test_get_dedup_keys(self):
+        keys = get_dedup_keys(self.recs[0])
+        self.assertTrue(keys[0].startswith('exact:'))
+        self.assertEqual(get_dedup_keys(get_copy(self.recs[0], 'copy', sys_nums=None))[0], keys[0])
+
+    def test_dedup_index(self):
+        index = DedupIndex(threshold=0.9)
+        for rec in self.recs:
+            index.add(rec)
+        self.assertEqual(len(index), len(self.recs))
+        self.assertEqual(index.get_clusters(), [])
+
+        rec = self.recs[0]
+        rec_id = rec.data['rec_id']
+        exact_copy = get_copy(rec, 'exact_copy', sys_nums=['(OCoLC)1'])
+        self.assertEqual(index.find_duplicates(exact_copy), [(rec_id, 1.0)])
+        self.assertNotIn('exact_copy', index)
+
+        self.assertEqual(index.add(exact_copy), [(rec_id, 1.0)])
+        fuzzy_copy = get_copy(exact_copy, 'fuzzy_copy', years=None)
+        duplicates = index.add(fuzzy_copy)
+        self.assertEqual({duplicate_id for duplicate_id, _ in duplicates}, {rec_id, 'exact_copy'})
+        self.assertEqual(index.get_cluster('fuzzy_copy'), sorted([rec_id, 'exact_copy', 'fuzzy_copy']))
+
+        # Cluster is split when the records connecting it are removed
+        index.remove(rec_id)
+        self.assertEqual(index.get_clusters(), [['exact_copy', 'fuzzy_copy']])
+        index.remove('exact_copy')
+        self.assertEqual(index.get_clusters(), [])
+        self.assertEqual(index.get_cluster('fuzzy_copy'), ['fuzzy_copy'])
+        self.assertEqual(index.get_cluster(rec_id), [])
+        self.assertEqual(index.matches, dict())
+
+        # Record replaced by a different version
+        index.add(rec)
+        self.assertEqual(index.get_cluster(rec_id), sorted([rec_id, 'fuzzy_copy']))
+        index.add(get_copy(rec, 'fuzzy_copy', titles=[{'m': 'Other title', 's': ''}], short_titles=['Other title']))
+        self.assertEqual(index.get_clusters(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
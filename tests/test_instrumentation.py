@@ -0,0 +1,96 @@
+import unittest
+import os
+import tempfile
+import time
+from unittest import mock
+
+from lxml import etree
+
+from dedupmarcxml import instrumentation
+from dedupmarcxml.briefrecord import XmlBriefRec
+from dedupmarcxml.evaluate import evaluate_records_similarity, get_similarity_score, EvaluationPlan, FIELD_EVALUATORS
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+        cls.records = []
+        for file_name in sorted(os.listdir(folder))[:4]:
+            xml = etree.parse(os.path.join(folder, file_name))
+            for rec in xml.getroot().iter('{http://www.loc.gov/MARC21/slim}record'):
+                cls.records.append(XmlBriefRec(rec))
+
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled(self):
+        evaluate_records_similarity(self.records[0], self.records[1])
+        self.assertEqual(instrumentation.get_stats(), {})
+
+    def test_same_results(self):
+        plan = EvaluationPlan()
+        expected = [evaluate_records_similarity(rec1, rec2) for rec1 in self.records for rec2 in self.records]
+
+        instrumentation.enable(sample=2)
+        self.assertEqual([evaluate_records_similarity(rec1, rec2) for rec1 in self.records for rec2 in self.records],
+                         expected)
+        self.assertEqual([evaluate_records_similarity(rec1, rec2, plan=plan)
+                          for rec1 in self.records for rec2 in self.records],
+                         expected)
+
+        stats = instrumentation.get_stats()
+        nb_pairs = len(self.records) ** 2 * 2
+        self.assertEqual(stats['evaluation']['records_similarity']['calls'], nb_pairs)
+        self.assertEqual(stats['evaluation']['records_similarity']['sampled'], nb_pairs // 2)
+        self.assertEqual(set(stats['evaluator']), {name for name, _, _ in FIELD_EVALUATORS})
+        self.assertEqual(stats['evaluator']['titles']['calls'], nb_pairs)
+        self.assertGreater(stats['evaluator']['titles']['estimated_time'], 0)
+
+    def test_unsampled_not_timed(self):
+        plan = EvaluationPlan()
+        instrumentation.enable(sample=1000)
+        with mock.patch('time.perf_counter', wraps=time.perf_counter) as perf_counter:
+            evaluate_records_similarity(self.records[0], self.records[1])
+            evaluate_records_similarity(self.records[0], self.records[1], plan=plan)
+        self.assertEqual(perf_counter.call_count, 0)
+        self.assertEqual(instrumentation.get_stats()['evaluator']['titles']['calls'], 2)
+
+    def test_method(self):
+        instrumentation.enable(sample=1)
+        get_similarity_score(evaluate_records_similarity(self.records[0], self.records[1]), method='mean')
+        stats = instrumentation.get_stats()
+        self.assertEqual(stats['method']['mean']['calls'], 1)
+        self.assertEqual(stats['method']['mean']['sampled'], 1)
+
+    def test_snapshot_merge(self):
+        instrumentation.enable(sample=1)
+        evaluate_records_similarity(self.records[0], self.records[1])
+        data = instrumentation.snapshot()
+        instrumentation.merge(data)
+        stats = instrumentation.get_stats()
+        self.assertEqual(stats['evaluator']['years']['calls'], 2)
+        self.assertEqual(stats['evaluator']['years']['sampled'], 2)
+
+    def test_prometheus(self):
+        instrumentation.enable(sample=1)
+        evaluate_records_similarity(self.records[0], self.records[1])
+        txt = instrumentation.to_prometheus()
+        self.assertIn('dedupmarcxml_evaluator_calls_total{name="titles"} 1', txt)
+        self.assertIn('dedupmarcxml_evaluator_seconds_bucket{name="titles",le="+Inf"} 1', txt)
+        self.assertIn('# TYPE dedupmarcxml_evaluator_seconds histogram', txt)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'metrics.prom')
+            instrumentation.dump_prometheus(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), txt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import itertools
+import tempfile
+import pickle
+import os
+import numpy as np
+import pandas as pd
+
+from dedupmarcxml.evaluate import evaluate_records_similarity
+from dedupmarcxml import models, readers, tools
+
+data_folder = os.path.join(os.path.dirname(tools.__file__), 'data')
+
+
+class TestModels(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    @classmethod
+    def setUpClass(cls):
+        recs = list(readers.iter_brief_records([cls.folder]))
+        sim_analyses = [evaluate_records_similarity(rec1, rec2) for rec1, rec2 in itertools.combinations(recs, 2)]
+        cls.X = pd.DataFrame(sim_analyses)
+
+    def test_export_model(self):
+        for name in ['randomforest_book_model', 'mlp_classifier_book_model']:
+            with open(os.path.join(data_folder, f'{name}.pickle'), 'rb') as f:
+                model = pickle.load(f)
+
+            with tempfile.TemporaryDirectory() as path:
+                self.assertFalse(models.is_model_folder(path))
+                models.export_model(model, path)
+                self.assertTrue(models.is_model_folder(path))
+
+                mapped_model = models.load_model(path)
+                self.assertIsInstance(mapped_model.coefs[0] if name.startswith('mlp') else mapped_model.value,
+                                      np.memmap)
+                self.assertEqual(list(mapped_model.classes_), list(model.classes_))
+
+                # Columns are reordered with the names of the features
+                X = self.X[self.X.columns[::-1]]
+                self.assertTrue(np.allclose(mapped_model.predict_proba(X), model.predict_proba(self.X)))
+                self.assertEqual(list(mapped_model.predict(X)), list(model.predict(self.X)))
+                self.assertTrue(np.allclose(models.load_model(path, mmap=False).predict_proba(self.X.iloc[:1]),
+                                            model.predict_proba(self.X.iloc[:1])))
+
+                with self.assertRaises(ValueError):
+                    mapped_model.predict_proba(self.X.drop(columns=['titles']))
+                del mapped_model
+
+    def test_load_model(self):
+        # Pickle is used when the memory-mapped folder is absent
+        for name in ['randomforest_music_model', 'mlp_classifier_book_model']:
+            model = tools.load_model(name)
+            mapped = models.is_model_folder(os.path.join(data_folder, name))
+            self.assertEqual(isinstance(model, models.MappedClassifier), mapped)
+            self.assertEqual(model.predict_proba(self.X).shape, (len(self.X), 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import os
+import threading
+
+from lxml import etree
+
+from dedupmarcxml.pipeline import *
+from dedupmarcxml import readers
+
+
+class SlowStage(Stage):
+    """Stage blocked until an event is set"""
+
+    def __init__(self, event, name=None):
+        super().__init__(name)
+        self.event = event
+
+    def process(self, item):
+        self.event.wait()
+        return [item]
+
+
+class FailingStage(Stage):
+
+    def process(self, item):
+        if item == 3:
+            raise ValueError('Error in stage')
+        return [item]
+
+
+class CountStage(Stage):
+    """Stage returning the number of items at the end of the feed"""
+    max_workers = 1
+
+    def __init__(self):
+        super().__init__()
+        self.nb = 0
+
+    def process(self, item):
+        self.nb += 1
+        return []
+
+    def flush(self):
+        return [self.nb]
+
+
+class TestPipeline(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    def test_pipeline_workers(self):
+        pipeline = Pipeline([CallbackStage(lambda item: None, name='a', workers=3),
+                             CallbackStage(lambda item: None, name='b', workers=2)],
+                            queue_size=2)
+        self.assertEqual(sorted(pipeline.run(range(100))), list(range(100)))
+        metrics = pipeline.get_metrics()
+        self.assertEqual(metrics['a']['items_in'], 100)
+        self.assertEqual(metrics['b']['items_out'], 100)
+        self.assertLessEqual(metrics['a']['max_queue_depth'], 2)
+
+    def test_pipeline_flush(self):
+        self.assertEqual(list(Pipeline([CountStage()]).run(range(10))), [10])
+        with self.assertRaises(ValueError):
+            Stage.__init__(CountStage(), workers=2)
+
+    def test_pipeline_backpressure(self):
+        event = threading.Event()
+        source_items = []
+
+        def source():
+            for i in range(100):
+                source_items.append(i)
+                yield i
+
+        pipeline = Pipeline([SlowStage(event)], queue_size=5)
+        results = []
+        thread = threading.Thread(target=lambda: results.extend(pipeline.run(source())))
+        thread.start()
+        thread.join(0.5)
+        # Reader is throttled: queue, item in process and item waiting to be put
+        self.assertLessEqual(len(source_items), 7)
+        event.set()
+        thread.join()
+        self.assertEqual(len(results), 100)
+
+    def test_pipeline_error(self):
+        pipeline = Pipeline([FailingStage(), CallbackStage(lambda item: None)], queue_size=1)
+        with self.assertRaises(ValueError):
+            list(pipeline.run(range(100)))
+
+    def test_pipeline_duplicates(self):
+        # Copy of the first record with another id, it is its only duplicate
+        raw_records = list(readers.iter_raw_records([self.folder]))
+        xml = etree.fromstring(raw_records[0][1])
+        for controlfield in xml.iter('{http://www.loc.gov/MARC21/slim}controlfield'):
+            if controlfield.get('tag') == '001':
+                rec_id = controlfield.text
+                controlfield.text = f'{controlfield.text}_copy'
+        raw_records.append(('xml', etree.tostring(xml)))
+
+        pipeline = Pipeline([ParseStage(workers=2),
+                             NormalizeStage(),
+                             BlockingStage(),
+                             ScoringStage(threshold=0.9)],
+                            queue_size=4)
+        self.assertEqual([pair[:2] for pair in pipeline.run(raw_records)], [(rec_id, f'{rec_id}_copy')])
+        metrics = pipeline.get_metrics()
+        self.assertEqual(metrics['ParseStage']['items_in'], len(raw_records))
+        self.assertEqual(metrics['ScoringStage']['items_in'], metrics['BlockingStage']['items_out'])
+
+    def test_blocking_stage_max_records(self):
+        recs = list(readers.iter_brief_records([self.folder]))
+        stage = BlockingStage(max_records=2)
+        for rec in recs:
+            stage.process(rec)
+        self.assertEqual(len(stage.index), 2)
+        self.assertEqual(list(stage.index.records), list(stage._rec_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
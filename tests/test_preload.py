@@ -0,0 +1,37 @@
+import unittest
+import gc
+
+from dedupmarcxml import preload
+
+
+class TestPreload(unittest.TestCase):
+
+    def test_get_sample_records(self):
+        rec1, rec2 = preload.get_sample_records()
+        self.assertFalse(rec1.error)
+        self.assertFalse(rec2.error)
+        self.assertNotEqual(rec1.data['rec_id'], rec2.data['rec_id'])
+        self.assertNotEqual(rec1.data['std_nums'], rec2.data['std_nums'])
+        self.assertEqual(rec1.data['languages'], rec2.data['languages'])
+
+    def test_preload_for_fork(self):
+        try:
+            self.assertEqual(preload.preload_for_fork(warm=False, freeze=False), gc.get_freeze_count())
+            nb_frozen = preload.preload_for_fork()
+            self.assertGreater(nb_frozen, 0)
+            self.assertEqual(gc.get_freeze_count(), nb_frozen)
+        finally:
+            preload.unfreeze()
+        self.assertEqual(gc.get_freeze_count(), 0)
+
+    def test_get_memory_usage(self):
+        usage = preload.get_memory_usage()
+        if usage is None:
+            self.skipTest('smaps_rollup not available')
+        self.assertEqual(set(usage), {'rss', 'pss', 'shared', 'private'})
+        self.assertGreaterEqual(usage['rss'], usage['private'])
+        self.assertIsNone(preload.get_memory_usage(-1))
+
+
+if __name__ == '__main__':
+    unittest.main()
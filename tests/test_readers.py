@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+import pickle
+import json
+import os
+
+from dedupmarcxml import readers
+from dedupmarcxml.briefrecord import JsonBriefRec
+
+
+class TestReaders(unittest.TestCase):
+
+    folder = 'data_for_testing' if os.getcwd().endswith('tests') else 'tests/data_for_testing'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.records = []
+        for file_name in sorted(os.listdir(cls.folder)):
+            with open(os.path.join(cls.folder, file_name), 'rb') as f:
+                cls.records.append(pickle.load(f))
+
+        # Copies of the records with other ids
+        cls.records = [dict(rec, marc=dict(rec['marc'], **{'001': f'{rec["marc"]["001"]}_{i}'}))
+                       for i in range(4) for rec in cls.records]
+        cls.expected = [JsonBriefRec(rec).data for rec in cls.records]
+
+    def test_iter_batches(self):
+        self.assertEqual(list(readers.iter_batches(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(readers.iter_batches([], 2)), [])
+
+    def test_ndjson_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'records.ndjson')
+            with open(path, 'w', encoding='utf-8') as f:
+                for rec in self.records:
+                    f.write(json.dumps(rec, default=str) + '\n\n')
+                f.write('{"invalid": \n')
+
+            for workers in [1, 2]:
+                batches = list(readers.iter_json_brief_record_batches(path, batch_size=5, workers=workers))
+                self.assertEqual([len(batch) for batch in batches], [5, 5, 2])
+                self.assertEqual([rec.data for batch in batches for rec in batch], self.expected)
+
+    def test_cursor(self):
+        # Stand-in for a database cursor: documents are only read when required
+        nb_read = [0]
+
+        def cursor():
+            for rec in self.records:
+                nb_read[0] += 1
+                yield rec
+
+        batches = readers.iter_json_brief_record_batches(cursor(), batch_size=2, lazy=True, fields=['rec_id'])
+        batch = next(batches)
+        self.assertEqual(nb_read[0], 2)
+        self.assertEqual(batch[0].data.get_extracted_fields(), ['rec_id'])
+        self.assertEqual([rec.data for rec in batch], self.expected[:2])
+        self.assertEqual(sum(len(batch) for batch in batches), len(self.records) - 2)
+
+        # With workers, at most max_pending batches are in progress
+        nb_read[0] = 0
+        batches = readers.iter_json_brief_record_batches(cursor(), batch_size=2, workers=2, max_pending=2)
+        self.assertEqual([rec.data for rec in next(batches)], self.expected[:2])
+        self.assertEqual(nb_read[0], 4)
+        self.assertEqual([rec.data for batch in batches for rec in batch], self.expected[2:])
+
+        with self.assertRaises(ValueError):
+            next(readers.iter_json_brief_record_batches(cursor(), workers=2, lazy=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
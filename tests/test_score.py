@@ -1,10 +1,11 @@
 import unittest
 
 from dedupmarcxml.evaluate import *
-from dedupmarcxml.briefrecord import XmlBriefRec, JsonBriefRec
+from dedupmarcxml.briefrecord import XmlBriefRec, JsonBriefRec, RawBriefRec
 from almasru.client import SruClient, SruRecord, SruRequest
 import pickle
 import os
+from lxml import etree
 
 
 SruClient.set_base_url('https://swisscovery.slsp.ch/view/sru/41SLSP_NETWORK')
@@ -258,6 +259,39 @@ class TestScore(unittest.TestCase):
 
         self.assertTrue(score1 > 0.85, f'{score1} > 0.85')
 
+    def test_evaluate_parent_5(self):
+        parent1 = {"year": 1987, "number": "4", "title": "ZAK"}
+        parent2 = {"year": 1987,
+                   "number": "4",
+                   "number_nb": [4],
+                   "parts": {"nb": [1987, 4, 4], "txt": "1987, H. 4, 4"},
+                   "title": "ZAK"}
+
+        score1 = evaluate_parent(parent1, parent2)
+
+        self.assertTrue(score1 > 0.85, f'{score1} > 0.85')
+        self.assertEqual(parent1, {"year": 1987, "number": "4", "title": "ZAK"})
+        self.assertEqual(parent2['parts']['nb'], [1987, 4, 4])
+
+    def test_evaluate_parent_precomputed_parts(self):
+        parent1 = {"year": 1987, "number": "4", "title": "ZAK"}
+        parent2 = {"year": 1987, "parts": {"nb": [4, 1987, 12], "txt": "H. 4, 1987, 12"}, "title": "ZAK"}
+        score = evaluate_parent(parent1, parent2)
+
+        parent1_nb = prepare_parent(parent1)
+        parent2_nb = prepare_parent(parent2)
+        self.assertEqual(parent1_nb, dict(parent1, number_nb=[4], parts_nb=[1987, 4]))
+        self.assertEqual(parent2_nb['parts_nb'], [1987, 12, 4])
+        self.assertNotIn('parts_nb', parent2)
+        self.assertEqual(evaluate_parent(parent1_nb, parent2_nb), score)
+        self.assertEqual(evaluate_parent(parent1, parent2_nb), score)
+
+    def test_count_common_parts(self):
+        from dedupmarcxml.evaluate import _count_common_parts
+        self.assertEqual(_count_common_parts([1987, 4, 4], [1987, 4]), 2)
+        self.assertEqual(_count_common_parts([12, 4, 4], [4, 4, 3]), 2)
+        self.assertEqual(_count_common_parts([5], []), 0)
+
     def test_evaluate_std_identifiers_1(self):
         self.assertTrue(evaluate_std_nums(['123'], ['123']) > 0.9,
                         f'{evaluate_std_nums(["123"], ["123"])} > 0.9')
@@ -270,6 +304,12 @@ class TestScore(unittest.TestCase):
         self.assertTrue(evaluate_std_nums(['123'], ['456']) < 0.5,
                         f'{evaluate_std_nums(["123"], ["456"])} < 0.5')
 
+    def test_prepare_identifiers(self):
+        ids = prepare_identifiers(['H1234', '978-2'])
+        self.assertEqual(ids.raw, {'H1234', '978-2'})
+        self.assertEqual(ids.extended, {'H1234', '978-2', '1234', '9782'})
+        self.assertEqual(evaluate_std_nums(ids, prepare_identifiers(['I1234'])), evaluate_std_nums(['H1234', '978-2'], ['I1234']))
+
     def test_evaluate_std_identifiers_2(self):
         self.assertTrue(evaluate_std_nums(['9782843853395'], ['9782843853395']) > 0.98,
                         f'{evaluate_std_nums(["9782843853395"], ["9782843853395"])} > 0.98')
@@ -382,5 +422,47 @@ class TestScore(unittest.TestCase):
         self.assertTrue(score < 0.4, f'{score} < 0.4')
 
 
+class TestEvaluationPlan(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+        cls.records = []
+        for file_name in sorted(os.listdir(folder)):
+            xml = etree.parse(os.path.join(folder, file_name))
+            for rec in xml.getroot().iter('{http://www.loc.gov/MARC21/slim}record'):
+                cls.records.append(XmlBriefRec(rec))
+
+    def test_plan_same_results(self):
+        plan = EvaluationPlan()
+        for rec1 in self.records:
+            for rec2 in self.records:
+                self.assertEqual(evaluate_records_similarity(rec1, rec2, plan=plan),
+                                 evaluate_records_similarity(rec1, rec2))
+
+    def test_plan_prevent_auto_match(self):
+        plan = EvaluationPlan()
+        sim_score = evaluate_records_similarity(self.records[0], self.records[0], prevent_auto_match=True, plan=plan)
+        self.assertEqual(set(sim_score.values()), {0})
+
+    def test_plan_prepare_once(self):
+        plan = EvaluationPlan()
+        prepared = plan.prepare(self.records[0])
+        self.assertIs(plan.prepare(self.records[0]), prepared)
+        self.assertEqual(len(prepared.values), len(FIELD_EVALUATORS))
+
+    def test_plan_pickle_record(self):
+        plan = EvaluationPlan()
+        rec1 = RawBriefRec(dict(self.records[0].data))
+        rec2 = RawBriefRec(dict(self.records[1].data))
+        plan.evaluate(rec1, rec2)
+
+        # Prepared data is not stored in the records
+        self.assertEqual(pickle.loads(pickle.dumps(rec1)).data, rec1.data)
+        self.assertEqual(len(plan._prepared), 2)
+        del rec1
+        self.assertEqual(len(plan._prepared), 1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from dedupmarcxml.score.batch import *
+from dedupmarcxml.evaluate import evaluate_years_start_and_end, evaluate_languages, evaluate_format, evaluate_extent, \
+    evaluate_std_nums, evaluate_identifiers
+
+
+class TestScoreBatch(unittest.TestCase):
+
+    def test_evaluate_years_start_and_end_batch(self):
+        years_list = [{'y1': [2000, 2005], 'y2': 2000}, {'y1': [2000]}, {'y1': [2001]}, None]
+        scores = evaluate_years_start_and_end_batch({'y1': [2000, 2001], 'y2': 2000}, encode_years(years_list))
+        for score, years in zip(scores, years_list):
+            self.assertAlmostEqual(score, evaluate_years_start_and_end({'y1': [2000, 2001], 'y2': 2000}, years))
+
+    def test_evaluate_languages_batch(self):
+        languages_list = [['eng'], ['fr', 'eng'], ['eng', 'fr'], ['ger'], ['zxx'], None]
+        scores = evaluate_languages_batch(['eng'], encode_languages(languages_list))
+        for score, languages in zip(scores, languages_list):
+            self.assertAlmostEqual(score, evaluate_languages(['eng'], languages))
+
+    def test_evaluate_format_batch(self):
+        res_format = {'type': 'Book', 'access': 'Physical', 'analytical': False, 'f33x': 'txt;n;nc'}
+        formats_list = [res_format,
+                        {'type': 'Book', 'access': 'Online', 'analytical': False, 'f33x': 'txt;c;cr'},
+                        {'type': 'Book', 'access': 'Physical', 'analytical': False, 'f33x': ' ; ; '},
+                        {'type': 'Book', 'access': 'Physical', 'analytical': True, 'f33x': 'txt;n;nc'},
+                        {'type': 'Notated Music', 'access': 'Physical', 'analytical': False, 'f33x': 'txt;n;nc'},
+                        None]
+        scores = evaluate_format_batch(res_format, encode_formats(formats_list))
+        for score, other_format in zip(scores, formats_list):
+            self.assertAlmostEqual(score, evaluate_format(res_format, other_format))
+
+    def test_evaluate_extent_batch(self):
+        extent = {'nb': [24, 1, 1], 'txt': '1 partition (24 pages), 1 matériel d\'orchestre'}
+        extents_list = [{'nb': [24, 1], 'txt': '1 partition (24 pages)'},
+                        {'nb': [1, 1], 'txt': '1 Partitur,  Aufführungsmaterial'},
+                        {'nb': [300], 'txt': '300 p.'},
+                        None]
+        for rec_type in [None, 'Notated Music']:
+            scores = evaluate_extent_batch(extent, encode_extents(extents_list), rec_type=rec_type)
+            for score, other_extent in zip(scores, extents_list):
+                self.assertAlmostEqual(score, evaluate_extent(extent, other_extent, rec_type=rec_type))
+
+    def test_evaluate_identifiers_batch(self):
+        ids_list = [['123'], ['I1234'], ['1234', 'H1234'], ['456'], None]
+        candidates = encode_identifiers(ids_list)
+        std_nums_scores = evaluate_std_nums_batch(['H1234'], candidates)
+        identifiers_scores = evaluate_identifiers_batch(['H1234'], candidates)
+        for std_nums_score, identifiers_score, ids in zip(std_nums_scores, identifiers_scores, ids_list):
+            self.assertAlmostEqual(std_nums_score, evaluate_std_nums(['H1234'], ids))
+            self.assertAlmostEqual(identifiers_score, evaluate_identifiers(['H1234'], ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
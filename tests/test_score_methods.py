@@ -0,0 +1,97 @@
+import unittest
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from dedupmarcxml.evaluate import *
+from dedupmarcxml.score import methods
+from dedupmarcxml import readers
+
+
+class TestScoreMethods(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    @classmethod
+    def setUpClass(cls):
+        recs = list(readers.iter_brief_records([cls.folder]))
+        cls.sim_analyses = [evaluate_records_similarity(rec1, rec2) for rec1, rec2 in itertools.combinations(recs, 2)]
+        cls.sim_analyses += [evaluate_records_similarity(rec, rec) for rec in recs]
+
+    def test_get_similarity_scores(self):
+        for method in ['mean', 'random_forest_general', 'mlp_book']:
+            scores = get_similarity_scores(self.sim_analyses, method)
+            self.assertEqual(len(scores), len(self.sim_analyses))
+            for score, sim_analysis in zip(scores, self.sim_analyses):
+                self.assertAlmostEqual(score, get_similarity_score(sim_analysis, method))
+        self.assertEqual(len(get_similarity_scores([], 'random_forest_book')), 0)
+
+    def test_two_stage_scores(self):
+        result = get_two_stage_scores(self.sim_analyses, 'random_forest_general', lower=0.5, upper=0.9)
+        report = result.get_report()
+        self.assertEqual(report['nb_pairs'], len(self.sim_analyses))
+        self.assertEqual(report['nb_rejected'] + report['nb_accepted'] + report['nb_classified'], report['nb_pairs'])
+        self.assertGreater(report['nb_rejected'], 0)
+        self.assertGreater(report['nb_accepted'], 0)
+
+        full_scores = methods.get_scores_batch(self.sim_analyses, 'random_forest_general')
+        for score, stage, mean_score, full_score in zip(result.scores, result.stages, result.mean_scores, full_scores):
+            if stage == 0:
+                self.assertLess(mean_score, 0.5)
+                self.assertEqual(score, 0.0)
+            elif stage == 1:
+                self.assertGreater(mean_score, 0.9)
+                self.assertEqual(score, 1.0)
+            else:
+                self.assertAlmostEqual(score, full_score)
+
+    def test_validate_two_stage(self):
+        # Without first stage decisions, the result is the classifier
+        report = validate_two_stage(self.sim_analyses, 'random_forest_general', lower=0.0, upper=1.0)
+        self.assertEqual(report['nb_classified'], len(self.sim_analyses))
+        self.assertEqual(report['agreement'], 1.0)
+
+        report = validate_two_stage(self.sim_analyses, 'random_forest_general', lower=0.7, upper=0.7)
+        self.assertLess(report['nb_classified'], report['nb_pairs'])
+        self.assertAlmostEqual(report['agreement'],
+                               1 - (report['nb_missed'] + report['nb_added']) / report['nb_pairs'])
+
+    def test_prediction_cache(self):
+        cache = methods.enable_prediction_cache(max_size=1000, precision=1e-9)
+        try:
+            scores = [methods.random_forest_general(sim_analysis) for sim_analysis in self.sim_analyses]
+            self.assertEqual(cache.misses, len(cache))
+            self.assertGreater(cache.hits, 0)
+            self.assertEqual(list(methods.classifier_batch(self.sim_analyses, 'random_forest_general')), scores)
+            self.assertEqual(cache.get_stats()['hits'], cache.hits)
+
+            # Equivalent results after quantization share the entry
+            cache = methods.enable_prediction_cache(max_size=2, precision=0.01)
+            sim_analysis = dict(self.sim_analyses[0])
+            score = methods.random_forest_book(sim_analysis)
+            sim_analysis['titles'] += 0.001
+            self.assertEqual(methods.random_forest_book(sim_analysis), score)
+            self.assertEqual(cache.get_stats()['hit_rate'], 0.5)
+            methods.classifier_batch(self.sim_analyses, 'mlp_book')
+            self.assertEqual(len(cache), 2)
+        finally:
+            methods.disable_prediction_cache()
+        self.assertIsNone(methods.prediction_cache)
+
+    def test_prediction_cache_threads(self):
+        cache = methods.PredictionCache(max_size=4)
+
+        def use_cache(i):
+            for j in range(2000):
+                key = cache.get_key('mean', {'titles': (i + j) % 8})
+                if cache.get(key) is None:
+                    cache.set(key, 0.5)
+
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(use_cache, range(4)))
+        self.assertEqual(cache.hits + cache.misses, 8000)
+        self.assertLessEqual(len(cache), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
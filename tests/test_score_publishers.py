@@ -37,6 +37,21 @@ class TestScorePublishers(unittest.TestCase):
         self.assertTrue(evaluate_publishers_vect('PAYO GENEVE', 'PAYOT GENEVE') < 0.5)
         self.assertTrue(evaluate_publishers_vect('A-R EDITIONS', 'A-R EDITIONS INC') > 0.9)
 
+    def test_evaluate_publishers_vect_batch(self):
+        pubs = ['PAYOT', 'PAYOT ZURICH', 'PAYO GENEVE', '']
+        scores = evaluate_publishers_vect_batch('PAYOT GENEVE', pubs)
+        self.assertEqual(len(scores), 4)
+        for score, pub in zip(scores, pubs):
+            self.assertAlmostEqual(score, evaluate_publishers_vect('PAYOT GENEVE', pub))
+
+        matrix = get_publishers_matrix(pubs)
+        self.assertEqual(list(evaluate_publishers_vect_batch('PAYOT GENEVE', matrix)), list(scores))
+
+    def test_get_publisher_vector(self):
+        vector = get_publisher_vector('PAYOT PAYOT GENEVE')
+        self.assertEqual(len(vector.weights), 2)
+        self.assertIs(get_publisher_vector('PAYOT PAYOT GENEVE'), vector)
+
     def test_normalize_txt(self):
         self.assertEqual(normalize_txt('Springer'), 'SPRINGER')
         self.assertEqual(normalize_txt('Springer Nature'), 'SPRINGER NATURE')
@@ -0,0 +1,77 @@
+import unittest
+import os
+import tempfile
+
+from dedupmarcxml.storage import SqliteBlockIndex, serialize_record, deserialize_record
+from dedupmarcxml.blocking import BlockIndex
+from dedupmarcxml.index import DedupIndex, get_dedup_keys
+from dedupmarcxml.briefrecord import RawBriefRec
+from dedupmarcxml import readers
+
+
+def get_pair_ids(pairs):
+    return sorted(tuple(sorted([rec1.data['rec_id'], rec2.data['rec_id']])) for rec1, rec2 in pairs)
+
+
+class TestStorage(unittest.TestCase):
+
+    folder = 'requests' if os.getcwd().endswith('tests') else 'tests/requests'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.recs = list(readers.iter_brief_records([cls.folder]))
+
+    def test_serialize_record(self):
+        for rec in self.recs:
+            self.assertEqual(deserialize_record(serialize_record(rec)).data, rec.data)
+
+    def test_serialize_lazy_record(self):
+        for raw_rec in readers.iter_raw_records([self.folder]):
+            rec = readers.parse_raw_record(*raw_rec)
+            lazy_rec = readers.parse_raw_record(*raw_rec, lazy=True)
+            self.assertEqual(lazy_rec.data.get_extracted_fields(), [])
+            self.assertEqual(deserialize_record(serialize_record(lazy_rec)).data, rec.data)
+
+    def test_sqlite_block_index(self):
+        memory_index = BlockIndex(max_block_size=3)
+        for rec in self.recs:
+            memory_index.add(rec)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'index.db')
+            with SqliteBlockIndex(path, max_block_size=3, commit_every=5) as index:
+                self.assertEqual(index.add_records(self.recs, batch_size=4), len(memory_index))
+
+            # Index is reopened from the database
+            with SqliteBlockIndex(path, max_block_size=3, cache_size=2) as index:
+                self.assertEqual(len(index), len(memory_index))
+                self.assertEqual(index.get_block_sizes(), memory_index.get_block_sizes())
+                self.assertEqual(index.get_oversized_blocks(), memory_index.get_oversized_blocks())
+                self.assertEqual(get_pair_ids(index.get_candidate_pairs()),
+                                 get_pair_ids(memory_index.get_candidate_pairs()))
+
+                rec = self.recs[0]
+                rec_id = rec.data['rec_id']
+                self.assertEqual(index.get(rec_id).data, rec.data)
+                self.assertEqual(index.get_fingerprint(rec_id), rec.get_fingerprint())
+                self.assertEqual(index.get_candidate_ids(rec), memory_index.get_candidate_ids(rec))
+
+                index.remove(rec_id)
+                memory_index.remove(rec_id)
+                self.assertNotIn(rec_id, index)
+                self.assertIsNone(index.get(rec_id))
+                self.assertEqual(index.get_block_sizes(), memory_index.get_block_sizes())
+
+    def test_dedup_index(self):
+        index = DedupIndex(threshold=0.5, block_index=SqliteBlockIndex(':memory:', key_func=get_dedup_keys))
+        memory_index = DedupIndex(threshold=0.5)
+        rec_copy = RawBriefRec(dict(self.recs[0].data, rec_id='copy', years=None))
+        for rec in self.recs + [rec_copy]:
+            self.assertEqual(index.add(rec), memory_index.add(rec))
+        self.assertEqual(index.get_clusters(), memory_index.get_clusters())
+        self.assertEqual(index.get_cluster('copy'), sorted(['copy', self.recs[0].data['rec_id']]))
+        index.block_index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import Levenshtein
 from dedupmarcxml.tools import *
 
 class TestTools(unittest.TestCase):
@@ -27,6 +28,52 @@ class TestTools(unittest.TestCase):
         self.assertLess(evaluate_text_similarity('ED. PAYOT', 'EDITIONS PAYOT'), 1)
         self.assertGreater(evaluate_text_similarity('ED. PAYOT', 'EDITIONS PAYOT'), 0.5)
 
+    def test_ratio_bounds(self):
+        self.assertGreaterEqual(ratio_length_bound('SPRINGER', 'SPINGER'), Levenshtein.ratio('SPRINGER', 'SPINGER'))
+        self.assertGreaterEqual(ratio_qgram_bound('SPRINGER', 'REGNIRPS'), Levenshtein.ratio('SPRINGER', 'REGNIRPS'))
+        self.assertLess(ratio_qgram_bound('PAYOT', 'GENEVE'), ratio_length_bound('PAYOT', 'GENEVE'))
+        self.assertEqual(ratio_length_bound('', ''), 1)
+
+    def test_levenshtein_ratio_prefilter(self):
+        reset_prefilter_stats()
+        self.assertEqual(levenshtein_ratio('SPRINGER', 'SPINGER'), Levenshtein.ratio('SPRINGER', 'SPINGER'))
+        self.assertEqual(levenshtein_ratio('A', 'SPRINGER', score_cutoff=0.8), 0)
+        self.assertEqual(levenshtein_ratio('PAYOT', 'GENEVA', score_cutoff=0.8, use_qgrams=True), 0)
+        stats = get_prefilter_stats()
+        self.assertEqual(stats, {'computed': 1, 'skipped_by_length': 1, 'skipped_by_qgrams': 1})
+
+    def test_evaluate_text_similarity_prefilter(self):
+        reset_prefilter_stats()
+        evaluate_text_similarity('MOZARTS A B', 'MOZART')
+        self.assertGreater(get_prefilter_stats()['skipped_by_length'], 0)
+
+    def test_get_best_pair_score(self):
+        calls = []
+
+        def compare(v1, v2):
+            calls.append((v1, v2))
+            return 1.0 if v1 == v2 else 0.5
+
+        score = get_best_pair_score(['Ein zwei drei', 'Un deux trois', 'Eins'], ['Vier', 'Un deux trois'], compare)
+        self.assertEqual(score, 1)
+        self.assertEqual(calls[0], ('Un deux trois', 'Un deux trois'))
+        self.assertEqual(len(calls), 1)
+
+        calls.clear()
+        self.assertEqual(get_best_pair_score([2000, 1990], [1991, 1800], compare), 0.5)
+        self.assertEqual(len(calls), 4)
+
+        # Pairs sharing the first token come first, the others follow
+        calls.clear()
+        self.assertEqual(get_best_pair_score(['Ab c', 'Cd e'], ['Cd f', 'Ab c'], compare), 1.0)
+        self.assertEqual(calls, [('Ab c', 'Ab c')])
+
+        # Pairs whose bound cannot beat the best score are not compared
+        calls.clear()
+        score = get_best_pair_score(['abc', 'x'], ['abd', 'xxxxxxxx'], compare, bound=ratio_length_bound)
+        self.assertEqual(score, 0.5)
+        self.assertNotIn(('x', 'xxxxxxxx'), calls)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
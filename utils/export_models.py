@@ -0,0 +1,41 @@
+"""
+This script exports the pickled classifiers of `dedupmarcxml/data` in the memory-mapped
+format of :mod:`dedupmarcxml.models`. Each model is saved in a folder with the name of the
+pickle file, for example `dedupmarcxml/data/randomforest_book_model/`.
+
+When these folders exist, :mod:`dedupmarcxml.tools` loads the memory-mapped models
+instead of the pickles: worker processes share the arrays of the models instead of
+holding a private copy. Delete the folders to use the pickles again.
+
+The script checks that the predictions of the exported models are the same as the
+predictions of the pickled models on random features.
+"""
+
+# import libraries
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+from dedupmarcxml import models
+
+data_folder = os.path.join(os.path.dirname(__file__), '..', 'dedupmarcxml', 'data')
+model_names = ['randomforest_music_model',
+               'randomforest_book_model',
+               'randomforest_general_model',
+               'mlp_classifier_book_model']
+
+rng = np.random.default_rng(0)
+
+for name in model_names:
+    with open(os.path.join(data_folder, f'{name}.pickle'), 'rb') as f:
+        model = pickle.load(f)
+
+    path = os.path.join(data_folder, name)
+    models.export_model(model, path)
+
+    # Features are similarity scores between 0 and 1, some of them rounded
+    X = pd.DataFrame(rng.random((1000, model.n_features_in_)), columns=model.feature_names_in_)
+    X.iloc[:500] = X.iloc[:500].round(1)
+    diff = np.abs(models.load_model(path).predict_proba(X) - model.predict_proba(X)).max()
+    print(f'{name}: exported to {path}, max difference of the predictions: {diff:.2e}')
@@ -0,0 +1,607 @@
+"""
+This script generates a synthetic corpus of MARC21 records with known duplicates. The
+corpus can be used to benchmark the library at scale without catalogue data.
+
+Records are built from the structure of the records in `tests/requests`: each generated
+record copies the fields of a template and replaces the identifying data (ids, titles,
+creators, ISBN / ISSN, publishers, years, extent, editions, parent) with random values.
+
+A part of the records are duplicates of previously generated records with realistic
+perturbations:
+- publisher_abbreviation: "Verlag" => "Verl.", "University Press" => "Univ. Press"...
+- isbn_format: ISBN-13 replaced by the ISBN-10 with or without hyphens
+- extent: "256 p." => "256 S.", "XII, 256 p."...
+- edition_wording: "2nd ed." => "2. Aufl.", "2e éd."...
+- missing_33x: fields 336, 337 and 338 are removed
+- title_punctuation: case and punctuation of the title are modified
+
+The corpus is written as a MARCXML collection or as JSON records (one record per line,
+same structure as the Alma JSON records in `tests/data_for_testing`). The ground truth
+is written next to the corpus in `<corpus path>_pairs.csv`, for example `corpus.xml_pairs.csv`,
+with columns `rec_id1`, `rec_id2` and `perturbations`. Each duplicate is paired with its
+original record, duplicates of the same original belong to the same cluster. Empty perturbations means that no
+perturbation could be applied: the duplicate differs only by its identifiers.
+
+Usage:
+    python utils/generate_corpus.py --size 10000 --duplicate-rate 0.2 --output corpus.xml
+    python utils/generate_corpus.py --size 1000000 --format json --output corpus.ndjson
+"""
+
+# import libraries
+import argparse
+import copy
+import csv
+import json
+import os
+import random
+import re
+from typing import List, Dict, Optional, Tuple, Iterator, TextIO
+from xml.sax.saxutils import escape, quoteattr
+
+from lxml import etree
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARC_NS = '{http://www.loc.gov/MARC21/slim}'
+
+# Number of original records kept in memory to create duplicates
+RESERVOIR_SIZE = 10000
+
+title_words = {
+    'en': ['history', 'theory', 'introduction', 'handbook', 'modern', 'social', 'european', 'music', 'science',
+           'language', 'culture', 'society', 'economics', 'law', 'politics', 'medieval', 'art', 'practice',
+           'studies', 'philosophy', 'children', 'education', 'nature', 'mountains', 'city', 'memory', 'war'],
+    'de': ['Geschichte', 'Theorie', 'Einführung', 'Handbuch', 'moderne', 'soziale', 'europäische', 'Musik',
+           'Wissenschaft', 'Sprache', 'Kultur', 'Gesellschaft', 'Wirtschaft', 'Recht', 'Politik', 'Kunst',
+           'Praxis', 'Studien', 'Philosophie', 'Kinder', 'Bildung', 'Natur', 'Berge', 'Stadt', 'Erinnerung'],
+    'fr': ['histoire', 'théorie', 'introduction', 'manuel', 'moderne', 'sociale', 'européenne', 'musique',
+           'science', 'langue', 'culture', 'société', 'économie', 'droit', 'politique', 'art', 'pratique',
+           'études', 'philosophie', 'enfants', 'éducation', 'nature', 'montagnes', 'ville', 'mémoire']
+}
+
+title_links = {'en': ['of', 'and', 'in', 'for'], 'de': ['der', 'und', 'in', 'für'], 'fr': ['de', 'et', 'dans', 'pour']}
+
+languages = {'en': 'eng', 'de': 'ger', 'fr': 'fre'}
+
+surnames = ['Müller', 'Meier', 'Schmid', 'Keller', 'Weber', 'Huber', 'Dubois', 'Favre', 'Rossi', 'Bianchi',
+            'Smith', 'Jones', 'Taylor', 'Brown', 'Martin', 'Bernard', 'Fischer', 'Baumann', 'Zimmermann',
+            'Brunner', 'Gerber', 'Moser', 'Widmer', 'Wyss', 'Frei', 'Steiner', 'Roth', 'Graf', 'Bühler']
+
+forenames = ['Anna', 'Peter', 'Marie', 'Hans', 'Claire', 'Luca', 'Sophie', 'Thomas', 'Julia', 'Daniel',
+             'Laura', 'Martin', 'Sarah', 'Michael', 'Elena', 'Pierre', 'Ursula', 'Beat', 'Nicole', 'Andreas']
+
+publishers = [('Zürich', 'Chronos Verlag'), ('Basel', 'Schwabe Verlag'), ('Bern', 'Peter Lang'),
+              ('Genève', 'Librairie Droz'), ('Genève', 'Éditions Slatkine'), ('Paris', 'Éditions Gallimard'),
+              ('Paris', 'Presses universitaires de France'), ('München', 'Verlag C.H. Beck'),
+              ('Oxford', 'Oxford University Press'), ('Cambridge', 'Cambridge University Press'),
+              ('London', 'Routledge'), ('Berlin', 'Springer Verlag'), ('Göttingen', 'Hogrefe Verlag'),
+              ('Basel', 'Birkhäuser Verlag'), ('Lausanne', 'Presses polytechniques et universitaires romandes'),
+              ('Mainz', 'Schott Music'), ('Kassel', 'Bärenreiter Verlag')]
+
+journals = ['Schweizerische Zeitschrift für Geschichte', 'Revue historique vaudoise', 'Musik und Kirche',
+            'Journal of European Studies', 'Brugger Neujahrsblätter', 'Zeitschrift für schweizerisches Recht',
+            'Revue suisse de musicologie', 'Swiss Political Science Review']
+
+publisher_abbreviations = [('University Press', 'Univ. Press'), ('Presses universitaires de France', 'PUF'),
+                           ('Presses universitaires', 'Presses univ.'), ('Verlag', 'Verl.'),
+                           ('Éditions', 'Éd.'), ('Librairie', 'Libr.')]
+
+ordinals_en = {1: 'First', 2: 'Second', 3: 'Third', 4: 'Fourth', 5: 'Fifth'}
+
+
+def get_edition_txt(nb: int, wording: str) -> str:
+    """Return the edition statement of an edition number
+
+    :param nb: edition number
+    :param wording: style of the edition statement
+
+    :return: edition statement
+    """
+    if wording == 'en':
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(nb, 'th')
+        return f'{nb}{suffix} ed.'
+    elif wording == 'en_long':
+        return f'{ordinals_en.get(nb, str(nb))} edition'
+    elif wording == 'de':
+        return f'{nb}. Aufl.'
+    elif wording == 'de_long':
+        return f'{nb}., überarbeitete Auflage'
+    return f'{nb}e éd.'
+
+
+edition_wordings = ['en', 'en_long', 'de', 'de_long', 'fr']
+
+
+def get_isbn13(rnd: random.Random) -> str:
+    """Return a random valid ISBN-13 with 978 prefix
+
+    :param rnd: random generator
+
+    :return: string with ISBN-13
+    """
+    digits = [9, 7, 8] + [rnd.randint(0, 9) for _ in range(9)]
+    check = (10 - sum(d * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits)) % 10) % 10
+    return ''.join(map(str, digits)) + str(check)
+
+
+def isbn13_to_isbn10(isbn: str) -> Optional[str]:
+    """Convert an ISBN-13 with 978 prefix to an ISBN-10
+
+    :param isbn: string with ISBN-13
+
+    :return: string with ISBN-10 or None if conversion is not possible
+    """
+    isbn = isbn.replace('-', '')
+    if len(isbn) != 13 or isbn.startswith('978') is False or isbn.isdigit() is False:
+        return None
+    core = isbn[3:12]
+    check = (11 - sum((10 - i) * int(d) for i, d in enumerate(core)) % 11) % 11
+    return core + ('X' if check == 10 else str(check))
+
+
+def get_issn(rnd: random.Random) -> str:
+    """Return a random valid ISSN
+
+    :param rnd: random generator
+
+    :return: string with ISSN
+    """
+    digits = [rnd.randint(0, 9) for _ in range(7)]
+    check = (11 - sum((8 - i) * d for i, d in enumerate(digits)) % 11) % 11
+    issn = ''.join(map(str, digits)) + ('X' if check == 10 else str(check))
+    return f'{issn[:4]}-{issn[4:]}'
+
+
+def load_templates(folder: str) -> List[Dict]:
+    """Load the records used as templates
+
+    Records are converted to dictionaries with the keys 'leader', 'controlfields'
+    (list of [tag, value]) and 'datafields' (list of [tag, ind1, ind2, list of [code, value]]).
+
+    :param folder: folder with MARCXML files
+
+    :return: list of records
+    """
+    templates = []
+    for file_name in sorted(os.listdir(folder)):
+        root = etree.parse(os.path.join(folder, file_name)).getroot()
+        for rec in root.iter(f'{MARC_NS}record'):
+            template = {'leader': rec.findtext(f'{MARC_NS}leader'), 'controlfields': [], 'datafields': []}
+            for field in rec:
+                if field.tag == f'{MARC_NS}controlfield':
+                    template['controlfields'].append([field.get('tag'), field.text or ''])
+                elif field.tag == f'{MARC_NS}datafield':
+                    template['datafields'].append([field.get('tag'), field.get('ind1'), field.get('ind2'),
+                                                   [[sub.get('code'), sub.text or ''] for sub in field]])
+            templates.append(template)
+
+    return templates
+
+
+def get_fields(rec: Dict, tag: str) -> List[List]:
+    """Return the datafields of a record with the given tag
+
+    :param rec: record dictionary
+    :param tag: tag of the fields
+
+    :return: list of datafields
+    """
+    return [field for field in rec['datafields'] if field[0] == tag]
+
+
+def set_controlfield(rec: Dict, tag: str, value: str) -> None:
+    """Set the value of a controlfield, add the field if missing
+
+    :param rec: record dictionary
+    :param tag: tag of the controlfield
+    :param value: new value
+    """
+    for field in rec['controlfields']:
+        if field[0] == tag:
+            field[1] = value
+            return
+    rec['controlfields'].append([tag, value])
+
+
+def set_subfield(field: List, code: str, value: Optional[str]) -> None:
+    """Set the value of the first subfield with the code, remove it if value is None
+
+    :param field: datafield
+    :param code: code of the subfield
+    :param value: new value
+    """
+    for i, sub in enumerate(field[3]):
+        if sub[0] == code:
+            if value is None:
+                del field[3][i]
+            else:
+                sub[1] = value
+            return
+    if value is not None:
+        field[3].append([code, value])
+
+
+def get_subfield(field: List, code: str) -> Optional[str]:
+    """Return the value of the first subfield with the code
+
+    :param field: datafield
+    :param code: code of the subfield
+
+    :return: value of the subfield or None
+    """
+    for sub in field[3]:
+        if sub[0] == code:
+            return sub[1]
+    return None
+
+
+def set_rec_id(rec: Dict, seq: int) -> str:
+    """Set a new record id and system number
+
+    :param rec: record dictionary
+    :param seq: sequential number of the record
+
+    :return: new record id
+    """
+    rec_id = f'99{seq:012d}5501'
+    set_controlfield(rec, '001', rec_id)
+    rec['datafields'] = [field for field in rec['datafields'] if field[0] != '035']
+    rec['datafields'].append(['035', ' ', ' ', [['a', f'(GEN){seq:012d}']]])
+    return rec_id
+
+
+def generate_record(template: Dict, seq: int, rnd: random.Random) -> Tuple[str, Dict]:
+    """Generate a new record with the structure of the template
+
+    :param template: template record
+    :param seq: sequential number of the record
+    :param rnd: random generator
+
+    :return: tuple with the record id and the record dictionary
+    """
+    rec = copy.deepcopy(template)
+    rec_id = set_rec_id(rec, seq)
+
+    lang = rnd.choice(list(title_words))
+    words = rnd.sample(title_words[lang], 4)
+    title = f'{words[0].capitalize()} {rnd.choice(title_links[lang])} {words[1]}'
+    subtitle = f'{words[2]} {rnd.choice(title_links[lang])} {words[3]}'
+    creator = f'{rnd.choice(surnames)}, {rnd.choice(forenames)}'
+    year = rnd.randint(1950, 2024)
+    place, publisher = rnd.choice(publishers)
+
+    # Fixed length data: year and language
+    for field in rec['controlfields']:
+        if field[0] == '008' and len(field[1]) >= 38:
+            field[1] = field[1][:7] + str(year) + field[1][11:35] + languages[lang] + field[1][38:]
+
+    for field in rec['datafields']:
+        tag = field[0]
+        if tag == '245':
+            set_subfield(field, 'a', f'{title} :')
+            set_subfield(field, 'b', f'{subtitle} /')
+            set_subfield(field, 'c', ' '.join(creator.split(', ')[::-1]))
+        elif tag == '246':
+            set_subfield(field, 'a', subtitle.capitalize())
+        elif tag in ['024', '028']:
+            number = get_subfield(field, 'a')
+            if number is not None:
+                set_subfield(field, 'a', re.sub(r'\d', lambda m: str(rnd.randint(0, 9)), number))
+        elif tag in ['100', '700']:
+            set_subfield(field, 'a', creator if tag == '100' else f'{rnd.choice(surnames)}, {rnd.choice(forenames)}')
+        elif tag == '020':
+            set_subfield(field, 'a', get_isbn13(rnd))
+        elif tag == '022':
+            set_subfield(field, 'a', get_issn(rnd))
+        elif tag in ['260', '264']:
+            set_subfield(field, 'a', f'{place} :')
+            set_subfield(field, 'b', f'{publisher},')
+            set_subfield(field, 'c', str(year))
+        elif tag == '300':
+            extent = get_subfield(field, 'a')
+            if extent is not None:
+                set_subfield(field, 'a', re.sub(r'\d+', lambda m: str(rnd.randint(20, 900)), extent))
+        elif tag == '250':
+            set_subfield(field, 'a', get_edition_txt(rnd.randint(1, 5), rnd.choice(edition_wordings)))
+        elif tag == '773':
+            set_subfield(field, 't', rnd.choice(journals))
+            set_subfield(field, 'x', get_issn(rnd) if get_subfield(field, 'x') is not None else None)
+            field[3] = [sub for sub in field[3] if sub[0] != 'g']
+            volume = rnd.randint(1, 120)
+            field[3].append(['g', f'{volume}({year}), S. {rnd.randint(1, 300)}-{rnd.randint(301, 600)}'])
+            field[3].append(['g', f'yr:{year}'])
+            field[3].append(['g', f'no:{volume}'])
+        elif tag == '041':
+            set_subfield(field, 'a', languages[lang])
+
+    return rec_id, rec
+
+
+def perturb_publisher_abbreviation(rec: Dict, rnd: random.Random) -> bool:
+    """Abbreviate the publisher name, "Verlag" => "Verl."
+
+    :param rec: record dictionary, modified in place
+    :param rnd: random generator
+
+    :return: True if the perturbation could be applied
+    """
+    for field in get_fields(rec, '264') + get_fields(rec, '260'):
+        publisher = get_subfield(field, 'b')
+        if publisher is None:
+            continue
+        for long_form, short_form in publisher_abbreviations:
+            if long_form in publisher:
+                set_subfield(field, 'b', publisher.replace(long_form, short_form))
+                return True
+    return False
+
+
+def perturb_isbn_format(rec: Dict, rnd: random.Random) -> bool:
+    """Replace the ISBN-13 by the ISBN-10, with or without hyphens
+
+    :param rec: record dictionary, modified in place
+    :param rnd: random generator
+
+    :return: True if the perturbation could be applied
+    """
+    for field in get_fields(rec, '020'):
+        isbn10 = isbn13_to_isbn10(get_subfield(field, 'a') or '')
+        if isbn10 is not None:
+            if rnd.random() < 0.5:
+                isbn10 = f'{isbn10[0]}-{isbn10[1:4]}-{isbn10[4:9]}-{isbn10[9]}'
+            set_subfield(field, 'a', isbn10)
+            return True
+    return False
+
+
+def perturb_extent(rec: Dict, rnd: random.Random) -> bool:
+    """Change the wording of the extent, "256 p." => "256 S."
+
+    :param rec: record dictionary, modified in place
+    :param rnd: random generator
+
+    :return: True if the perturbation could be applied
+    """
+    for field in get_fields(rec, '300'):
+        extent = get_subfield(field, 'a')
+        if extent is None:
+            continue
+        m = re.search(r'(\d+)\s*(p\.|S\.|pages|Seiten)', extent)
+        if m is not None:
+            nb = m.group(1)
+            new_extent = rnd.choice([f'{nb} S.', f'{nb} p.', f'{nb} pages', f'XII, {nb} p.', f'{nb} Seiten'])
+            if new_extent == m.group(0):
+                new_extent = f'X, {nb} {m.group(2)}'
+            set_subfield(field, 'a', extent[:m.start()] + new_extent + extent[m.end():])
+            return True
+    return False
+
+
+def perturb_edition_wording(rec: Dict, rnd: random.Random) -> bool:
+    """Change the wording of the edition statement, "2nd ed." => "2. Aufl."
+
+    :param rec: record dictionary, modified in place
+    :param rnd: random generator
+
+    :return: True if the perturbation could be applied
+    """
+    for field in get_fields(rec, '250'):
+        m = re.search(r'\d+', get_subfield(field, 'a') or '')
+        nb = int(m.group()) if m is not None else None
+        if nb is None:
+            for n, ordinal in ordinals_en.items():
+                if ordinal in (get_subfield(field, 'a') or ''):
+                    nb = n
+        if nb is not None:
+            set_subfield(field, 'a', get_edition_txt(nb, rnd.choice(edition_wordings)))
+            return True
+    return False
+
+
+def perturb_missing_33x(rec: Dict, rnd: random.Random) -> bool:
+    """Remove the fields 336, 337 and 338
+
+    :param rec: record dictionary, modified in place
+    :param rnd: random generator
+
+    :return: True if the perturbation could be applied
+    """
+    nb_fields = len(rec['datafields'])
+    rec['datafields'] = [field for field in rec['datafields'] if field[0] not in ['336', '337', '338']]
+    return len(rec['datafields']) < nb_fields
+
+
+def perturb_title_punctuation(rec: Dict, rnd: random.Random) -> bool:
+    """Change the case and the punctuation of the title
+
+    :param rec: record dictionary, modified in place
+    :param rnd: random generator
+
+    :return: True if the perturbation could be applied
+    """
+    for field in get_fields(rec, '245'):
+        title = get_subfield(field, 'a')
+        if title is None:
+            continue
+        title = title.rstrip(' :/')
+        subtitle = (get_subfield(field, 'b') or '').rstrip(' /')
+        if rnd.random() < 0.5:
+            set_subfield(field, 'a', f'{title.upper()} :')
+        else:
+            set_subfield(field, 'a', f'{title}. {subtitle.capitalize()}' if subtitle else title)
+            set_subfield(field, 'b', None)
+        return True
+    return False
+
+
+perturbations = {'publisher_abbreviation': perturb_publisher_abbreviation,
+                 'isbn_format': perturb_isbn_format,
+                 'extent': perturb_extent,
+                 'edition_wording': perturb_edition_wording,
+                 'missing_33x': perturb_missing_33x,
+                 'title_punctuation': perturb_title_punctuation}
+
+
+def generate_duplicate(original: Dict, seq: int, rnd: random.Random) -> Tuple[str, Dict, List[str]]:
+    """Generate a duplicate of a record with one to three perturbations
+
+    :param original: original record
+    :param seq: sequential number of the record
+    :param rnd: random generator
+
+    :return: tuple with the record id, the record dictionary and the list of applied perturbations
+    """
+    rec = copy.deepcopy(original)
+    rec_id = set_rec_id(rec, seq)
+    applied = []
+    for name in rnd.sample(list(perturbations), rnd.randint(1, 3)):
+        if perturbations[name](rec, rnd) is True:
+            applied.append(name)
+
+    return rec_id, rec, applied
+
+
+def generate_corpus(templates: List[Dict],
+                    size: int,
+                    duplicate_rate: float,
+                    seed: int = 0) -> Iterator[Tuple[str, Dict, Optional[str], List[str]]]:
+    """Generate the records of the corpus
+
+    :param templates: list of template records
+    :param size: number of records
+    :param duplicate_rate: proportion of duplicates
+    :param seed: seed of the random generator
+
+    :return: iterator of tuples with record id, record dictionary, record id of the original
+        (None if the record is not a duplicate) and the list of applied perturbations
+    """
+    rnd = random.Random(seed)
+    reservoir = []
+    nb_originals = 0
+
+    for seq in range(1, size + 1):
+        if len(reservoir) > 0 and rnd.random() < duplicate_rate:
+            original_id, original = rnd.choice(reservoir)
+            rec_id, rec, applied = generate_duplicate(original, seq, rnd)
+            yield rec_id, rec, original_id, applied
+            continue
+
+        rec_id, rec = generate_record(rnd.choice(templates), seq, rnd)
+        nb_originals += 1
+
+        # Reservoir sampling: duplicates are spread over the whole corpus
+        if len(reservoir) < RESERVOIR_SIZE:
+            reservoir.append((rec_id, rec))
+        else:
+            i = rnd.randrange(nb_originals)
+            if i < RESERVOIR_SIZE:
+                reservoir[i] = (rec_id, rec)
+
+        yield rec_id, rec, None, []
+
+
+def record_to_xml(rec: Dict) -> str:
+    """Serialize a record to MARCXML
+
+    :param rec: record dictionary
+
+    :return: string with the XML record without namespace declaration
+    """
+    lines = ['<record>', f'<leader>{escape(rec["leader"])}</leader>']
+    for tag, value in rec['controlfields']:
+        lines.append(f'<controlfield tag="{tag}">{escape(value)}</controlfield>')
+    for tag, ind1, ind2, subfields in rec['datafields']:
+        lines.append(f'<datafield tag="{tag}" ind1={quoteattr(ind1)} ind2={quoteattr(ind2)}>')
+        for code, value in subfields:
+            lines.append(f'<subfield code={quoteattr(code)}>{escape(value)}</subfield>')
+        lines.append('</datafield>')
+    lines.append('</record>\n')
+    return ''.join(lines)
+
+
+def record_to_json(rec: Dict) -> Dict:
+    """Convert a record to the JSON structure of Alma records
+
+    :param rec: record dictionary
+
+    :return: JSON record with keys 'mms_id' and 'marc'
+    """
+    marc = {'leader': rec['leader']}
+    for tag, value in rec['controlfields']:
+        marc[tag] = value
+    for tag, ind1, ind2, subfields in rec['datafields']:
+        marc.setdefault(tag, []).append({'ind1': ind1, 'ind2': ind2,
+                                         'sub': [{code: value} for code, value in subfields]})
+
+    return {'mms_id': marc.get('001'), 'marc': marc}
+
+
+def write_corpus(records: Iterator[Tuple[str, Dict, Optional[str], List[str]]],
+                 output: TextIO,
+                 pairs_output: TextIO,
+                 output_format: str) -> Tuple[int, int]:
+    """Write the corpus and the ground truth
+
+    :param records: iterator of generated records
+    :param output: file object of the corpus
+    :param pairs_output: file object of the ground truth
+    :param output_format: 'xml' or 'json'
+
+    :return: tuple with the number of records and the number of duplicates
+    """
+    writer = csv.writer(pairs_output)
+    writer.writerow(['rec_id1', 'rec_id2', 'perturbations'])
+
+    if output_format == 'xml':
+        output.write('<?xml version="1.0" encoding="UTF-8"?>\n<collection xmlns="http://www.loc.gov/MARC21/slim">\n')
+
+    nb_records = 0
+    nb_duplicates = 0
+    for rec_id, rec, original_id, applied in records:
+        if output_format == 'xml':
+            output.write(record_to_xml(rec))
+        else:
+            output.write(json.dumps(record_to_json(rec), ensure_ascii=False) + '\n')
+
+        nb_records += 1
+        if original_id is not None:
+            writer.writerow([original_id, rec_id, '|'.join(applied)])
+            nb_duplicates += 1
+
+    if output_format == 'xml':
+        output.write('</collection>\n')
+
+    return nb_records, nb_duplicates
+
+
+def get_pairs_path(output_path: str) -> str:
+    """Return the path of the ground truth file of a corpus
+
+    :param output_path: path of the corpus
+
+    :return: path of the ground truth file, the extension of the corpus is kept:
+        corpora with different formats have different ground truth files
+    """
+    return f'{output_path}_pairs.csv'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic corpus of MARC21 records with duplicates')
+    parser.add_argument('--size', type=int, default=10000, help='number of records')
+    parser.add_argument('--duplicate-rate', type=float, default=0.2, help='proportion of duplicates')
+    parser.add_argument('--format', choices=['xml', 'json'], default='xml', help='format of the corpus')
+    parser.add_argument('--output', required=True, help='path of the corpus')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random generator')
+    parser.add_argument('--templates', default=os.path.join(ROOT_DIR, 'tests', 'requests'),
+                        help='folder with MARCXML records used as templates')
+    args = parser.parse_args()
+
+    with open(args.output, 'w', encoding='utf-8') as f, \
+            open(get_pairs_path(args.output), 'w', encoding='utf-8', newline='') as f_pairs:
+        nb_records, nb_duplicates = write_corpus(generate_corpus(load_templates(args.templates),
+                                                                 args.size,
+                                                                 args.duplicate_rate,
+                                                                 args.seed),
+                                                 f, f_pairs, args.format)
+
+    print(f'{nb_records} records written to {args.output}, {nb_duplicates} duplicates '
+          f'written to {get_pairs_path(args.output)}')